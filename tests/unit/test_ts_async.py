@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- cofing: utf-8 -*-
+"""AsyncTweets Test Unit (ローカル スタブサーバを使用)"""
+
+import os, sys
+import asyncio
+import unittest
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+from tslib import AsyncTweets
+from tslib import TwsConfig
+from tslib.ts_retry import RetryPolicy, RETRY_SERVER
+from stubserver import StubServer, BASE_ID
+
+SEARCH_ENDPOINT = 'https://api.twitter.com/1.1/search/tweets.json'
+GETID_ENDPOINT = "https://api.twitter.com/1.1/statuses/show.json"
+
+
+class TestAsyncTweets(unittest.TestCase):
+    """AsyncTweets の unittest"""
+
+    def setUp(self):
+        self.server = StubServer(total_tweets=250).start()
+        self.config = TwsConfig({})
+        self.config['dryrun'] = False
+        self.config['APIBaseURL'] = self.server.url
+        self.default_params = {'q': '', 'count': 100, 'tweet_mode': 'extended'}
+
+    def tearDown(self):
+        self.server.stop()
+        del self.config
+
+    async def _search(self, query, dispcount=-1):
+        async with AsyncTweets(self.config, SEARCH_ENDPOINT, self.default_params) as atw:
+            return [(tweet, metadata) async for tweet, metadata in
+                    atw.generator({'q': query}, retry_max=0, interval_time=0,
+                                  dispcount=dispcount)]
+
+    def test_001(self):
+        """next_results によるページングのテスト"""
+        results = asyncio.run(self._search('query'))
+        ids = [tweet['id'] for tweet, _ in results]
+        self.assertEqual(ids, list(range(BASE_ID, BASE_ID - 250, -1)))
+        self.assertEqual(results[0][1]['max_id'], BASE_ID)
+        self.assertEqual(results[-1][1]['max_id'], BASE_ID - 200)
+
+    def test_002(self):
+        """dispcount 指定のテスト"""
+        results = asyncio.run(self._search('query', dispcount=130))
+        self.assertEqual(len(results), 130)
+
+    def test_003(self):
+        """1 つのイベントループで複数の検索を同時に実行するテスト"""
+        async def run_all():
+            return await asyncio.gather(*[self._search('q{}'.format(i)) for i in range(4)])
+        for results in asyncio.run(run_all()):
+            self.assertEqual(len(results), 250)
+            self.assertEqual(results[0][1]['query'], results[-1][1]['query'])
+
+    def test_004(self):
+        """get_one_tweet() のテスト"""
+        async def get_one():
+            async with AsyncTweets(self.config, GETID_ENDPOINT, {'tweet_mode': 'extended'},
+                                   resource_family='statuses',
+                                   resource='/statuses/show/:id') as atw:
+                return await atw.get_one_tweet('1268346734951964000')
+        tweet = asyncio.run(get_one())
+        self.assertEqual(tweet['id_str'], '1268346734951964000')
+
+    def test_breaker_001(self):
+        """half open の試行が 429, 404 で終わってもサーキットブレーカが閉じるテスト"""
+        statuses = iter([429, 404])
+        self.server.httpd.inject_error = lambda: next(statuses, None)
+        self.server.httpd.retry_after = 0
+        policy = RetryPolicy(base=0.01, jitter=False, threshold=1, cooldown=0.01)
+        policy.record_failure(RETRY_SERVER)
+        self.assertEqual(policy.state(), 'open')
+        async def get_one():
+            async with AsyncTweets(self.config, GETID_ENDPOINT, {'tweet_mode': 'extended'},
+                                   resource_family='statuses',
+                                   resource='/statuses/show/:id',
+                                   retry_policy=policy) as atw:
+                return await asyncio.wait_for(
+                    atw.get_one_tweet('1268346734951964000', retry_max=0, interval_time=0), 5)
+        self.assertIsNone(asyncio.run(get_one()))
+        self.assertEqual(policy.state(), 'closed')
+        self.assertEqual(policy.admit(), 0)
+        self.assertEqual(self.server.counters()['status:429'], 1)
+        self.assertEqual(self.server.counters()['status:404'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
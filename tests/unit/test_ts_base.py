@@ -12,12 +12,19 @@ sys.path.insert(0, os.path.join(DIR_BASE, '..'))
 sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
 sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
 sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
 
 from tslib import Tweets
 from tslib import TwsConfig
 from tslib import ts_dateutils
+from tslib import make_session
+from tslib import RetryPolicy, FatalResponseError
+from tslib.ts_retry import RETRY_SERVER
+
+from stubserver import StubServer, StubHandler, BASE_ID
 
 GETID_ENDPOINT = "https://api.twitter.com/1.1/statuses/show.json"
+SEARCH_ENDPOINT = 'https://api.twitter.com/1.1/search/tweets.json'
 
 class TestTweets(unittest.TestCase):
     """Tweets の unittest"""
@@ -31,5 +38,164 @@ class TestTweets(unittest.TestCase):
     def test_001(self):
         pass
 
+    def test_make_session_001(self):
+        """make_session() の接続プール設定のテスト"""
+        session = make_session(pool_connections=3, pool_maxsize=7, pool_block=True)
+        adapter = session.get_adapter('https://api.twitter.com/')
+        self.assertEqual(adapter._pool_connections, 3)
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(session.headers['Connection'], 'keep-alive')
+        session.close()
+
+    def test_make_session_002(self):
+        """make_session() の keep_alive=False のテスト"""
+        session = make_session(keep_alive=False)
+        self.assertEqual(session.headers['Connection'], 'close')
+        session.close()
+
+class TestTweetsPrefetch(unittest.TestCase):
+    """Tweets.generator(prefetch=N) の unittest (ローカル スタブサーバを使用)"""
+
+    def setUp(self):
+        self.server = StubServer(total_tweets=450).start()
+        self.config = TwsConfig({})
+        self.config['dryrun'] = False
+        self.config['APIBaseURL'] = self.server.url
+        self.tw = Tweets(self.config, SEARCH_ENDPOINT, {'q': '', 'count': 100})
+
+    def tearDown(self):
+        self.server.stop()
+        del self.config
+
+    def test_prefetch_001(self):
+        """先読みしても順序と metadata が変わらないテスト"""
+        expected = list(self.tw.generator({'q': 'query'}, retry_max=0, interval_time=0))
+        for depth in (1, 3):
+            results = list(self.tw.generator({'q': 'query'}, retry_max=0, interval_time=0,
+                                             prefetch=depth))
+            self.assertEqual(results, expected)
+        self.assertEqual(len(expected), 450)
+        self.assertEqual(expected[0][0]['id'], BASE_ID)
+
+    def test_prefetch_002(self):
+        """途中で読むのをやめてもブロックしないテスト"""
+        tweets_generator = self.tw.generator({'q': 'query'}, retry_max=0, interval_time=0,
+                                             prefetch=1)
+        first = next(tweets_generator)
+        tweets_generator.close()
+        self.assertEqual(first[0]['id'], BASE_ID)
+
+
+class NoMetadataOnceHandler(StubHandler):
+    """2 ページ目の最初の応答だけ search_metadata を付けないスタブサーバのハンドラ"""
+    def _send_json(self, status, body, resource=None, headers=None):
+        if isinstance(body, dict) and 'search_metadata' in body and 'max_id=' in self.path \
+                and not getattr(self.server, 'broken', False):
+            self.server.broken = True
+            body = {'statuses': body['statuses']}
+        super()._send_json(status, body, resource=resource, headers=headers)
+
+
+class TestTweetsStream(unittest.TestCase):
+    """Tweets.generator(stream=True) の unittest (ローカル スタブサーバを使用)"""
+
+    def setUp(self):
+        self.server = StubServer(total_tweets=250).start()
+        self.config = TwsConfig({})
+        self.config['dryrun'] = False
+        self.config['APIBaseURL'] = self.server.url
+        self.tw = Tweets(self.config, SEARCH_ENDPOINT, {'q': '', 'count': 100})
+
+    def tearDown(self):
+        self.server.stop()
+        del self.config
+
+    def test_stream_001(self):
+        """受信しながらデコードしても Tweet と (読み切った後の) metadata が変わらないテスト"""
+        expected = list(self.tw.generator({'q': 'query'}, retry_max=0, interval_time=0))
+        results = list(self.tw.generator({'q': 'query'}, retry_max=0, interval_time=0,
+                                         stream=True))
+        self.assertEqual(results, expected)
+        self.assertEqual(len(results), 250)
+
+    def test_stream_003(self):
+        """search_metadata の無いページを取得し直しても、既に返した Tweet を再び返さないテスト"""
+        with StubServer(total_tweets=250, handler=NoMetadataOnceHandler) as server:
+            config = TwsConfig({})
+            config['dryrun'] = False
+            config['APIBaseURL'] = server.url
+            tw = Tweets(config, SEARCH_ENDPOINT, {'q': '', 'count': 100})
+            results = list(tw.generator({'q': 'query'}, retry_max=1, interval_time=0,
+                                        retry_at_end=False, stream=True))
+            self.assertTrue(server.httpd.broken)
+            ids = [tweet['id'] for tweet, _ in results]
+            self.assertEqual(len(ids), 250)
+            self.assertEqual(len(set(ids)), 250)
+            self.assertEqual(tw.get_retry_policy().counters()['retry:invalid'], 1)
+
+    def test_stream_002(self):
+        """metadata はページを読み切った時点で揃うテスト"""
+        tweets_generator = self.tw.generator({'q': 'query'}, retry_max=0, interval_time=0,
+                                             stream=True)
+        first, metadata = next(tweets_generator)
+        self.assertEqual(first['id'], BASE_ID)
+        self.assertEqual(metadata, {})
+        for _ in range(99):
+            next(tweets_generator)
+        _, second_page = next(tweets_generator)
+        self.assertIsNot(second_page, metadata)
+        self.assertEqual(metadata['max_id'], BASE_ID)
+        tweets_generator.close()
+
+
+class TestTweetsFaults(unittest.TestCase):
+    """エラー注入・回数制限のあるスタブサーバに対する Tweets の unittest"""
+
+    def make_tweets(self, server):
+        config = TwsConfig({})
+        config['dryrun'] = False
+        config['APIBaseURL'] = server.url
+        return Tweets(config, SEARCH_ENDPOINT, {'q': '', 'count': 100},
+                      retry_policy=RetryPolicy(base=0.01, jitter=False,
+                                               budgets={RETRY_SERVER: 1}))
+
+    def test_error_001(self):
+        """503 を Retry-After 付きで返されてもリトライして全件取得するテスト"""
+        with StubServer(total_tweets=250, error_every=2, retry_after=0) as server:
+            tw = self.make_tweets(server)
+            tweets = list(tw.generator({'q': 'query'}, retry_max=0, interval_time=0))
+            self.assertEqual(len(tweets), 250)
+            self.assertEqual(server.counters()['status:503'], 2)
+            self.assertEqual(tw.get_retry_policy().counters()['retry:server'], 2)
+
+    def test_breaker_001(self):
+        """half open の試行が 429, 400 で終わってもサーキットブレーカが閉じるテスト"""
+        with StubServer(total_tweets=1, retry_after=0) as server:
+            statuses = iter([429, 400])
+            server.httpd.inject_error = lambda: next(statuses, None)
+            config = TwsConfig({})
+            config['dryrun'] = False
+            config['APIBaseURL'] = server.url
+            policy = RetryPolicy(base=0.01, jitter=False, threshold=1, cooldown=0.01)
+            tw = Tweets(config, SEARCH_ENDPOINT, {'q': '', 'count': 100}, retry_policy=policy)
+            policy.record_failure(RETRY_SERVER)
+            self.assertEqual(policy.state(), 'open')
+            with self.assertRaises(FatalResponseError):
+                list(tw.generator({'q': 'query'}, retry_max=0, interval_time=0))
+            self.assertEqual(policy.state(), 'closed')
+            self.assertEqual(policy.admit(), 0)
+            self.assertEqual(server.counters()['status:429'], 1)
+            self.assertEqual(server.counters()['status:400'], 1)
+
+    def test_limit_status_001(self):
+        """rate_limit_status がリクエスト数を反映するテスト"""
+        with StubServer(total_tweets=250, rate_limit=10) as server:
+            tw = self.make_tweets(server)
+            list(tw.generator({'q': 'query'}, retry_max=0, interval_time=0))
+            status = tw.get_limit_status()['resources']['search']['/search/tweets']
+            self.assertEqual((status['limit'], status['remaining']), (10, 7))
+
+
 if __name__ == "__main__":
     unittest.main()
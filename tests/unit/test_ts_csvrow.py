@@ -0,0 +1,80 @@
+# -*- codign: utf-8 -*-
+"""CsvRowWriter のテスト"""
+
+import unittest
+import sys
+import os
+import io
+import csv
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_csvrow import CsvRowWriter, DEFAULT_COLUMNS, parse_columns
+
+TWEET = {
+    'created_at': 'Thu Jun 04 01:00:01 +0000 2020',
+    'id': 1268346734951964672,
+    'id_str': '1268346734951964672',
+    'full_text': 'stub tweet "quoted" #stub',
+    'extended_tweet': {'full_text': 'extended text'},
+    'entities': {'hashtags': [{'text': 'stub'}, {'text': 'tag'}]},
+    'lang': 'ja',
+    'user': {'id': 14963504, 'name': 'stub', 'screen_name': 'stub_user'},
+}
+
+BASE = {
+    'created_at': 'Thu Jun 04 01:00:01 +0000 2020',
+    'created_at_exceltime': 43986.04168981482,
+    'created_at_epoch': 1591232401,
+    'created_at_jst': '2020-06-04 10:00:01 JST',
+}
+
+
+def write_rows(tweet_dicts, **kwargs):
+    outfp = io.StringIO()
+    writer = CsvRowWriter(outfp, **kwargs)
+    for tweet_dict in tweet_dicts:
+        writer.writerow(tweet_dict)
+    return list(csv.reader(io.StringIO(outfp.getvalue())))
+
+
+class TestCsvRowWriter(unittest.TestCase):
+    """CsvRowWriter のテスト"""
+
+    def test_001(self):
+        """ヘッダは 1 回だけ、extended_text も出力されるテスト"""
+        rows = write_rows([{'tweet': TWEET, 'base': BASE}] * 2)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0], list(DEFAULT_COLUMNS))
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row['extended_text'], 'extended text')
+        self.assertEqual(row['text'], 'stub tweet "quoted" #stub')
+        self.assertEqual(row['hashtags'], 'stub,tag')
+        self.assertEqual(row['created_at_exceltime'], '43986.04168981482')
+        self.assertEqual(row['fixlink'],
+                         'https://twitter.com/stub_user/status/1268346734951964672')
+        self.assertEqual(row['wakati_text'], '')
+
+    def test_002(self):
+        """列の指定 (分かち書き・extended_tweet, entities の無い Tweet), ヘッダ無し"""
+        tweet = dict(TWEET)
+        del tweet['extended_tweet']
+        del tweet['entities']
+        columns = parse_columns('id, lang,\n  hashtags extended_text wakati_text')
+        rows = write_rows([{'tweet': tweet, 'base': BASE, 'wakati': {'text': 'stub tweet'}}],
+                          columns=columns, write_header=False)
+        self.assertEqual(rows, [['1268346734951964672', 'ja', '', '', 'stub tweet']])
+
+    def test_003(self):
+        """未指定ならデフォルトの列, 不明な列名は ValueError"""
+        self.assertEqual(parse_columns(None), DEFAULT_COLUMNS)
+        with self.assertRaises(ValueError):
+            parse_columns('id, no_such_column')
+
+
+if __name__ == "__main__":
+    unittest.main()
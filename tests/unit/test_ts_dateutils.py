@@ -0,0 +1,129 @@
+# -*- codign: utf-8 -*-
+"""ts_dateutils のテスト"""
+
+import unittest
+import sys
+import os
+import random
+import datetime
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_dateutils import TweetTime, str2datetime, str2epoch, datetime2datevalue, \
+    str_to_datetime_jp, days_from_civil, civil_from_days, convert_dates, datetime2epoch, \
+    DisplayZone, get_display_zone
+from tslib import ts_dateutils
+
+
+class TestTweetTime(unittest.TestCase):
+    """TweetTime のテスト"""
+
+    def assert_same(self, datestr):
+        created = TweetTime(datestr)
+        self.assertEqual(created.datetime, str2datetime(datestr))
+        self.assertEqual(created.epoch, str2epoch(datestr))
+        self.assertEqual(created.datevalue, datetime2datevalue(str2datetime(datestr)))
+        self.assertEqual(created.jst, str_to_datetime_jp(datestr))
+
+    def test_001(self):
+        """既存の関数と同じ値になるテスト (日付の変わり目・うるう年・年末)"""
+        for datestr in ('Thu Jun 04 01:00:01 +0000 2020',
+                        'Thu Jun 04 15:00:00 +0000 2020',
+                        'Sat Feb 29 23:59:59 +0000 2020',
+                        'Thu Dec 31 14:59:59 +0000 2020',
+                        'Thu Dec 31 15:00:00 +0000 2020',
+                        'Fri Mar 01 00:00:00 +0000 2024'):
+            self.assert_same(datestr)
+
+    def test_002(self):
+        """固定の書式でない場合は strptime で解析し、不正な日付は ValueError"""
+        self.assert_same('Thu Jun 4 01:00:01 +0000 2020')
+        with self.assertRaises(ValueError):
+            TweetTime('Sun Feb 30 01:00:01 +0000 2020')
+        with self.assertRaises(ValueError):
+            TweetTime('2020-06-04 01:00:01')
+
+    def test_civil_001(self):
+        """days_from_civil / civil_from_days の往復"""
+        day = datetime.date(1900, 1, 1)
+        while day.year < 2101:
+            days = (day - datetime.date(1970, 1, 1)).days
+            self.assertEqual(days_from_civil(day.year, day.month, day.day), days)
+            self.assertEqual(civil_from_days(days), (day.year, day.month, day.day))
+            day += datetime.timedelta(days=7)
+
+
+class TestDisplayZone(unittest.TestCase):
+    """DisplayZone のテスト"""
+
+    def test_001(self):
+        """デフォルト (Asia/Tokyo) は str_to_datetime_jp() と同じ"""
+        zone = get_display_zone()
+        for datestr in ('Thu Jun 04 01:00:01 +0000 2020', 'Thu Dec 31 15:00:00 +0000 2020'):
+            self.assertEqual(TweetTime(datestr, zone).jst, str_to_datetime_jp(datestr))
+
+    def test_002(self):
+        """夏時間の切り替わる日も datetime と同じ値・略称になるテスト"""
+        for name in ('UTC', 'America/New_York', 'Europe/London', 'Australia/Lord_Howe'):
+            zone = DisplayZone(name)
+            # 2021-03-14 (米国の夏時間開始) の前後 3 日を 15 分毎
+            for epoch in range(1615507200, 1615766400, 900):
+                local = datetime.datetime.fromtimestamp(epoch, zone.tzinfo)
+                self.assertEqual(zone.format(epoch),
+                                 local.strftime('%Y-%m-%d %H:%M:%S ') + local.tzname())
+        self.assertEqual(get_display_zone('America/New_York').format(1591232401),
+                         '2020-06-03 21:00:01 EDT')
+
+    def test_003(self):
+        """不明なタイムゾーンは ValueError, epoch はホストのタイムゾーンに依らない"""
+        with self.assertRaises(ValueError):
+            DisplayZone('Nowhere/Unknown')
+        self.assertEqual(datetime2epoch(datetime.datetime(2020, 6, 4, 1, 0, 1)), 1591232401)
+
+
+class TestConvertDates(unittest.TestCase):
+    """convert_dates のテスト"""
+
+    def setUp(self):
+        rand = random.Random(1)
+        start = datetime.datetime(1000, 1, 1)
+        self.dates = [(start + datetime.timedelta(seconds=rand.randrange(8999 * 365 * 86400)))
+                      .strftime('%a %b %d %H:%M:%S +0000 %Y') for _ in range(2000)]
+        # 固定の書式でない行 (strptime で解析)
+        self.dates += ['Thu Jun 4 01:00:01 +0000 2020', 'thu jun 04 01:00:01 +0000 2020',
+                       'Sat Feb 29 23:59:59 +0000 2020', 'Fri Dec 31 14:59:59 +0000 9999']
+
+    def assert_same(self, use_numpy):
+        epochs, datevalues, jsts = convert_dates(self.dates, use_numpy=use_numpy)
+        self.assertEqual(len(epochs), len(self.dates))
+        for datestr, epoch, datevalue, jst in zip(self.dates, epochs, datevalues, jsts):
+            self.assertEqual(epoch, str2epoch(datestr))
+            self.assertEqual(datevalue, datetime2datevalue(str2datetime(datestr)))
+            self.assertEqual(jst, str_to_datetime_jp(datestr))
+
+    def test_001(self):
+        """NumPy 無しでも既存の関数と同じ値になるテスト"""
+        self.assert_same(False)
+
+    @unittest.skipIf(ts_dateutils.numpy is None, 'numpy is not installed')
+    def test_numpy_001(self):
+        """NumPy のベクトル演算で既存の関数と同じ値になるテスト"""
+        self.assert_same(True)
+
+    @unittest.skipIf(ts_dateutils.numpy is None, 'numpy is not installed')
+    def test_numpy_002(self):
+        """不正な日付は ValueError, 空のリストは空の配列"""
+        for datestr in ('Sun Feb 30 01:00:01 +0000 2020', 'Thu Jun 04 24:00:01 +0000 2020',
+                        'Xyz Jun 04 01:00:01 +0000 2020'):
+            with self.assertRaises(ValueError):
+                convert_dates(self.dates[:10] + [datestr])
+        epochs, datevalues, jsts = convert_dates([])
+        self.assertEqual((len(epochs), len(datevalues), len(jsts)), (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- codign: utf-8 -*-
+"""JSON コーデックのテスト"""
+
+import unittest
+import sys
+import os
+import json
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib import ts_json
+
+RECORD = {
+    'tweet': {
+        'id': 1268346734951964672,
+        'full_text': u'日本語 "引用" \\ </script>\n\t😀',
+        'entities': {'hashtags': [], 'urls': [{'indices': [0, 23]}]},
+        'coordinates': None,
+        'truncated': False,
+        'retweet_count': 1.5,
+    },
+    'search_metadata': {},
+}
+
+
+class TestJsonCodec(unittest.TestCase):
+    """ts_json のテスト"""
+
+    def tearDown(self):
+        ts_json.set_json_backend('auto')
+
+    def test_stdlib_001(self):
+        """標準の json は従来の json.dumps(indent=2, ensure_ascii=False) と同じ出力"""
+        ts_json.set_json_backend('json')
+        self.assertEqual(ts_json.get_json_backend(), 'json')
+        self.assertEqual(ts_json.json_dumps(RECORD, indent=2),
+                         json.dumps(RECORD, indent=2, ensure_ascii=False))
+        self.assertEqual(ts_json.json_loads(json.dumps(RECORD).encode('utf-8')), RECORD)
+
+    @unittest.skipUnless('orjson' in ts_json.available_codecs(), 'orjson is not installed')
+    def test_orjson_001(self):
+        """orjson でも標準の json と同じ出力"""
+        ts_json.set_json_backend('orjson')
+        for indent in (None, 2):
+            self.assertEqual(ts_json.json_dumps(RECORD, indent=indent),
+                             ts_json.StdlibCodec.dumps(RECORD, indent=indent))
+        # 64 bit を超える整数は標準の json で出力
+        self.assertEqual(ts_json.json_dumps({'n': 2 ** 70}), '{"n":1180591620717411303424}')
+        self.assertEqual(ts_json.json_loads(json.dumps(RECORD)), RECORD)
+
+    def test_get_codec_001(self):
+        """不明なバックエンドはエラー"""
+        with self.assertRaises(ValueError):
+            ts_json.set_json_backend('simplejson')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- codign: utf-8 -*-
+"""検索結果のインクリメンタル デコードのテスト"""
+
+import unittest
+import sys
+import os
+import json
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_jsonstream import iter_search_page, SearchPageDecoder
+
+PAGE = {
+    'statuses': [
+        {'id': 3, 'full_text': u'日本語 "引用" \\ {[括弧]}', 'entities': {'hashtags': []}},
+        {'id': 2, 'full_text': 'emoji 😀', 'coordinates': None, 'truncated': False},
+        {'id': 1, 'full_text': '', 'retweet_count': -1.5e3},
+    ],
+    'search_metadata': {'max_id': 3, 'next_results': '?max_id=0&q=x', 'count': 3},
+}
+
+
+def split(data, size):
+    """data を size バイト毎に分割"""
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestJsonStream(unittest.TestCase):
+    """iter_search_page() のテスト"""
+
+    def test_iter_search_page_001(self):
+        """どこで分割されても json.loads() と同じ結果になるテスト"""
+        for indent in (None, 2):
+            data = json.dumps(PAGE, ensure_ascii=False, indent=indent).encode('utf-8')
+            for size in (1, 2, 3, 7, 64, len(data)):
+                metadata = {}
+                statuses = list(iter_search_page(split(data, size), metadata))
+                self.assertEqual(statuses, PAGE['statuses'], (indent, size))
+                self.assertEqual(metadata, {'search_metadata': PAGE['search_metadata']})
+
+    def test_iter_search_page_002(self):
+        """要素が完結した時点で返すテスト"""
+        data = json.dumps(PAGE)
+        decoder = SearchPageDecoder()
+        first_end = data.index('}, {') + 1
+        self.assertEqual(decoder.feed(data[:first_end - 1]), [])
+        self.assertEqual(decoder.feed(data[first_end - 1:first_end]), [PAGE['statuses'][0]])
+        self.assertEqual(len(decoder.feed(data[first_end:])), 2)
+        self.assertTrue(decoder.done)
+
+    def test_iter_search_page_003(self):
+        """途中で切れたレスポンスはエラー"""
+        data = json.dumps(PAGE).encode('utf-8')
+        with self.assertRaises(ValueError):
+            list(iter_search_page([data[:-10]], {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- codign: utf-8 -*-
+"""BufferedOutput のテスト"""
+
+import unittest
+import sys
+import os
+import io
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_output import BufferedOutput
+
+
+def write_rows(output, rows):
+    for i in range(rows):
+        output.write('row {}\n'.format(i))
+        output.end_row()
+
+
+class TestBufferedOutput(unittest.TestCase):
+    """BufferedOutput のテスト"""
+
+    def test_page_001(self):
+        """page: end_page() まではファイルに書かないテスト"""
+        fp = io.StringIO()
+        output = BufferedOutput(fp, policy='page')
+        write_rows(output, 3)
+        self.assertEqual(fp.getvalue(), '')
+        output.end_page()
+        self.assertEqual(fp.getvalue().count('\n'), 3)
+        output.end_page()
+        self.assertEqual(output.flushes, 1)
+
+    def test_rows_001(self):
+        """rows: rows 行毎, checkpoint: flush() の時だけ書くテスト"""
+        fp = io.StringIO()
+        output = BufferedOutput(fp, policy='rows', rows=2)
+        write_rows(output, 5)
+        self.assertEqual(fp.getvalue().count('\n'), 4)
+        fp = io.StringIO()
+        output = BufferedOutput(fp, policy='checkpoint')
+        write_rows(output, 5)
+        output.end_page()
+        self.assertEqual(fp.getvalue(), '')
+        output.flush()
+        self.assertEqual(fp.getvalue().count('\n'), 5)
+
+    def test_max_buffer_001(self):
+        """max_buffer を超えたらポリシーに関わらずファイルに書く, 不明なポリシーは ValueError"""
+        fp = io.StringIO()
+        output = BufferedOutput(fp, policy='checkpoint', max_buffer=20)
+        write_rows(output, 5)
+        self.assertGreater(len(fp.getvalue()), 0)
+        with self.assertRaises(ValueError):
+            BufferedOutput(fp, policy='never')
+
+
+if __name__ == "__main__":
+    unittest.main()
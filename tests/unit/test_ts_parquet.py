@@ -0,0 +1,129 @@
+# -*- codign: utf-8 -*-
+"""ParquetSink のテスト (pyarrow が無ければスキップ)"""
+
+import unittest
+import sys
+import os
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_parquet import ParquetSink, part_files, pyarrow
+
+BASE = {
+    'created_at': 'Thu Jun 04 01:00:01 +0000 2020',
+    'created_at_exceltime': 43986.04168981482,
+    'created_at_epoch': 1591232401,
+    'created_at_jst': '2020-06-04 10:00:01 JST',
+}
+
+
+def make_tweet_dict(tweet_id, hashtags=('stub', 'tag')):
+    tweet = {
+        'created_at': BASE['created_at'],
+        'id': tweet_id,
+        'id_str': str(tweet_id),
+        'full_text': 'stub tweet {}'.format(tweet_id),
+        'entities': {'hashtags': [{'text': hashtag} for hashtag in hashtags]},
+        'user': {'id': 14963504, 'name': 'stub', 'screen_name': 'stub_user'},
+    }
+    return {'tweet': tweet, 'base': BASE}
+
+
+def write_pages(sink, pages, start=1):
+    """pages (ページ毎の件数) の Tweet を書き、ページ毎に flush する"""
+    tweet_id = start
+    for count in pages:
+        for _ in range(count):
+            sink.write_row(make_tweet_dict(tweet_id))
+            sink.end_row()
+            tweet_id += 1
+        sink.end_page()
+        sink.flush()
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class TestParquetSink(unittest.TestCase):
+    """ParquetSink のテスト"""
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'out.parquet')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self):
+        return pyarrow.parquet.read_table(self.path)
+
+    def test_001(self):
+        """列の型 (数値, hashtags はリスト), ページ毎に part ファイルを確定"""
+        sink = ParquetSink(self.path)
+        write_pages(sink, [3, 2])
+        sink.close()
+        self.assertEqual(len(part_files(self.path)), 2)
+        table = self.read()
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.schema.field('id').type, pyarrow.int64())
+        self.assertEqual(table.schema.field('created_at_exceltime').type, pyarrow.float64())
+        row = table.slice(0, 1).to_pylist()[0]
+        self.assertEqual(row['id'], 1)
+        self.assertEqual(row['hashtags'], ['stub', 'tag'])
+        self.assertEqual(row['extended_text'], '')
+        self.assertEqual(row['fixlink'], 'https://twitter.com/stub_user/status/1')
+        # 書き込み中の .tmp は残らない
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         sorted(os.path.basename(name) for name in part_files(self.path)))
+
+    def test_002(self):
+        """row_group_rows 行毎の row group と part_rows 行毎の part ファイル"""
+        sink = ParquetSink(self.path, row_group_rows=4, part_rows=10)
+        write_pages(sink, [6])
+        self.assertFalse(sink.durable)
+        self.assertEqual(part_files(self.path), [])
+        write_pages(sink, [6], start=7)
+        self.assertTrue(sink.durable)
+        write_pages(sink, [3], start=13)
+        sink.close()
+        parts = part_files(self.path)
+        self.assertEqual(len(parts), 2)
+        metadata = pyarrow.parquet.ParquetFile(parts[0]).metadata
+        self.assertEqual(metadata.num_rows, 12)
+        # 4 行毎と flush() の時の端数
+        self.assertEqual([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)],
+                         [4, 2, 4, 2])
+        self.assertEqual(self.read().num_rows, 15)
+
+    def test_003(self):
+        """実行毎に part ファイルを追加し、reset で既存を消す"""
+        for _ in range(2):
+            sink = ParquetSink(self.path)
+            write_pages(sink, [2])
+            sink.close()
+        self.assertEqual(len(part_files(self.path)), 2)
+        self.assertEqual(self.read().num_rows, 4)
+        sink = ParquetSink(self.path, reset=True)
+        write_pages(sink, [1])
+        sink.close()
+        self.assertEqual(self.read().num_rows, 1)
+
+    def test_004(self):
+        """スキーマの変更: merge は列の追加を許し、strict は許さない"""
+        sink = ParquetSink(self.path, columns=('id', 'text'))
+        write_pages(sink, [1])
+        sink.close()
+        with self.assertRaises(ValueError):
+            ParquetSink(self.path, columns=('id', 'text', 'lang'), schema_policy='strict')
+        with self.assertRaises(ValueError):
+            ParquetSink(self.path, schema_policy='no_such_policy')
+        sink = ParquetSink(self.path, columns=('id', 'text', 'lang'))
+        write_pages(sink, [1], start=2)
+        sink.close()
+        self.assertEqual(len(part_files(self.path)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
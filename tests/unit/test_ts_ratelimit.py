@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- cofing: utf-8 -*-
+"""Rate Limit 関連 Test Unit"""
+
+import os, sys
+import time
+import threading
+import unittest
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+from tslib import Tweets
+from tslib import TwsConfig
+from tslib.ts_ratelimit import RequestBudget, RateLimitTracker, \
+    TokenBucketPacer, LeakyBucketPacer, make_pacer, AdaptiveInterval, PRIORITY_INTERACTIVE
+from stubserver import StubServer
+
+SEARCH_ENDPOINT = 'https://api.twitter.com/1.1/search/tweets.json'
+
+class TestRequestBudget(unittest.TestCase):
+    """RequestBudget の unittest"""
+
+    def test_001(self):
+        """limit 回までは待たずに確保できるテスト"""
+        budget = RequestBudget(3, window=60)
+        start = time.monotonic()
+        for _ in range(3):
+            budget.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(budget.remaining(), 0)
+
+    def test_002(self):
+        """複数スレッドで共有しても window 内は limit 回を超えないテスト"""
+        budget = RequestBudget(4, window=0.3)
+        times = []
+        lock = threading.Lock()
+        def worker():
+            for _ in range(3):
+                budget.acquire()
+                with lock:
+                    times.append(time.monotonic())
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        times.sort()
+        self.assertEqual(len(times), 12)
+        for i in range(len(times) - 4):
+            self.assertGreaterEqual(times[i + 4] - times[i], 0.3 - 0.01)
+
+
+class TestRateLimitTracker(unittest.TestCase):
+    """RateLimitTracker の unittest"""
+
+    @staticmethod
+    def headers(limit, remaining, reset):
+        return {'x-rate-limit-limit': str(limit),
+                'x-rate-limit-remaining': str(remaining),
+                'x-rate-limit-reset': str(reset)}
+
+    def test_001(self):
+        """ヘッダからの更新と予約のテスト"""
+        tracker = RateLimitTracker()
+        self.assertIsNone(tracker.get('/search/tweets'))
+        self.assertEqual(tracker.delay('/search/tweets'), 0)   # 不明な間は待たない
+        self.assertFalse(tracker.update('search', '/search/tweets', {}))
+        reset = int(time.time()) + 600
+        self.assertTrue(tracker.update('search', '/search/tweets', self.headers(450, 2, reset)))
+        self.assertEqual(tracker.delay('/search/tweets'), 0)
+        self.assertEqual(tracker.get('/search/tweets'),
+                         {'limit': 450, 'remaining': 1, 'reset': reset})
+        self.assertGreater(tracker.delay('/search/tweets', reserve=1), 590)
+        self.assertEqual(tracker.to_status('search'),
+                         {'resources': {'search': {'/search/tweets':
+                                                   {'limit': 450, 'remaining': 1, 'reset': reset}}}})
+        self.assertEqual(tracker.to_status('statuses'), {'resources': {}})
+
+    def test_002(self):
+        """reset 時刻を過ぎたら不明に戻るテスト"""
+        tracker = RateLimitTracker()
+        tracker.update('search', '/search/tweets', self.headers(450, 0, int(time.time()) - 1))
+        self.assertIsNone(tracker.get('/search/tweets'))
+        self.assertEqual(tracker.delay('/search/tweets'), 0)
+
+    def test_003(self):
+        """Tweets が 429 を受ける前に reset 時刻まで待つテスト (スタブサーバ)"""
+        with StubServer(total_tweets=500, rate_limit=3, window=2) as server:
+            config = TwsConfig({})
+            config['dryrun'] = False
+            config['APIBaseURL'] = server.url
+            tracker = RateLimitTracker(margin=0)
+            tw = Tweets(config, SEARCH_ENDPOINT, {'q': '', 'count': 100}, tracker=tracker)
+            start = time.monotonic()
+            tweets = list(tw.generator({'q': 'query'}, retry_max=0, interval_time=0))
+            self.assertEqual(len(tweets), 500)
+            self.assertGreaterEqual(time.monotonic() - start, 1.0)
+            self.assertEqual(tw.get_limit_status(use_tracker=True)['resources']['search']
+                             ['/search/tweets']['limit'], 3)
+
+
+class TestPacer(unittest.TestCase):
+    """Pacer の unittest"""
+
+    def test_token_bucket_001(self):
+        """burst を使い切ると rate 間隔になり、予約分は interactive だけが使えるテスト"""
+        # 100 回 / 10 秒 x 100% = 10 回/秒, 予約分 = 100 x 10% = 10
+        pacer = TokenBucketPacer({'search': 100}, utilisation=1.0, reserve=0.1,
+                                 window=10, burst=3)
+        for _ in range(3):
+            self.assertEqual(pacer.delay('search'), 0)
+        self.assertAlmostEqual(pacer.delay('search'), 0.1, delta=0.01)
+        for _ in range(10):
+            self.assertEqual(pacer.delay('search', PRIORITY_INTERACTIVE), 0)
+        self.assertGreater(pacer.delay('search', PRIORITY_INTERACTIVE), 0)
+        self.assertEqual(pacer.delay('statuses'), 0)    # 上限不明の family は調整しない
+
+    def test_leaky_bucket_001(self):
+        """一定間隔で送り出すテスト"""
+        pacer = LeakyBucketPacer({'search': 100}, utilisation=1.0, reserve=0.5, window=10)
+        start = time.monotonic()
+        for _ in range(4):
+            pacer.acquire('search')
+        # bulk は 10 回/秒 x 50% = 0.2 秒間隔
+        self.assertAlmostEqual(time.monotonic() - start, 0.6, delta=0.05)
+        self.assertEqual(pacer.delay('search', PRIORITY_INTERACTIVE), 0)
+
+    def test_make_pacer_001(self):
+        """TwsConfig からの生成テスト"""
+        config = TwsConfig({})
+        self.assertIsNone(make_pacer(config))
+        config['Pacing'] = 'token_bucket'
+        config['PacingUtilisation'] = '50'
+        pacer = make_pacer(config)
+        self.assertIsInstance(pacer, TokenBucketPacer)
+        self.assertAlmostEqual(pacer.rate('search'), 450 * 0.5 / 900)
+        config['Pacing'] = 'leaky_bucket'
+        self.assertIsInstance(make_pacer(config), LeakyBucketPacer)
+        config['Pacing'] = 'unknown'
+        self.assertRaises(ValueError, make_pacer, config)
+
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+    """AdaptiveInterval の unittest"""
+
+    def test_001(self):
+        """到着率に合わせて伸縮し、新着が無ければ伸ばすテスト"""
+        interval = AdaptiveInterval(min_interval=10, max_interval=300, target=50,
+                                    limit=450, utilisation=1.0, alpha=1.0)
+        self.assertEqual(interval.update(200, 0, requests=2), 10)     # 初回は到着率不明
+        self.assertEqual(interval.update(50, 25), 25)                 # 2 件/秒 -> 25 秒
+        self.assertEqual(interval.update(5, 25), 250)                 # 0.2 件/秒 -> 250 秒
+        self.assertEqual(interval.update(0, 250), 300)                # 新着無し -> 上限
+        self.assertEqual(interval.update(500, 10), 10)                # 下限
+
+    def test_002(self):
+        """リクエスト予算による下限が上限より優先されるテスト"""
+        interval = AdaptiveInterval(min_interval=1, max_interval=30, target=50,
+                                    limit=450, utilisation=0.5)
+        # 20 回 x 900 秒 / (450 x 50%) = 80 秒
+        self.assertEqual(interval.update(2000, 1, requests=20), 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
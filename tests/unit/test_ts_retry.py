@@ -0,0 +1,102 @@
+# -*- codign: utf-8 -*-
+"""RetryPolicy のテスト"""
+
+import unittest
+import sys
+import os
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_retry import RetryPolicy, status_class, parse_retry_after, \
+    RETRY_NETWORK, RETRY_SERVER, RETRY_CLIENT, RETRY_RATE_LIMIT
+
+
+class FakeClock:
+    """時刻を手動で進める時計"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """RetryPolicy のテスト"""
+
+    def test_status_class_001(self):
+        """ステータスコードの分類"""
+        self.assertEqual(status_class(None), RETRY_NETWORK)
+        self.assertEqual(status_class(429), RETRY_RATE_LIMIT)
+        self.assertEqual(status_class(503), RETRY_SERVER)
+        self.assertEqual(status_class(404), RETRY_CLIENT)
+        self.assertEqual(parse_retry_after({'Retry-After': '7'}), 7.0)
+        self.assertIsNone(parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+        self.assertIsNone(parse_retry_after({}))
+
+    def test_backoff_001(self):
+        """指数バックオフ・上限・jitter・Retry-After"""
+        policy = RetryPolicy(base=2, cap=10, jitter=False)
+        self.assertEqual([policy.backoff(n) for n in range(1, 6)], [2, 4, 8, 10, 10])
+        self.assertEqual(policy.backoff(1, retry_after=30), 30)
+        policy = RetryPolicy(base=2, cap=10, rand=lambda: 0.5)
+        self.assertEqual(policy.backoff(3), 4)
+
+    def test_next_delay_001(self):
+        """分類毎のリトライ回数の上限とカウンタ"""
+        policy = RetryPolicy(base=1, jitter=False, budgets={RETRY_SERVER: 1})
+        self.assertEqual(policy.next_delay(RETRY_SERVER, 1, 5), 1)
+        self.assertIsNone(policy.next_delay(RETRY_SERVER, 2, 5))
+        self.assertEqual(policy.next_delay(RETRY_NETWORK, 2, 5), 2)
+        self.assertEqual(policy.counters(), {
+            'retry:server': 1, 'sleep:server': 1, 'giveup:server': 1,
+            'retry:network': 1, 'sleep:network': 2})
+
+    def test_breaker_001(self):
+        """連続失敗で開き、cooldown 後の 1 リクエストの成否で閉じる・開き直す"""
+        clock = FakeClock()
+        policy = RetryPolicy(threshold=3, cooldown=60, clock=clock)
+        for _ in range(2):
+            policy.record_failure(RETRY_SERVER)
+        policy.record_failure(RETRY_CLIENT)     # 4xx は数えない
+        self.assertEqual(policy.admit(), 0)
+        policy.record_failure(RETRY_NETWORK)
+        self.assertEqual(policy.state(), 'open')
+        self.assertEqual(policy.admit(), 60)
+
+        clock.now += 60
+        self.assertEqual(policy.admit(), 0)     # half open: 1 つだけ通す
+        self.assertEqual(policy.state(), 'half_open')
+        self.assertGreater(policy.admit(), 0)
+        policy.record_failure(RETRY_SERVER)
+        self.assertEqual(policy.state(), 'open')
+
+        clock.now += 60
+        self.assertEqual(policy.admit(), 0)
+        policy.record_success()
+        self.assertEqual(policy.state(), 'closed')
+        self.assertEqual(policy.admit(), 0)
+        self.assertEqual(policy.counters()['breaker:open'], 2)
+
+    def test_breaker_002(self):
+        """half open の試行が例外で終わったら (release_probe) 次のリクエストを試行として通す"""
+        clock = FakeClock()
+        policy = RetryPolicy(threshold=1, cooldown=60, clock=clock)
+        policy.record_failure(RETRY_SERVER)
+        clock.now += 60
+        self.assertEqual(policy.admit(), 0)
+        self.assertGreater(policy.admit(), 0)
+        policy.release_probe()
+        self.assertEqual(policy.admit(), 0)
+        self.assertEqual(policy.state(), 'half_open')
+        policy.release_probe()
+        policy.record_success()
+        policy.release_probe()      # closed なら何もしない
+        self.assertEqual(policy.state(), 'closed')
+
+
+if __name__ == "__main__":
+    unittest.main()
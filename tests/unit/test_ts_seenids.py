@@ -0,0 +1,89 @@
+# -*- codign: utf-8 -*-
+"""SeenIds のテスト"""
+
+import unittest
+import sys
+import os
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_seenids import SeenIds, bloom_size
+
+BASE_ID = 1268346734951964672
+
+
+class TestSeenIds(unittest.TestCase):
+    """SeenIds のテスト"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'seen.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_bloom_size_001(self):
+        """1% なら 1 件あたり約 9.6 ビット, ハッシュ 7 個"""
+        bits, hashes = bloom_size(1000000, 0.01)
+        self.assertEqual(bits // 1000000, 9)
+        self.assertEqual(hashes, 7)
+
+    def test_add_001(self):
+        """2 回目の add() は False, flush した記録は開き直しても残るテスト"""
+        seen = SeenIds(self.path, capacity=1000)
+        self.assertTrue(seen.add(BASE_ID))
+        self.assertFalse(seen.add(BASE_ID))
+        self.assertIn(BASE_ID, seen)
+        self.assertNotIn(BASE_ID - 1, seen)
+        seen.close()
+        seen = SeenIds(self.path, capacity=1000)
+        self.assertFalse(seen.add(str(BASE_ID)))
+        self.assertEqual(seen.counters()['duplicate'], 1)
+        seen.close()
+
+    def test_check_001(self):
+        """check() は記録せず、record() した ID だけが出力済みになるテスト"""
+        seen = SeenIds(self.path, capacity=1000)
+        self.assertFalse(seen.check(BASE_ID))
+        self.assertFalse(seen.check(BASE_ID))
+        seen.record(BASE_ID)
+        self.assertEqual(seen.pending, 1)
+        self.assertTrue(seen.check(str(BASE_ID)))
+        self.assertFalse(seen.add(BASE_ID))
+        self.assertEqual(seen.counters()['duplicate'], 2)
+        seen.close()
+
+    def test_exact_001(self):
+        """capacity を大きく超えても (偽陽性が増えても) 判定が正確なテスト"""
+        seen = SeenIds(self.path, capacity=10, error_rate=0.1)
+        ids = [BASE_ID - i * 4096 for i in range(2000)]
+        self.assertTrue(all(seen.add(tweet_id) for tweet_id in ids))
+        self.assertFalse(any(seen.add(tweet_id) for tweet_id in ids))
+        counters = seen.counters()
+        self.assertGreater(counters['false_positive'], 0)
+        self.assertEqual(counters['added'], 2000)
+        self.assertEqual(len(seen), 2000)
+        seen.close()
+
+    def test_rebuild_001(self):
+        """.bloom が無くなっても SQLite から作り直すテスト, reset で記録を消すテスト"""
+        seen = SeenIds(self.path, capacity=1000)
+        seen.add(BASE_ID)
+        seen.close()
+        os.remove(self.path + '.bloom')
+        seen = SeenIds(self.path, capacity=1000)
+        self.assertFalse(seen.add(BASE_ID))
+        self.assertEqual(seen.counters().get('false_positive', 0), 0)
+        seen.close()
+        seen = SeenIds(self.path, capacity=1000, reset=True)
+        self.assertTrue(seen.add(BASE_ID))
+        seen.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
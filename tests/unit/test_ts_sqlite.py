@@ -0,0 +1,112 @@
+# -*- codign: utf-8 -*-
+"""SqliteSink のテスト"""
+
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_sqlite import SqliteSink
+
+BASE = {
+    'created_at': 'Thu Jun 04 01:00:01 +0000 2020',
+    'created_at_exceltime': 43986.04168981482,
+    'created_at_epoch': 1591232401,
+    'created_at_jst': '2020-06-04 10:00:01 JST',
+}
+
+
+def make_tweet_dict(tweet_id, text='stub tweet', hashtags=('stub', 'tag')):
+    tweet = {
+        'created_at': BASE['created_at'],
+        'id': tweet_id,
+        'id_str': str(tweet_id),
+        'full_text': text,
+        'entities': {'hashtags': [{'text': hashtag} for hashtag in hashtags]},
+        'user': {'id': 14963504, 'name': 'stub', 'screen_name': 'stub_user'},
+    }
+    return {'tweet': tweet, 'base': BASE}
+
+
+class TestSqliteSink(unittest.TestCase):
+    """SqliteSink のテスト"""
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'out.sqlite')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def query(self, sql, *params):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def test_001(self):
+        """ページ毎に 1 トランザクション, 型のある列, WAL モード"""
+        sink = SqliteSink(self.path)
+        for tweet_id in range(1, 4):
+            sink.write_row(make_tweet_dict(tweet_id))
+            sink.end_row()
+        self.assertFalse(sink.durable)
+        sink.end_page()
+        self.assertTrue(sink.durable)
+        self.assertEqual(sink.transactions, 1)
+        self.assertEqual(self.query('SELECT COUNT(*) FROM tweets'), [(3,)])
+        self.assertEqual(self.query('PRAGMA journal_mode'), [('wal',)])
+        self.assertEqual(self.query('SELECT typeof(id), typeof(created_at_exceltime), '
+                                    'typeof(wakati_text) FROM tweets WHERE id = 1'),
+                         [('integer', 'real', 'text')])
+        sink.close()
+        self.assertTrue(sink.closed)
+
+    def test_002(self):
+        """同じ ID は upsert で 1 行 (後の値), ハッシュタグも置き換える"""
+        sink = SqliteSink(self.path)
+        sink.write_row(make_tweet_dict(1, text='old', hashtags=('old',)))
+        sink.end_page()
+        sink.write_row(make_tweet_dict(1, text='new', hashtags=('New', 'tag')))
+        sink.write_row(make_tweet_dict(2, hashtags=()))
+        sink.close()
+        self.assertEqual(self.query('SELECT id, text, hashtags FROM tweets ORDER BY id'),
+                         [(1, 'new', 'New,tag'), (2, 'stub tweet', '')])
+        self.assertEqual(self.query('SELECT id FROM hashtags WHERE hashtag = ?', 'old'), [])
+        self.assertEqual(self.query('SELECT id FROM hashtags WHERE hashtag = ?', 'new'), [(1,)])
+
+    def test_003(self):
+        """索引 (created_at_epoch, userId, ハッシュタグ)"""
+        SqliteSink(self.path).close()
+        indexes = {row[0] for row in self.query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({'tweets_created_at_epoch', 'tweets_userId', 'hashtags_id'} <= indexes)
+        plan = self.query('EXPLAIN QUERY PLAN SELECT id FROM tweets WHERE userId = 1')
+        self.assertIn('tweets_userId', plan[0][-1])
+        plan = self.query('EXPLAIN QUERY PLAN SELECT id FROM hashtags WHERE hashtag = ?', 'stub')
+        self.assertIn('PRIMARY KEY', plan[0][-1])
+
+    def test_004(self):
+        """列の追加, reset, id の無い列指定は ValueError"""
+        sink = SqliteSink(self.path, columns=('id', 'text'))
+        sink.write_row(make_tweet_dict(1))
+        sink.close()
+        sink = SqliteSink(self.path, columns=('id', 'text', 'lang', 'retweet_count'))
+        sink.write_row(make_tweet_dict(2))
+        sink.close()
+        self.assertEqual(self.query('SELECT id, lang, retweet_count FROM tweets ORDER BY id'),
+                         [(1, None, None), (2, '', None)])
+        SqliteSink(self.path, reset=True).close()
+        self.assertEqual(self.query('SELECT COUNT(*) FROM tweets'), [(0,)])
+        with self.assertRaises(ValueError):
+            SqliteSink(self.path, columns=('text',))
+
+
+if __name__ == "__main__":
+    unittest.main()
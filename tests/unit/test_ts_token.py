@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- cofing: utf-8 -*-
+"""BearerCache Test Unit"""
+
+import os, sys
+import stat
+import json
+import tempfile
+import unittest
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib.ts_token import BearerCache
+
+class TestBearerCache(unittest.TestCase):
+    """BearerCache の unittest"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cachefile = os.path.join(self.tmpdir.name, 'twsearch.bearer')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_001(self):
+        """プロセス内キャッシュのテスト"""
+        cache = BearerCache()
+        self.assertIsNone(cache.get('key1'))
+        cache.put('key1', 'token1')
+        self.assertEqual(cache.get('key1'), 'token1')
+        self.assertIsNone(cache.get('key2'))
+
+    def test_002(self):
+        """ファイルキャッシュのテスト (別インスタンス = 別プロセスから読める)"""
+        BearerCache().put('key1', 'token1', self.cachefile)
+        self.assertEqual(stat.S_IMODE(os.stat(self.cachefile).st_mode), 0o600)
+        with open(self.cachefile, encoding='utf_8') as fp:
+            self.assertNotIn('key1', fp.read())     # Consumer Key はハッシュ化して保存
+        self.assertEqual(BearerCache().get('key1', self.cachefile), 'token1')
+
+    def test_003(self):
+        """discard_token() のテスト (401 時の破棄)"""
+        cache = BearerCache()
+        cache.put('key1', 'token1', self.cachefile)
+        cache.put('key2', 'token2', self.cachefile)
+        cache.discard_token('token1')
+        self.assertIsNone(cache.get('key1'))
+        self.assertIsNone(BearerCache().get('key1', self.cachefile))
+        self.assertEqual(BearerCache().get('key2', self.cachefile), 'token2')
+        with open(self.cachefile, encoding='utf_8') as fp:
+            self.assertEqual(len(json.load(fp)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
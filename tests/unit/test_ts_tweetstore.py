@@ -0,0 +1,121 @@
+# -*- codign: utf-8 -*-
+"""TweetStore のテスト"""
+
+import unittest
+import sys
+import os
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+
+from tslib import ts_tweetstore
+from tslib.ts_tweetstore import TweetStore
+
+
+class FakeClock:
+    """時刻を手動で進める時計"""
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_tweet(tweet_id, text='text'):
+    return {'id': tweet_id, 'id_str': str(tweet_id), 'full_text': text}
+
+
+class TestTweetStore(unittest.TestCase):
+    """TweetStore のテスト"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'tweets.db')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_put_001(self):
+        """保存したものを取得でき、クローズ後も残るテスト"""
+        store = TweetStore(self.path, clock=self.clock)
+        self.assertIsNone(store.get(1))
+        store.put(make_tweet(1, u'日本語'))
+        self.assertEqual(store.get('1'), make_tweet(1, u'日本語'))
+        self.assertIsNone(store.get('not-an-id'))
+        store.close()
+        store = TweetStore(self.path, clock=self.clock)
+        self.assertEqual(store.get(1)['full_text'], u'日本語')
+        self.assertEqual(store.counters(), {'hit': 1})
+        store.close()
+
+    def test_ttl_001(self):
+        """ttl を過ぎたものは取得しない・同じ内容の再保存では期限が延びないテスト"""
+        store = TweetStore(self.path, ttl=100, clock=self.clock)
+        store.put(make_tweet(1))
+        self.clock.now += 60
+        store.put(make_tweet(1))
+        self.clock.now += 60
+        self.assertIsNone(store.get(1))
+        store.put(make_tweet(1))    # 期限切れなら保存し直す
+        self.assertIsNotNone(store.get(1))
+        self.assertEqual(store.counters(), {'put': 3, 'hit': 1, 'miss': 1, 'expired': 1})
+        store.close()
+
+    def test_evict_001(self):
+        """max_entries を超えたら最後に参照した時刻の古いものから削除するテスト"""
+        store = TweetStore(self.path, max_entries=10, clock=self.clock)
+        for tweet_id in range(10):
+            self.clock.now += 1
+            store.put(make_tweet(tweet_id))
+        self.clock.now += 1
+        store.get(0)                # 0 は最近参照した
+        self.clock.now += 1
+        store.put(make_tweet(10))
+        store.flush()
+        self.assertEqual(len(store), int(10 * ts_tweetstore.EVICT_RATIO))
+        self.assertIsNotNone(store.get(0))
+        self.assertIsNone(store.get(1))
+        self.assertEqual(store.counters()['evicted'], 2)
+        store.close()
+
+    def test_shared_001(self):
+        """flush() 後と get() の後は他のプロセス (接続) が書き込めるテスト"""
+        store1 = TweetStore(self.path, clock=self.clock)
+        store2 = TweetStore(self.path, clock=self.clock)
+        store1.put(make_tweet(1))
+        store1.flush()
+        self.assertIsNotNone(store1.get(1))     # 参照時刻の更新で書き込みロックを取らない
+        store2.put(make_tweet(2))
+        store2.flush()
+        self.assertIsNotNone(store1.get(2))
+        self.assertNotIn('error', store2.counters())
+        store1.close()
+        store2.close()
+
+    def test_locked_001(self):
+        """書き込めない (database is locked) 場合も例外を出さずに数えるテスト"""
+        timeout = ts_tweetstore.BUSY_TIMEOUT
+        ts_tweetstore.BUSY_TIMEOUT = 0.01
+        try:
+            store1 = TweetStore(self.path, clock=self.clock)
+            store2 = TweetStore(self.path, clock=self.clock)
+        finally:
+            ts_tweetstore.BUSY_TIMEOUT = timeout
+        store1.put(make_tweet(1))               # commit 前は store1 が書き込みロックを持つ
+        store2.put(make_tweet(2))
+        self.assertEqual(store2.counters(), {'error': 1})
+        store1.flush()
+        store2.put(make_tweet(2))
+        store2.flush()
+        self.assertIsNotNone(store1.get(2))
+        store1.close()
+        store2.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
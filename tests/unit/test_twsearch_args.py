@@ -291,6 +291,64 @@ class TestTwSearchArgs(unittest.TestCase):
         self.assertTrue(config['wakati'])
         del config
 
+    def test_argtest_025(self):
+        """-i (--id) 複数 ID 指定 & --missing_ids オプションテスト"""
+        config = set_sys_args('-i', '@ids.txt', '--missing_ids', 'missing.txt')
+        self.assertEqual(config['search_id'], '@ids.txt')
+        self.assertEqual(config['missing_ids'], 'missing.txt')
+        self.assertTrue(twsearch.is_multi_id(config['search_id']))
+        del config
+        config = set_sys_args('-i', '-')
+        self.assertTrue(twsearch.is_multi_id(config['search_id']))
+        self.assertIsNone(config['missing_ids'])
+        del config
+        self.assertFalse(twsearch.is_multi_id('1268346734951964672'))
+        self.assertEqual(list(twsearch.iter_search_ids('1,2, 3')), ['1', '2', '3'])
+
+    def test_argtest_026(self):
+        """--ndjson オプションテスト (JSON 出力の 1 つ, -o 不指定時は OutputFilePrefix.ndjson)"""
+        config = set_sys_args('--ndjson')
+        self.assertTrue(config['write_json'])
+        self.assertEqual(config['output_format'], 'ndjson')
+        self.assertEqual(config['outputfile'], 'twsearch.ndjson')
+        del config
+        config = set_sys_args('--ndjson', '-o', 'out.jsonl')
+        self.assertEqual(config['outputfile'], 'out.jsonl')
+        del config
+        config = set_sys_args('-j')
+        self.assertEqual(config['output_format'], 'json')
+        del config
+
+    def test_argtest_027(self):
+        """--parquet オプションテスト (-o の拡張子 .parquet でも, -o 不指定時は OutputFilePrefix.parquet)"""
+        config = set_sys_args('--parquet')
+        self.assertFalse(config['write_json'])
+        self.assertEqual(config['output_format'], 'parquet')
+        self.assertEqual(config['outputfile'], 'twsearch.parquet')
+        del config
+        config = set_sys_args('-o', 'out.Parquet')
+        self.assertEqual(config['output_format'], 'parquet')
+        del config
+        config = set_sys_args('-o', 'out.csv')
+        self.assertEqual(config['output_format'], 'csv')
+        del config
+        config = set_sys_args('--ndjson', '-o', 'out.parquet')
+        self.assertEqual(config['output_format'], 'ndjson')
+        del config
+
+    def test_argtest_028(self):
+        """--sqlite オプションテスト (-o の拡張子 .sqlite, .sqlite3 でも, -o 不指定時は OutputFilePrefix.sqlite)"""
+        config = set_sys_args('--sqlite')
+        self.assertFalse(config['write_json'])
+        self.assertEqual(config['output_format'], 'sqlite')
+        self.assertEqual(config['outputfile'], 'twsearch.sqlite')
+        del config
+        for outputfile in ('out.sqlite', 'out.sqlite3'):
+            config = set_sys_args('-o', outputfile)
+            self.assertEqual(config['output_format'], 'sqlite')
+            self.assertEqual(config['outputfile'], outputfile)
+            del config
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,89 @@
+# -*- codign: utf-8 -*-
+"""期間分割取得 (--backfill) のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import datetime
+import shelve
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig, snowflake2datetime
+from stubserver import StubServer, BASE_ID
+from mergeshards import merge_shards
+
+# 1 時間毎に 1 件
+ID_STEP = 3600 * 1000 << 22
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class TestTwSearchBackfill(unittest.TestCase):
+    """期間分割取得のテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=24 * 10, id_step=ID_STEP).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def path(self, filename):
+        return os.path.join(self.tmpdir.name, filename)
+
+    def test_split_windows_001(self):
+        """ウィンドウ分割のテスト"""
+        windows = twsearch.split_windows('2020-06-01', '2020-06-03')
+        self.assertEqual([name for name, _, _ in windows], ['20200602', '20200601'])
+        windows = twsearch.split_windows('2020-06-01', '2020-06-02', 10)
+        self.assertEqual([name for name, _, _ in windows],
+                         ['20200601T2000', '20200601T1000', '20200601T0000'])
+        self.assertEqual(windows[0][2], datetime.datetime(2020, 6, 2))
+
+    def test_generate_backfill_001(self):
+        """ウィンドウ毎のシャードへ重複・欠落なく取得し、再実行では完了済みをスキップするテスト"""
+        config = set_sys_args('--backfill', '--since_date', '2020-05-30', '--max_date', '2020-06-03',
+                              '-t', '0', '-C', '7', '--workers', '2',
+                              '-o', self.path('out.csv'), '-b', self.path('tw.shelve'), 'python')
+        config['APIBaseURL'] = self.server.url
+        self.assertEqual(twsearch.generate_backfill(config), [])
+
+        names = ['20200602', '20200601', '20200531', '20200530']
+        shards = [self.path('out_{}.csv'.format(name)) for name in names]
+        for name, shard in zip(names, shards):
+            with open(shard, encoding='utf_8_sig') as fp:
+                self.assertEqual(len(fp.read().splitlines()), 24, name)
+            with shelve.open(self.path('tw_{}.shelve'.format(name)), flag='r') as dbase:
+                self.assertTrue(dbase['completed'])
+                day = snowflake2datetime(dbase['window_max_id'] + 1)
+                self.assertEqual(day.strftime('%Y%m%d'), name)
+
+        self.assertEqual(merge_shards(shards, self.path('merged.csv')), 24 * 4)
+
+        # 完了済みのウィンドウは取得しない
+        with open(shards[0], mode='a', encoding='utf_8') as fp:
+            fp.write('marker\n')
+        self.assertEqual(twsearch.generate_backfill(config), [])
+        with open(shards[0], encoding='utf_8_sig') as fp:
+            self.assertEqual(fp.read().splitlines()[-1], 'marker')
+
+
+if __name__ == "__main__":
+    unittest.main()
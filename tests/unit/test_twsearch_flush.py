@@ -0,0 +1,100 @@
+# -*- codign: utf-8 -*-
+"""FlushPolicy と Shelve の since_id の保存のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig
+from stubserver import StubServer, BASE_ID
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class Crash(Exception):
+    """書き込み途中の異常終了"""
+
+
+class CrashingWriter(twsearch.SplunkWriterBySearch):
+    """crash_at 件目の Tweet の書き込みで異常終了する SplunkWriterBySearch"""
+    crash_at = 150
+    written = 0
+
+    def _SplunkWriter__write(self, tweet_json):     # SplunkWriter.__write() の置き換え
+        self.written += 1
+        if self.written == self.crash_at:
+            raise Crash()
+        super()._SplunkWriter__write(tweet_json)
+
+
+class TestTwSearchFlush(unittest.TestCase):
+    """異常終了しても Shelve の since_id が出力より先に進まない (残りのページを取得し直す) テスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=250).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.outputfile = os.path.join(self.tmpdir.name, 'out.csv')
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def crash(self, policy, rows=1000):
+        """crash_at 件目で異常終了した時点の (Shelve の since_id, ファイルに書かれた行数)"""
+        config = set_sys_args('-t', '0', '-O', '-o', self.outputfile,
+                              '-b', os.path.join(self.tmpdir.name, 'tw.shelve'), 'query')
+        config['APIBaseURL'] = self.server.url
+        config['FlushPolicy'] = policy
+        config['FlushRows'] = rows
+        splunk_writer = CrashingWriter(config)
+        with self.assertRaises(Crash):
+            splunk_writer.generate(config)
+        since_id = splunk_writer.get_state('since_id')
+        with open(self.outputfile, encoding='utf_8_sig') as fp:
+            lines = sum(1 for line in fp if 'stub' in line)
+        splunk_writer.close()
+        return since_id, lines
+
+    def test_page_001(self):
+        """page: ページ毎に flush するが、検索結果を最後まで取得するまで since_id は保存しない"""
+        self.assertEqual(self.crash('page'), (None, 100))
+
+    def test_checkpoint_001(self):
+        """checkpoint: since_id を保存する時 (検索結果を最後まで取得した時) だけ flush"""
+        self.assertEqual(self.crash('checkpoint'), (None, 0))
+
+    def test_rows_001(self):
+        """rows: FlushRows 件毎に flush"""
+        self.assertEqual(self.crash('rows', rows=30), (None, 120))
+
+    def test_resume_001(self):
+        """異常終了後の再実行で全件を取得し、最後まで取得してから since_id を保存する"""
+        self.crash('page')
+        config = set_sys_args('-t', '0', '-o', self.outputfile,
+                              '-b', os.path.join(self.tmpdir.name, 'tw.shelve'), 'query')
+        config['APIBaseURL'] = self.server.url
+        splunk_writer = twsearch.SplunkWriterBySearch(config)
+        self.assertEqual(splunk_writer.generate(config), 250)
+        self.assertEqual(splunk_writer.get_state('since_id'), BASE_ID)
+        splunk_writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
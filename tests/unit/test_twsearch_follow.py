@@ -0,0 +1,74 @@
+# -*- codign: utf-8 -*-
+"""--follow のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import shelve
+import tempfile
+import threading
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig
+from stubserver import StubServer, BASE_ID
+
+SEARCH_PATH = '/1.1/search/tweets.json'
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class TestTwSearchFollow(unittest.TestCase):
+    """1 つのプロセスで since_id 以降を繰り返し検索するテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=150).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def path(self, filename):
+        return os.path.join(self.tmpdir.name, filename)
+
+    def test_follow_001(self):
+        """2 回目以降のポーリングは since_id 以降だけを取得し、since_id を Shelve に保存するテスト"""
+        config = set_sys_args('--follow', '-t', '0', '-o', self.path('out.csv'),
+                              '-b', self.path('tw.shelve'), 'query')
+        config['APIBaseURL'] = self.server.url
+        config['FollowMinInterval'] = 0.05
+        config['SearchRateLimit'] = 1000000
+        splunk_writer = twsearch.SplunkWriterByFollow(config)
+        timer = threading.Timer(0.5, splunk_writer.stop)
+        timer.start()
+        splunk_writer.generate(config)
+        timer.join()
+        splunk_writer.close()
+
+        counters = self.server.counters()
+        # 1 回目は 2 ページ, 2 回目以降は新着無しの 1 ページ (間隔は 0.05, 0.1, 0.2, ... 秒)
+        self.assertGreaterEqual(counters[SEARCH_PATH], 4)
+        self.assertEqual(counters['tweets'], 150)
+        with open(self.path('out.csv'), encoding='utf_8_sig') as fp:
+            self.assertEqual(len(fp.read().splitlines()), 150)
+        with shelve.open(self.path('tw.shelve'), flag='r') as dbase:
+            self.assertEqual(dbase['since_id'], BASE_ID)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+# -*- codign: utf-8 -*-
+"""複数 ID 取得 (statuses/lookup) のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import json
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig, FatalResponseError
+from stubserver import StubServer, BASE_ID
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class TestTwSearchLookup(unittest.TestCase):
+    """-i @file による複数 ID 取得のテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=1000).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def test_lookup_001(self):
+        """250 件 (うち 2 件は存在しない ID) を 100 件ずつ取得するテスト"""
+        idsfile = os.path.join(self.tmpdir.name, 'ids.txt')
+        outputfile = os.path.join(self.tmpdir.name, 'out.json')
+        missingfile = os.path.join(self.tmpdir.name, 'missing.txt')
+        ids = [str(BASE_ID - i) for i in range(248)] + ['1', str(BASE_ID + 1)]
+        with open(idsfile, mode='w', encoding='utf_8') as fp:
+            fp.write('# comment\n' + '\n'.join(ids) + '\n')
+
+        config = set_sys_args('-i', '@' + idsfile, '-j', '-o', outputfile,
+                              '--missing_ids', missingfile)
+        config['APIBaseURL'] = self.server.url
+        splunk_writer = twsearch.SplunkWriterBySearch(config)
+        splunk_writer.generate(config)
+        splunk_writer.flush()
+        del splunk_writer
+
+        decoder = json.JSONDecoder()
+        with open(outputfile, encoding='utf_8') as fp:
+            text = fp.read()
+        records = []
+        pos = 0
+        while text[pos:].strip():
+            record, end = decoder.raw_decode(text, pos)
+            records.append(record)
+            pos = end + 1
+        self.assertEqual([r['tweet']['id_str'] for r in records], ids[:248])
+        with open(missingfile, encoding='utf_8') as fp:
+            self.assertEqual(fp.read().split(), ids[248:])
+
+
+    def test_lookup_error_001(self):
+        """リトライをあきらめたバッチの ID は missing_ids に書かず、エラーにするテスト"""
+        self.server.httpd.error_every = 2       # 2 回目のリクエスト (2 つ目のバッチ) を 503 にする
+        idsfile = os.path.join(self.tmpdir.name, 'ids.txt')
+        outputfile = os.path.join(self.tmpdir.name, 'out.csv')
+        missingfile = os.path.join(self.tmpdir.name, 'missing.txt')
+        with open(idsfile, mode='w', encoding='utf_8') as fp:
+            fp.write('\n'.join(str(BASE_ID - i) for i in range(150)) + '\n')
+
+        config = set_sys_args('-i', '@' + idsfile, '-o', outputfile,
+                              '--missing_ids', missingfile)
+        config['APIBaseURL'] = self.server.url
+        config['RetryBudgetServer'] = 0
+        splunk_writer = twsearch.SplunkWriterBySearch(config)
+        with self.assertRaises(FatalResponseError) as cm:
+            splunk_writer.generate(config)
+        self.assertEqual(cm.exception.exit_code, 1)
+        splunk_writer.close()
+
+        with open(outputfile, encoding='utf_8_sig') as fp:
+            self.assertEqual(sum(1 for line in fp if 'stub' in line), 100)
+        with open(missingfile, encoding='utf_8') as fp:
+            self.assertEqual(fp.read(), '')
+        self.assertEqual(self.server.counters()['status:503'], 1)
+
+    def test_lookup_cache_001(self):
+        """2 回目の取得は Tweet ストアから返し、API を呼ばないテスト"""
+        ids = ','.join(str(BASE_ID - i) for i in range(5))
+        cachefile = os.path.join(self.tmpdir.name, 'tweets.db')
+        for run, no_cache in ((1, False), (2, False), (3, True)):
+            outputfile = os.path.join(self.tmpdir.name, 'out{}.json'.format(run))
+            args = ['-i', ids, '-j', '-o', outputfile] + (['--no-cache'] if no_cache else [])
+            config = set_sys_args(*args)
+            config['APIBaseURL'] = self.server.url
+            config['TweetCacheFile'] = cachefile
+            splunk_writer = twsearch.SplunkWriterBySearch(config)
+            splunk_writer.generate(config)
+            counters = splunk_writer.store_counters()
+            splunk_writer.close()
+            remaining = self.server.httpd.limits['/statuses/lookup'][0]
+            if run == 1:
+                self.assertEqual(counters['miss'], 5)
+                first_remaining = remaining
+            elif run == 2:
+                self.assertEqual(counters['hit'], 5)
+                self.assertEqual(remaining, first_remaining)
+            else:
+                self.assertEqual(counters, {})
+                self.assertEqual(remaining, first_remaining - 1)
+            with open(outputfile, encoding='utf_8') as fp:
+                self.assertEqual(fp.read().count('"created_at_epoch"'), 5, run)
+
+
+if __name__ == "__main__":
+    unittest.main()
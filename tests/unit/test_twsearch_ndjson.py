@@ -0,0 +1,75 @@
+# -*- codign: utf-8 -*-
+"""--ndjson 出力のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import json
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig
+from stubserver import StubServer
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+def load_records(text):
+    """JSON を並べたテキスト (-j の出力) を読む"""
+    decoder = json.JSONDecoder()
+    records = []
+    pos = 0
+    while text[pos:].strip():
+        pos = len(text) - len(text[pos:].lstrip())
+        record, pos = decoder.raw_decode(text, pos)
+        records.append(record)
+    return records
+
+
+class TestTwSearchNdjson(unittest.TestCase):
+    """--ndjson は -j と同じ内容を 1 行 1 JSON で出力するテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=150).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def search(self, *args):
+        outputfile = os.path.join(self.tmpdir.name, 'out')
+        config = set_sys_args('-t', '0', '-O', '-o', outputfile,
+                              '-b', os.path.join(self.tmpdir.name, 'tw.shelve'), '-B', *args)
+        config['APIBaseURL'] = self.server.url
+        splunk_writer = twsearch.SplunkWriterBySearch(config)
+        splunk_writer.generate(config)
+        splunk_writer.close()
+        with open(outputfile, encoding='utf_8') as fp:
+            return fp.read()
+
+    def test_ndjson_001(self):
+        """1 行 1 件で、-j の出力と同じ内容"""
+        lines = self.search('--ndjson', 'query').splitlines()
+        self.assertEqual(len(lines), 150)
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(records, load_records(self.search('-j', 'query')))
+        self.assertEqual(records[0]['base']['created_at_epoch'], records[0]['created_time'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- codign: utf-8 -*-
+"""Parquet 出力のテスト (ローカル スタブサーバを使用, pyarrow が無ければスキップ)"""
+
+import unittest
+import sys
+import os
+import copy
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig
+from tslib.ts_parquet import part_files, pyarrow
+from stubserver import StubServer, BASE_ID
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class Crash(Exception):
+    """書き込み途中の異常終了"""
+
+
+class CrashingWriter(twsearch.SplunkWriterBySearch):
+    """150 件目の Tweet の書き込みで異常終了する SplunkWriterBySearch"""
+    written = 0
+
+    def _SplunkWriter__write(self, tweet_json):     # SplunkWriter.__write() の置き換え
+        self.written += 1
+        if self.written == 150:
+            raise Crash()
+        super()._SplunkWriter__write(tweet_json)
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class TestTwSearchParquet(unittest.TestCase):
+    """-o *.parquet の出力と since_id の保存のテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=250).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.outputdir = os.path.join(self.tmpdir.name, 'out.parquet')
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def make_config(self, *args):
+        config = set_sys_args('-t', '0', '-o', self.outputdir,
+                              '-b', os.path.join(self.tmpdir.name, 'tw.shelve'), *args)
+        config['APIBaseURL'] = self.server.url
+        return config
+
+    def test_parquet_001(self):
+        """拡張子で Parquet 出力になり、ページ毎の row group, since_id の保存時に part ファイル"""
+        config = self.make_config('-O', 'query')
+        self.assertEqual(config['output_format'], 'parquet')
+        splunk_writer = twsearch.SplunkWriterBySearch(config)
+        splunk_writer.generate(config)
+        splunk_writer.close()
+        parts = part_files(self.outputdir)
+        self.assertEqual(len(parts), 1)
+        self.assertEqual(sum(pyarrow.parquet.ParquetFile(part).metadata.num_row_groups
+                             for part in parts), 3)
+        table = pyarrow.parquet.read_table(self.outputdir)
+        self.assertEqual(table.num_rows, 250)
+        self.assertEqual(max(table.column('id').to_pylist()), BASE_ID)
+
+    def test_parquet_002(self):
+        """ParquetPartRows: part ファイルが確定するまで since_id を保存しない"""
+        config = self.make_config('-O', 'query')
+        config['ParquetPartRows'] = 1000
+        splunk_writer = CrashingWriter(config)
+        with self.assertRaises(Crash):
+            splunk_writer.generate(config)
+        self.assertIsNone(splunk_writer.get_state('since_id'))
+        self.assertEqual(part_files(self.outputdir), [])
+        # close() で part ファイルを確定してから保存する
+        splunk_writer.close()
+        self.assertEqual(pyarrow.parquet.read_table(self.outputdir).num_rows, 149)
+
+    def test_parquet_003(self):
+        """--serve では使えない"""
+        server = twsearch.QueryServer.__new__(twsearch.QueryServer)
+        with tempfile.TemporaryFile(mode='w+') as err:
+            self.assertEqual(server.run_job(['--parquet', 'query'], None, err), 2)
+            err.seek(0)
+            self.assertIn('parquet', err.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- codign: utf-8 -*-
+"""複数検索 (-q) のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import shelve
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig
+from stubserver import StubServer, BASE_ID
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class TestTwSearchQueries(unittest.TestCase):
+    """複数検索のテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=150).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def path(self, filename):
+        return os.path.join(self.tmpdir.name, filename)
+
+    def test_load_queries_001(self):
+        """Queries の解析テスト"""
+        config = set_sys_args('-q')
+        config['Queries'] = "# comment\npy\tpython lang:ja\n\ntag\t#janome\nfoo bar\nfoo bar\n"
+        self.assertEqual(twsearch.load_queries(config),
+                         [('py', 'python lang:ja'), ('tag', '#janome'),
+                          ('foo_bar', 'foo bar'), ('foo_bar_3', 'foo bar')])
+        self.assertEqual(twsearch.query_filename('out/twsearch.csv', 'py'), 'out/twsearch_py.csv')
+
+    def test_generate_queries_001(self):
+        """検索毎に Shelve・出力ファイルを分けて同時に実行するテスト"""
+        queriesfile = self.path('queries.txt')
+        with open(queriesfile, mode='w', encoding='utf_8') as fp:
+            fp.write('a\tquery a\nb\tquery b\nc\tquery c\n')
+        config = set_sys_args('-q', queriesfile, '-t', '0', '--workers', '3',
+                              '-o', self.path('out.csv'), '-b', self.path('tw.shelve'))
+        config['APIBaseURL'] = self.server.url
+        queries = twsearch.load_queries(config)
+        self.assertEqual(twsearch.generate_queries(config, queries), [])
+        for name in ('a', 'b', 'c'):
+            with open(self.path('out_{}.csv'.format(name)), encoding='utf_8_sig') as fp:
+                self.assertEqual(len(fp.read().splitlines()), 150)
+            with shelve.open(self.path('tw_{}.shelve'.format(name)), flag='r') as dbase:
+                self.assertEqual(dbase['since_id'], BASE_ID)
+
+
+if __name__ == "__main__":
+    unittest.main()
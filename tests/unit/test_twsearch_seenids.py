@@ -0,0 +1,111 @@
+# -*- codign: utf-8 -*-
+"""SeenIdFile による重複出力の抑止のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig
+from stubserver import StubServer
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class Crash(Exception):
+    """書き込み途中の異常終了"""
+
+
+class CrashingWriter(twsearch.SplunkWriterBySearch):
+    """crash_at 件目の Tweet の書き込みで異常終了する SplunkWriterBySearch"""
+    crash_at = 120
+    written = 0
+
+    def _SplunkWriter__write(self, tweet_json):     # SplunkWriter.__write() の置き換え
+        self.written += 1
+        if self.written == self.crash_at:
+            raise Crash()
+        super()._SplunkWriter__write(tweet_json)
+
+
+class TestTwSearchSeenIds(unittest.TestCase):
+    """同じ範囲を再検索しても出力済みの Tweet を書かないテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=150).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def path(self, filename):
+        return os.path.join(self.tmpdir.name, filename)
+
+    def search(self, *args):
+        # -B: since_id を使わない (クラッシュ後の再実行で同じ範囲を取得し直す場合に相当)
+        config = set_sys_args('-t', '0', '-b', self.path('tw.shelve'), '-B', *args)
+        config['APIBaseURL'] = self.server.url
+        config['SeenIdFile'] = self.path('seen.db')
+        splunk_writer = twsearch.SplunkWriterBySearch(config)
+        splunk_writer.generate(config)
+        counters = splunk_writer.seen_counters()
+        splunk_writer.close()
+        return counters
+
+    def count_lines(self, filename, marker):
+        with open(filename, encoding='utf_8_sig') as fp:
+            return sum(1 for line in fp if marker in line)
+
+    def test_seen_csv_001(self):
+        """CSV: 2 回目の実行では何も追記しない, -O で作り直すと記録も消えるテスト"""
+        outputfile = self.path('out.csv')
+        self.assertEqual(self.search('-o', outputfile, 'query').get('added'), 150)
+        counters = self.search('-o', outputfile, 'query')
+        self.assertEqual((counters.get('added', 0), counters['duplicate']), (0, 150))
+        self.assertEqual(self.count_lines(outputfile, 'stub'), 150)
+        self.assertEqual(self.search('-O', '-o', outputfile, 'query').get('added'), 150)
+        self.assertEqual(self.count_lines(outputfile, 'stub'), 150)
+
+    def test_seen_crash_001(self):
+        """書き込み中に異常終了した Tweet は記録されず、再実行で出力されるテスト"""
+        outputfile = self.path('out.csv')
+        config = set_sys_args('-t', '0', '-b', self.path('tw.shelve'), '-B',
+                              '-o', outputfile, 'query')
+        config['APIBaseURL'] = self.server.url
+        config['SeenIdFile'] = self.path('seen.db')
+        splunk_writer = CrashingWriter(config)
+        with self.assertRaises(Crash):
+            splunk_writer.generate(config)
+        splunk_writer.close()
+        self.assertEqual(self.count_lines(outputfile, 'stub'), 119)
+        counters = self.search('-o', outputfile, 'query')
+        self.assertEqual((counters['added'], counters['duplicate']), (31, 119))
+        self.assertEqual(self.count_lines(outputfile, 'stub'), 150)
+
+    def test_seen_json_001(self):
+        """JSON: 2 回目の実行では何も追記しないテスト"""
+        outputfile = self.path('out.json')
+        self.search('-j', '-o', outputfile, 'query')
+        self.assertEqual(self.search('-j', '-o', outputfile, 'query')['duplicate'], 150)
+        self.assertEqual(self.count_lines(outputfile, '"created_at_epoch"'), 150)
+
+
+if __name__ == "__main__":
+    unittest.main()
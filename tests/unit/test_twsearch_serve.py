@@ -0,0 +1,92 @@
+# -*- codign: utf-8 -*-
+"""--serve (常駐サーバ) と twsclient.py のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import io
+import copy
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+import twsclient
+from tslib import TwsConfig
+from stubserver import StubServer, BASE_ID
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class TestTwSearchServe(unittest.TestCase):
+    """常駐サーバに送ったジョブの結果がファイルに書いた場合と同じになるテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=150).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config = set_sys_args('--serve', self.path('tws.sock'))
+        config['APIBaseURL'] = self.server.url
+        self.query_server = twsearch.QueryServer(config, config['serve']).start()
+
+    def tearDown(self):
+        self.query_server.stop()
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def path(self, filename):
+        return os.path.join(self.tmpdir.name, filename)
+
+    def request(self, *argv):
+        out, err = io.BytesIO(), io.BytesIO()
+        code = twsclient.request(self.path('tws.sock'), twsclient.prepare_argv(list(argv)),
+                                 out, err)
+        return code, out.getvalue().decode('utf-8'), err.getvalue().decode('utf-8')
+
+    def write_file(self, *argv):
+        config = set_sys_args('-o', self.path('expected.out'), '-O',
+                              '-b', self.path('tw.shelve'), '-B', *argv)
+        config['APIBaseURL'] = self.server.url
+        splunk_writer = twsearch.SplunkWriterBySearch(config)
+        splunk_writer.generate(config)
+        splunk_writer.close()
+        with open(self.path('expected.out'), encoding='utf_8_sig', newline='') as fp:
+            return fp.read()
+
+    def test_serve_csv_001(self):
+        """検索 (CSV)"""
+        code, out, _ = self.request('-t', '0', '-w', 'query')
+        self.assertEqual(code, 0)
+        self.assertEqual(len(out.splitlines()), 151)
+        self.assertEqual(out, self.write_file('-t', '0', '-w', 'query'))
+
+    def test_serve_json_001(self):
+        """ID 取得 (JSON, @ファイル名はクライアント側で展開), 取得できなかった ID はエラー出力"""
+        idsfile = self.path('ids.txt')
+        with open(idsfile, mode='w', encoding='utf_8') as fp:
+            fp.write('{}\n{}  # comment\n1\n'.format(BASE_ID, BASE_ID - 1))
+        code, out, err = self.request('-j', '-i', '@' + idsfile)
+        self.assertEqual(code, 0)
+        self.assertEqual(out, self.write_file('-j', '-i', '{},{}'.format(BASE_ID, BASE_ID - 1)))
+        self.assertEqual(err, '1\n')
+
+    def test_serve_error_001(self):
+        """サーバでは実行しないオプション"""
+        code, out, err = self.request('-q')
+        self.assertEqual((code, out), (2, ''))
+        self.assertIn('not supported', err)
+
+
+if __name__ == "__main__":
+    unittest.main()
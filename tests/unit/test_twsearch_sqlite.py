@@ -0,0 +1,102 @@
+# -*- codign: utf-8 -*-
+"""SQLite 出力のテスト (ローカル スタブサーバを使用)"""
+
+import unittest
+import sys
+import os
+import copy
+import sqlite3
+import tempfile
+
+DIR_BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../..'))
+sys.path.insert(0, os.path.join(DIR_BASE,'../../lib'))
+sys.path.insert(0, os.path.join(DIR_BASE, '../../tools'))
+
+import twsearch
+from tslib import TwsConfig
+from stubserver import StubServer, BASE_ID
+
+def set_sys_args(*args):
+    del sys.argv[:]
+    sys.argv.append('prog') # argv[0]
+    for arg in args:
+        sys.argv.append(arg)
+    return TwsConfig(twsearch.tw_argparse())
+
+
+class Crash(Exception):
+    """書き込み途中の異常終了"""
+
+
+class CrashingWriter(twsearch.SplunkWriterBySearch):
+    """150 件目の Tweet の書き込みで異常終了する SplunkWriterBySearch"""
+    written = 0
+
+    def _SplunkWriter__write(self, tweet_json):     # SplunkWriter.__write() の置き換え
+        self.written += 1
+        if self.written == 150:
+            raise Crash()
+        super()._SplunkWriter__write(tweet_json)
+
+
+class TestTwSearchSqlite(unittest.TestCase):
+    """-o *.sqlite の出力と since_id の保存のテスト"""
+    def setUp(self):
+        self.sys_argv = copy.deepcopy(sys.argv)
+        self.server = StubServer(total_tweets=250).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.outputfile = os.path.join(self.tmpdir.name, 'out.sqlite')
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+        del sys.argv[:]
+        sys.argv = copy.deepcopy(self.sys_argv)
+
+    def make_config(self, *args):
+        config = set_sys_args('-t', '0', '-o', self.outputfile,
+                              '-b', os.path.join(self.tmpdir.name, 'tw.shelve'), *args)
+        config['APIBaseURL'] = self.server.url
+        return config
+
+    def count(self):
+        conn = sqlite3.connect(self.outputfile)
+        try:
+            return conn.execute('SELECT COUNT(*), MAX(id) FROM tweets').fetchone()
+        finally:
+            conn.close()
+
+    def test_sqlite_001(self):
+        """拡張子で SQLite 出力になり、同じ Tweet を取得し直しても 1 行"""
+        for _ in range(2):
+            config = self.make_config('-B', 'query')
+            self.assertEqual(config['output_format'], 'sqlite')
+            splunk_writer = twsearch.SplunkWriterBySearch(config)
+            splunk_writer.generate(config)
+            splunk_writer.close()
+        self.assertEqual(self.count(), (250, BASE_ID))
+
+    def test_sqlite_002(self):
+        """ページ毎に commit し、異常終了した場合は since_id を保存しない"""
+        config = self.make_config('-O', 'query')
+        splunk_writer = CrashingWriter(config)
+        with self.assertRaises(Crash):
+            splunk_writer.generate(config)
+        self.assertIsNone(splunk_writer.get_state('since_id'))
+        self.assertEqual(self.count(), (100, BASE_ID))
+        splunk_writer.close()
+
+    def test_sqlite_003(self):
+        """--serve では使えない"""
+        server = twsearch.QueryServer.__new__(twsearch.QueryServer)
+        with tempfile.TemporaryFile(mode='w+') as err:
+            self.assertEqual(server.run_job(['--sqlite', 'query'], None, err), 2)
+            err.seek(0)
+            self.assertIn('sqlite', err.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""CSV 出力のベンチマーク (rows/sec)
+
+従来の SplunkWriter.__write() (Tweet 毎に fieldnames と csv.DictWriter を作り、中間の dict を経由) と
+CsvRowWriter (列の一覧から 1 回だけ組み立てた取り出し関数と 1 つの csv.writer) を比較する。
+コーパスは twsearch.py -j の出力 (または Tweet の JSON を並べたファイル) を -c で指定する
+(未指定時は bench_stream.make_page() で生成)。
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_stream import make_page                  # pylint: disable=wrong-import-position
+from tslib import TweetTime, CsvRowWriter           # pylint: disable=wrong-import-position
+from tslib.ts_csvrow import DEFAULT_COLUMNS         # pylint: disable=wrong-import-position
+
+
+def load_corpus(filename):
+    """twsearch.py -j の出力 (JSON を並べたもの) から Tweet のリストを読む"""
+    with open(filename, mode='r', encoding='utf_8') as fp:
+        data = fp.read()
+    decoder = json.JSONDecoder()
+    tweets = []
+    pos = 0
+    while True:
+        while pos < len(data) and data[pos].isspace():
+            pos += 1
+        if pos >= len(data):
+            return tweets
+        obj, pos = decoder.raw_decode(data, pos)
+        tweets.append(obj['tweet'] if 'tweet' in obj else obj)
+
+
+def make_tweet_dicts(tweets):
+    """SplunkWriter.convert() が __write() に渡す tweet_dict の形にする"""
+    tweet_dicts = []
+    for tweet in tweets:
+        created = TweetTime(tweet['created_at'])
+        tweet_dicts.append({'created_time': created.epoch,
+                            'base': {'created_at': tweet['created_at'],
+                                     'created_at_exceltime': created.datevalue,
+                                     'created_at_epoch': created.epoch,
+                                     'created_at_jst': created.jst},
+                            'tweet': tweet})
+    return tweet_dicts
+
+
+def legacy_write(outfp, tweet_json, header):
+    """従来の SplunkWriter.__write() の CSV 部分 (extended_text が空になる不具合もそのまま)"""
+    fieldnames = [
+        'created_at_exceltime', 'created_at_epoch', 'created_at', 'created_at_jst',
+        'text', 'extended_text', 'hashtags', 'id', 'userId', 'name', 'screen_name', 'fixlink',
+        'wakati_text', 'wakati_extended_text'
+        ]
+    writer = csv.DictWriter(outfp, fieldnames=fieldnames,
+                            extrasaction='ignore', quoting=csv.QUOTE_ALL)
+    if header:
+        writer.writeheader()
+    tweet = tweet_json['tweet']
+    base = tweet_json['base']
+    workuser = tweet['user']
+    textkey = 'full_text' if 'full_text' in tweet else 'text'
+    extended_full_text = tweet['extended_tweet']['full_text'] if 'extended_tweet' in tweet else ''
+    entities = tweet['entities'] if 'entities' in tweet else {'hashtags': [{'text': ''}]}
+    writer.writerow({
+        'userId': workuser['id'],
+        'name': workuser['name'],
+        'screen_name': workuser['screen_name'],
+        'text': str(tweet[textkey]),
+        'extended_full_text': str(extended_full_text),
+        'hashtags': ','.join([ent['text'] for ent in entities['hashtags']]),
+        'id': tweet['id'],
+        'created_at': base['created_at'],
+        'created_at_exceltime': base['created_at_exceltime'],
+        'created_at_epoch': base['created_at_epoch'],
+        'created_at_jst': base['created_at_jst'],
+        'fixlink': 'https://twitter.com/' + workuser['screen_name'] + '/status/' + tweet['id_str'],
+        'wakati_text': '',
+        'wakati_extended_text': ''
+        })
+
+
+def run_legacy(tweet_dicts):
+    """従来の方法で全件を書き込んだ CSV"""
+    outfp = io.StringIO()
+    for i, tweet_dict in enumerate(tweet_dicts):
+        legacy_write(outfp, tweet_dict, i == 0)
+    return outfp.getvalue()
+
+
+def run_projector(tweet_dicts):
+    """CsvRowWriter で全件を書き込んだ CSV"""
+    outfp = io.StringIO()
+    writer = CsvRowWriter(outfp, DEFAULT_COLUMNS)
+    for tweet_dict in tweet_dicts:
+        writer.writerow(tweet_dict)
+    return outfp.getvalue()
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--corpus', type=str, default=None,
+                        help=u'コーパス (twsearch.py -j の出力, 未指定時は生成)')
+    parser.add_argument('-n', '--number', type=int, default=20000,
+                        help=u'コーパスを生成する場合の件数 (デフォルト 20000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help=u'繰り返し回数 (最小値を使う, デフォルト 3)')
+    args = parser.parse_args()
+
+    if args.corpus:
+        tweets = load_corpus(args.corpus)
+    else:
+        tweets = []
+        while len(tweets) < args.number:
+            tweets.extend(make_page()['statuses'])
+        tweets = tweets[:args.number]
+    tweet_dicts = make_tweet_dicts(tweets)
+
+    # extended_text 以外は従来と同じ出力になること
+    index = DEFAULT_COLUMNS.index('extended_text')
+    legacy_rows = list(csv.reader(io.StringIO(run_legacy(tweet_dicts[:1000]))))
+    rows = list(csv.reader(io.StringIO(run_projector(tweet_dicts[:1000]))))
+    assert [row[:index] + row[index + 1:] for row in legacy_rows] == \
+        [row[:index] + row[index + 1:] for row in rows]
+
+    print('rows: {}'.format(len(tweet_dicts)))
+    print('{:36} {:>12}'.format('', 'rows/sec'))
+    results = {}
+    for name, func in (('legacy (DictWriter per tweet)', run_legacy),
+                       ('CsvRowWriter', run_projector)):
+        best = min(_timed(func, tweet_dicts) for _ in range(args.repeat))
+        results[name] = len(tweet_dicts) / best
+        print('{:36} {:12.0f}'.format(name, results[name]))
+    print('speedup: {:.1f}x'.format(results['CsvRowWriter'] /
+                                   results['legacy (DictWriter per tweet)']))
+
+
+def _timed(func, tweet_dicts):
+    """func(tweet_dicts) の秒数"""
+    start = time.perf_counter()
+    func(tweet_dicts)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""created_at の時刻変換のマイクロベンチマーク
+
+従来の SplunkWriter の 1 件分 (convert() と __write() で str2datetime() が 8 回) と、
+TweetTime で 1 回だけ解析する場合、convert_dates() で全件をまとめて変換する場合
+(NumPy がインストールされていればベクトル演算) の 1 件あたりの時間を比較する。
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tslib import ts_dateutils                  # pylint: disable=wrong-import-position
+from tslib.ts_dateutils import TweetTime, str2datetime, str2epoch, datetime2datevalue, \
+    str_to_datetime_jp, convert_dates           # pylint: disable=wrong-import-position
+
+
+def make_dates(number):
+    """2010〜2022 年のランダムな created_at を number 件"""
+    rand = random.Random(1)
+    start = datetime.datetime(2010, 1, 1)
+    return [(start + datetime.timedelta(seconds=rand.randrange(12 * 365 * 86400)))
+            .strftime('%a %b %d %H:%M:%S +0000 %Y') for _ in range(number)]
+
+
+def legacy_tweet(datestr):
+    """従来の convert() + __write() の 1 件分"""
+    str2datetime(datestr)                               # since_date
+    str2epoch(datestr)                                  # created_time
+    datetime2datevalue(str2datetime(datestr))           # base
+    str2epoch(datestr)
+    str_to_datetime_jp(datestr)
+    datetime2datevalue(str2datetime(datestr))           # __write() (CSV)
+    str2epoch(datestr)
+    str_to_datetime_jp(datestr)
+
+
+def legacy_fields(datestr):
+    """従来の関数で 4 つの値を 1 回ずつ求める"""
+    return (str2datetime(datestr), str2epoch(datestr),
+            datetime2datevalue(str2datetime(datestr)), str_to_datetime_jp(datestr))
+
+
+def tweet_time(datestr):
+    """TweetTime で 1 件分"""
+    created = TweetTime(datestr)
+    return created.datetime, created.epoch, created.datevalue, created.jst
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=20000,
+                        help=u'created_at の件数 (デフォルト 20000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help=u'繰り返し回数 (最小値を使う, デフォルト 3)')
+    args = parser.parse_args()
+
+    dates = make_dates(args.number)
+    for datestr in dates[:1000]:
+        assert tweet_time(datestr) == legacy_fields(datestr), datestr
+    batches = [('convert_dates (batch, list)', False)]
+    if ts_dateutils.numpy is not None:
+        batches.append(('convert_dates (batch, numpy)', True))
+    for _, use_numpy in batches:
+        epochs, datevalues, jsts = convert_dates(dates[:1000], use_numpy=use_numpy)
+        assert list(zip(epochs, datevalues, jsts)) == \
+            [legacy_fields(datestr)[1:] for datestr in dates[:1000]]
+
+    print('{:36} {:>14}'.format('', 'us/tweet'))
+    results = {}
+    funcs = [('legacy (convert + __write, 8 parses)', lambda: [legacy_tweet(d) for d in dates]),
+             ('legacy (4 fields, 5 parses)', lambda: [legacy_fields(d) for d in dates]),
+             ('TweetTime (1 parse)', lambda: [tweet_time(d) for d in dates])]
+    funcs += [(name, lambda use_numpy=use_numpy: convert_dates(dates, use_numpy=use_numpy))
+              for name, use_numpy in batches]
+    for name, func in funcs:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        results[name] = best
+        print('{:36} {:14.2f}'.format(name, best / len(dates) * 1e6))
+    print('speedup vs convert + __write: {:.1f}x'.format(
+        results['legacy (convert + __write, 8 parses)'] / results['TweetTime (1 parse)']))
+    if ts_dateutils.numpy is not None:
+        print('batch (numpy) vs TweetTime: {:.1f}x'.format(
+            results['TweetTime (1 parse)'] / results['convert_dates (batch, numpy)']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""SplunkWriterBySearch.generate の end to end ベンチマーク (ローカル スタブサーバ使用)
+
+CSV, JSON (-j), NDJSON (--ndjson), 分かち書き (--wakati) の各モードで、スタブサーバから total_tweets 件を検索して
+ファイルに出力し、tweets/sec, requests/sec, ピーク RSS を出力する。
+ピーク RSS をモード毎に測るため、各モードは子プロセスで実行する。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+DIR_BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIR_BASE, '..'))
+
+from stubserver import StubServer           # pylint: disable=wrong-import-position
+
+MODES = {
+    'csv': [],
+    'json': ['-j'],
+    'ndjson': ['--ndjson'],
+    'wakati': ['--wakati'],
+}
+
+SEARCH_PATH = '/1.1/search/tweets.json'
+
+
+def peak_rss():
+    """このプロセスのピーク RSS (KB, macOS の ru_maxrss はバイト)"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 if sys.platform == 'darwin' else maxrss
+
+
+def run_child(mode, url, outputfile, shelvefile, extra):
+    """子プロセス: 1 モード分の generate を実行し、経過時間とピーク RSS を JSON で出力"""
+    import twsearch                         # pylint: disable=import-outside-toplevel
+    from tslib import TwsConfig             # pylint: disable=import-outside-toplevel
+
+    sys.argv = ['twsearch.py', '-s', '-t', '0', '-o', outputfile, '-O',
+                '-b', shelvefile, '-B'] + MODES[mode] + extra + ['bench']
+    config = TwsConfig(twsearch.tw_argparse())
+    config['APIBaseURL'] = url
+    twsearch.set_json_backend(config['JsonBackend'])
+    start = time.perf_counter()
+    writer = twsearch.SplunkWriterBySearch(config=config)
+    writer.generate(config)
+    writer.close()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'elapsed': elapsed, 'peak_rss': peak_rss()}))
+
+
+def run_mode(server, mode, outdir, extra):
+    """mode を子プロセスで実行し (tweets/sec, requests/sec, ピーク RSS KB) を返す"""
+    before = server.counters()
+    outputfile = os.path.join(outdir, 'bench_{}.out'.format(mode))
+    shelvefile = os.path.join(outdir, 'bench_{}.shelve'.format(mode))
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode,
+                           '--url', server.url, '--outputfile', outputfile,
+                           '--shelvefile', shelvefile, '--'] + extra,
+                          stdout=subprocess.PIPE, check=True)
+    result = json.loads(proc.stdout.decode('utf-8').splitlines()[-1])
+    after = server.counters()
+    tweets = after.get('tweets', 0) - before.get('tweets', 0)
+    requests = after.get(SEARCH_PATH, 0) - before.get(SEARCH_PATH, 0)
+    return tweets / result['elapsed'], requests / result['elapsed'], result['peak_rss']
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--total_tweets', type=int, default=10000,
+                        help=u'検索結果の総件数 (デフォルト 10000)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help=u'スタブサーバの応答遅延 (秒, デフォルト 0)')
+    parser.add_argument('--error_every', type=int, default=0,
+                        help=u'N 回目毎のリクエストで 503 を返す (デフォルト 0 = 無し)')
+    parser.add_argument('-m', '--modes', type=str, default=','.join(MODES),
+                        help=u'実行するモード (カンマ区切り, デフォルト {})'.format(','.join(MODES)))
+    parser.add_argument('--child', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--url', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--outputfile', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--shelvefile', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('extra', nargs='*',
+                        help=u'twsearch.py に追加で渡すオプション (-- の後に指定, 例: -- --stream)')
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.url, args.outputfile, args.shelvefile, args.extra)
+        return
+
+    modes = [mode for mode in args.modes.split(',') if mode]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error('unknown mode: {}'.format(mode))
+    with tempfile.TemporaryDirectory() as outdir, \
+            StubServer(total_tweets=args.total_tweets, latency=args.latency,
+                       error_every=args.error_every, retry_after=0) as server:
+        print('tweets: {}, latency: {:.3f} s'.format(args.total_tweets, args.latency))
+        print('{:8} {:>12} {:>12} {:>14}'.format('mode', 'tweets/s', 'requests/s', 'peak RSS (MB)'))
+        for mode in modes:
+            tweets, requests, rss = run_mode(server, mode, outdir, args.extra)
+            print('{:8} {:12.1f} {:12.2f} {:14.1f}'.format(mode, tweets, requests, rss / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""JSON バックエンド (標準の json / orjson) 毎の Tweet 1 件あたりのデコード・エンコード時間
+
+エンコードは -j (indent=2) と --ndjson (1 行 1 JSON) の両方で測り、1 件あたりのバイト数も比較する。
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_stream import make_page                          # pylint: disable=wrong-import-position
+from bench_csv import load_corpus, make_tweet_dicts          # pylint: disable=wrong-import-position
+from tslib.ts_json import CODECS, available_codecs          # pylint: disable=wrong-import-position
+
+
+def per_tweet(func, items, repeat):
+    """items の各要素に func を repeat 回適用した 1 件あたりの秒数"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (repeat * len(items))
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=20,
+                        help=u'繰り返し回数 (デフォルト 20)')
+    parser.add_argument('-c', '--corpus', type=str, default=None,
+                        help=u'コーパス (twsearch.py -j の出力, 未指定時は生成した 1 ページ分)')
+    args = parser.parse_args()
+    repeat = args.repeat
+
+    page = make_page()
+    tweets = load_corpus(args.corpus) if args.corpus else page['statuses']
+    # SplunkWriter が JSON 出力で書き込む形 (created_time, base, Tweet, search_metadata)
+    records = make_tweet_dicts(tweets)
+    for record in records:
+        record['search_metadata'] = page['search_metadata']
+    raw = [CODECS['json'].dumps(tweet).encode('utf-8') for tweet in tweets]
+
+    print('tweets: {}, backends: {}'.format(len(tweets), ', '.join(available_codecs())))
+    print('{:8} {:>12} {:>20} {:>19}'.format('', 'decode (us)', 'encode indent=2 (us)',
+                                             'encode ndjson (us)'))
+    results = {}
+    for name in available_codecs():
+        codec = CODECS[name]
+        decode = per_tweet(codec.loads, raw, repeat)
+        pretty = per_tweet(lambda obj, codec=codec: codec.dumps(obj, 2), records, repeat)
+        compact = per_tweet(codec.dumps, records, repeat)
+        results[name] = (decode, pretty, compact)
+        print('{:8} {:12.1f} {:20.1f} {:19.1f}'.format(name, decode * 1e6, pretty * 1e6,
+                                                       compact * 1e6))
+    if 'orjson' in results:
+        base, fast = results['json'], results['orjson']
+        print('speedup  {:11.2f}x {:19.2f}x {:18.2f}x'.format(
+            base[0] / fast[0], base[1] / fast[1], base[2] / fast[2]))
+
+    # 出力ファイルの 1 件あたりのバイト数 (print() の改行を含む, UTF-8)
+    codec = CODECS['json']
+    pretty = sum(len((codec.dumps(record, 2) + '\n').encode('utf-8')) for record in records)
+    compact = sum(len((codec.dumps(record) + '\n').encode('utf-8')) for record in records)
+    print('bytes/tweet: indent=2 {:.0f}, ndjson {:.0f} ({:.0%})'.format(
+        pretty / len(records), compact / len(records), compact / pretty))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""接続プール有無による requests/sec のベンチマーク (ローカル スタブサーバ使用)"""
+
+import os
+import sys
+import time
+import argparse
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from stubserver import StubServer           # pylint: disable=wrong-import-position
+from tslib.ts_base import make_session      # pylint: disable=wrong-import-position
+
+
+def run(get, url, number):
+    """number 回 GET して requests/sec を返す"""
+    start = time.perf_counter()
+    for _ in range(number):
+        res = get(url, params={'q': 'bench'}, timeout=10.0)
+        res.raise_for_status()
+        res.json()
+    return number / (time.perf_counter() - start)
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=1000,
+                        help=u'リクエスト回数 (デフォルト 1000)')
+    number = parser.parse_args().number
+
+    with StubServer() as server:
+        url = server.url + '/1.1/search/tweets.json'
+        without_pool = run(requests.get, url, number)
+        session = make_session()
+        with_pool = run(session.get, url, number)
+        session.close()
+
+    print('requests.get (no pool): {:10.1f} req/s'.format(without_pool))
+    print('Session (pooled):       {:10.1f} req/s'.format(with_pool))
+    print('speedup:                {:10.2f}x'.format(with_pool / without_pool))
+
+
+if __name__ == '__main__':
+    main()
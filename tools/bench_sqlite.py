@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""SQLite 出力のベンチマーク (rows/sec と索引を使った検索の時間)
+
+SqliteSink (ページ毎に 1 トランザクション) と 1 行毎に commit する場合の書き込み速度、
+同じ Tweet を取得し直した場合 (upsert) の速度を比較し、ハッシュタグ・userId での検索時間を
+CSV の全件走査と比較する。コーパスは bench_csv.py と同じ (-c, 未指定時は生成)。
+"""
+
+import io
+import os
+import sys
+import csv
+import time
+import sqlite3
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_stream import make_page                          # pylint: disable=wrong-import-position
+from bench_csv import load_corpus, make_tweet_dicts, run_projector  # pylint: disable=wrong-import-position
+from tslib import SqliteSink                                # pylint: disable=wrong-import-position
+
+PAGE_SIZE = 100
+
+
+def run_sink(path, tweet_dicts, page_size):
+    """SqliteSink で page_size 件毎に end_page() して書き込む"""
+    sink = SqliteSink(path)
+    for i, tweet_dict in enumerate(tweet_dicts, 1):
+        sink.write_row(tweet_dict)
+        sink.end_row()
+        if i % page_size == 0:
+            sink.end_page()
+    sink.close()
+
+
+def _timed(func, *args):
+    """func(*args) の秒数"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--corpus', type=str, default=None,
+                        help=u'コーパス (twsearch.py -j の出力, 未指定時は生成)')
+    parser.add_argument('-n', '--number', type=int, default=20000,
+                        help=u'コーパスを生成する場合の件数 (デフォルト 20000)')
+    args = parser.parse_args()
+
+    if args.corpus:
+        tweets = load_corpus(args.corpus)
+    else:
+        tweets = []
+        while len(tweets) < args.number:
+            tweets.extend(make_page()['statuses'])
+        tweets = tweets[:args.number]
+    tweet_dicts = make_tweet_dicts(tweets)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print('rows: {}'.format(len(tweet_dicts)))
+        print('{:36} {:>12}'.format('', 'rows/sec'))
+        per_row = os.path.join(tmpdir, 'per_row.sqlite')
+        per_page = os.path.join(tmpdir, 'per_page.sqlite')
+        for name, path, page_size in (('commit per row', per_row, 1),
+                                      ('commit per page ({})'.format(PAGE_SIZE), per_page,
+                                       PAGE_SIZE),
+                                      ('upsert (same tweets again)', per_page, PAGE_SIZE)):
+            seconds = _timed(run_sink, path, tweet_dicts, page_size)
+            print('{:36} {:12.0f}'.format(name, len(tweet_dicts) / seconds))
+
+        hashtag = next((entity['text'] for tweet in tweets
+                        for entity in tweet.get('entities', {}).get('hashtags', ())), '')
+        user_id = tweets[0]['user']['id']
+        text = run_projector(tweet_dicts)
+        conn = sqlite3.connect(per_page)
+        print('{:36} {:>12} {:>12}'.format('', 'csv scan ms', 'sqlite ms'))
+        for name, sql, value, match in (
+                ('hashtag = {}'.format(hashtag),
+                 'SELECT COUNT(*) FROM hashtags WHERE hashtag = ?', hashtag,
+                 lambda row: hashtag.lower() in row['hashtags'].lower().split(',')),
+                ('userId = {}'.format(user_id),
+                 'SELECT COUNT(*) FROM tweets WHERE userId = ?', user_id,
+                 lambda row: row['userId'] == str(user_id))):
+            start = time.perf_counter()
+            scanned = sum(1 for row in csv.DictReader(io.StringIO(text)) if match(row))
+            scan = time.perf_counter() - start
+            start = time.perf_counter()
+            found = conn.execute(sql, (value,)).fetchone()[0]
+            indexed = time.perf_counter() - start
+            assert scanned == found, (scanned, found)
+            print('{:36} {:12.2f} {:12.2f}'.format(name, scan * 1000, indexed * 1000))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""検索結果ページの一括デコード (res.json()) とストリーミング デコードの比較ベンチマーク
+
+記録したページ (search/tweets.json のレスポンスを保存したファイル) を、指定した帯域で
+チャンク毎に届くものとして読み込み、最初の Tweet までの時間・全体の時間・ピークメモリを測る。
+ページを指定しない場合は tweet_mode=extended 相当の Tweet 100 件のページを生成して使う。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from stubserver import make_tweet, BASE_ID                     # pylint: disable=wrong-import-position
+from tslib.ts_jsonstream import iter_search_page, STREAM_CHUNK_SIZE  # pylint: disable=wrong-import-position
+
+
+def make_page(count=100):
+    """entities を含む extended な Tweet count 件の検索結果ページを生成"""
+    statuses = []
+    for i in range(count):
+        tweet = make_tweet(BASE_ID - i)
+        tweet['full_text'] = u'ベンチマーク用のツイート本文 #stub https://t.co/xxxxxxxx ' * 4
+        tweet['entities'] = {
+            'hashtags': [{'text': 'stub', 'indices': [15, 20]}] * 3,
+            'urls': [{'url': 'https://t.co/xxxxxxxx', 'expanded_url': 'https://example.com/' + 'a' * 40,
+                      'display_url': 'example.com/aaaa…', 'indices': [21, 44]}] * 2,
+            'user_mentions': [], 'symbols': [],
+        }
+        tweet['user'] = dict(tweet['user'], description=u'プロフィール ' * 10,
+                             followers_count=1234, friends_count=567, location='Tokyo',
+                             profile_image_url_https='https://pbs.twimg.com/' + 'b' * 60)
+        tweet['retweeted_status'] = make_tweet(BASE_ID - 10000 - i)
+        statuses.append(tweet)
+    return {'statuses': statuses,
+            'search_metadata': {'max_id': BASE_ID, 'max_id_str': str(BASE_ID), 'count': count,
+                                'next_results': '?max_id={}&q=bench&count={}'.format(
+                                    BASE_ID - count, count)}}
+
+
+def chunks(data, chunk_size, bandwidth):
+    """data を chunk_size 毎に、bandwidth (バイト/秒) の速度で届くように返す"""
+    for i in range(0, len(data), chunk_size):
+        if bandwidth:
+            time.sleep(chunk_size / bandwidth)
+        yield data[i:i + chunk_size]
+
+
+def consume(tweet):
+    """1 件の処理 (書き込み相当)"""
+    return len(json.dumps(tweet, ensure_ascii=False))
+
+
+def run_whole(data, chunk_size, bandwidth):
+    """ボディを全部受け取ってから json.loads() する (res.json() 相当)"""
+    start = time.perf_counter()
+    first = None
+    body = b''.join(chunks(data, chunk_size, bandwidth))
+    entry = json.loads(body)
+    for tweet in entry['statuses']:
+        consume(tweet)
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def run_stream(data, chunk_size, bandwidth):
+    """受信しながら statuses を 1 件ずつデコードする"""
+    start = time.perf_counter()
+    first = None
+    metadata = {}
+    for tweet in iter_search_page(chunks(data, chunk_size, bandwidth), metadata):
+        consume(tweet)
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def measure(func, pages, chunk_size, bandwidth):
+    """ページ毎に実行し (最初の Tweet までの平均秒, 1 ページの平均秒, ピークメモリ) を返す"""
+    firsts, totals, peaks = [], [], []
+    for data in pages:
+        first, total = func(data, chunk_size, bandwidth)
+        firsts.append(first or 0)
+        totals.append(total)
+        # tracemalloc は遅くなるので、メモリは別に測る
+        tracemalloc.start()
+        func(data, chunk_size, 0)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sum(firsts) / len(firsts), sum(totals) / len(totals), max(peaks)
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--bandwidth', type=float, default=2.0,
+                        help=u'受信速度 (MB/s, 0 で待たない, デフォルト 2)')
+    parser.add_argument('-c', '--chunk_size', type=int, default=STREAM_CHUNK_SIZE,
+                        help=u'チャンクの大きさ (バイト, デフォルト {})'.format(STREAM_CHUNK_SIZE))
+    parser.add_argument('pages', nargs='*',
+                        help=u'記録した検索結果ページ (JSON) ファイル')
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for filename in args.pages:
+            with open(filename, mode='rb') as fp:
+                pages.append(fp.read())
+    else:
+        pages = [json.dumps(make_page(), ensure_ascii=False).encode('utf-8')]
+    bandwidth = args.bandwidth * 1000 * 1000
+
+    print('pages: {}, average size: {:.1f} KB'.format(
+        len(pages), sum(len(page) for page in pages) / len(pages) / 1000))
+    print('{:12} {:>16} {:>12} {:>12}'.format('', 'first tweet (ms)', 'page (ms)', 'peak (KB)'))
+    for name, func in (('res.json()', run_whole), ('stream', run_stream)):
+        first, total, peak = measure(func, pages, args.chunk_size, bandwidth)
+        print('{:12} {:16.2f} {:12.2f} {:12.1f}'.format(name, first * 1000, total * 1000,
+                                                         peak / 1000))
+
+
+if __name__ == '__main__':
+    main()
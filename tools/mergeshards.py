@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""twsearch.py --backfill のウィンドウ毎の出力ファイル (シャード) を 1 つにまとめる"""
+
+import sys
+import codecs
+import argparse
+
+
+def read_shard(filename):
+    """シャードを読み込み (BOM の有無, 行のリスト) を返す"""
+    with open(filename, mode='rb') as fp:
+        data = fp.read()
+    has_bom = data.startswith(codecs.BOM_UTF8)
+    if has_bom:
+        data = data[len(codecs.BOM_UTF8):]
+    return has_bom, data.decode('utf_8').splitlines(keepends=True)
+
+
+def merge_shards(shards, outfile, header=True):
+    """シャードを新しい順 (ファイル名の降順) に連結する
+
+    header が True の場合、2 つ目以降のシャードの先頭行が最初のシャードの先頭行 (CSV ヘッダ)
+    と同じなら読み飛ばす。最初のシャードに BOM があれば出力にも付ける。
+    """
+    first_line = None
+    bom = None
+    lines = 0
+    with open(outfile, mode='wb') as out:
+        for shard in sorted(shards, reverse=True):
+            has_bom, shard_lines = read_shard(shard)
+            if bom is None:
+                bom = has_bom
+                if bom:
+                    out.write(codecs.BOM_UTF8)
+            if header and shard_lines:
+                if first_line is None:
+                    first_line = shard_lines[0]
+                elif shard_lines[0] == first_line:
+                    shard_lines = shard_lines[1:]
+            out.write(''.join(shard_lines).encode('utf_8'))
+            lines += len(shard_lines)
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', required=True,
+                        help=u'出力ファイル名')
+    parser.add_argument('--no_header', action='store_true',
+                        help=u'CSV ヘッダの重複を取り除かない (JSON 出力の場合など)')
+    parser.add_argument('shards', nargs='+',
+                        help=u'シャード (例: twsearch_*.csv)')
+    args = parser.parse_args()
+    merged = merge_shards(args.shards, args.output, header=not args.no_header)
+    print('{} lines written to {}'.format(merged, args.output), file=sys.stderr)
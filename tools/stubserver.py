@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Twitter API のローカル スタブサーバ (ベンチマーク・オフラインテスト用)"""
+
+import sys
+import json
+import time
+import random
+import socket
+import threading
+import argparse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+STUB_TOKEN = 'stub-bearer-token'
+
+BASE_ID = 1268346734951964672
+
+# 注入するエラーのステータスと Twitter の error code
+ERROR_CODES = {429: 88, 500: 131, 503: 130}
+
+# rate_limit_status で返す resource (family, resource)
+RESOURCES = (('search', '/search/tweets'),
+             ('statuses', '/statuses/show/:id'),
+             ('statuses', '/statuses/lookup'))
+
+STUB_TWEET = {
+    'created_at': 'Thu Jun 04 01:00:01 +0000 2020',
+    'id': 1268346734951964672,
+    'id_str': '1268346734951964672',
+    'full_text': 'stub tweet #stub',
+    'entities': {'hashtags': [{'text': 'stub', 'indices': [11, 16]}]},
+    'user': {'id': 14963504, 'id_str': '14963504', 'name': 'stub', 'screen_name': 'stub'},
+}
+
+
+def make_tweet(tweet_id):
+    """tweet_id の Tweet を生成"""
+    tweet = dict(STUB_TWEET)
+    tweet['id'] = tweet_id
+    tweet['id_str'] = str(tweet_id)
+    return tweet
+
+
+def search_page(query, total_tweets, count, max_id=None, since_id=None, id_step=1):
+    """BASE_ID から id_step 間隔で降順に total_tweets 件ある検索結果の 1 ページ分を返す
+
+    実際の API と同じく next_results には since_id を含めない。
+    """
+    top = BASE_ID if max_id is None else min(int(max_id), BASE_ID)
+    bottom = BASE_ID - total_tweets * id_step
+    if since_id is not None:
+        bottom = max(bottom, int(since_id))
+    first = -(-(BASE_ID - top) // id_step)
+    ids = [tweet_id for tweet_id in (BASE_ID - i * id_step for i in range(first, first + count))
+           if tweet_id > bottom]
+    metadata = {
+        'max_id': ids[0] if ids else 0,
+        'max_id_str': str(ids[0]) if ids else '0',
+        'since_id': 0,
+        'since_id_str': '0',
+        'query': query,
+        'count': count,
+        'completed_in': 0.001,
+    }
+    if ids and ids[-1] - id_step > bottom:
+        metadata['next_results'] = '?' + urlencode([('max_id', ids[-1] - 1), ('q', query),
+                                                    ('count', count), ('include_entities', 1)])
+    return {'statuses': [make_tweet(tweet_id) for tweet_id in ids], 'search_metadata': metadata}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """スタブのリクエストハンドラ"""
+    protocol_version = 'HTTP/1.1'   # keep-alive を有効にする
+
+    def setup(self):
+        super().setup()
+        # ヘッダとボディの分割送信で Delayed ACK 待ちにならないように
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):   # pylint: disable=redefined-builtin
+        pass
+
+    def _send_json(self, status, body, resource=None, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        if resource is not None:
+            limit, remaining, reset, exceeded = self.server.consume(resource)
+            if exceeded:
+                status = 429
+                data = json.dumps({'errors': [{'code': 88, 'message': 'Rate limit exceeded'}]}
+                                 ).encode('utf-8')
+        self.server.count('status:{}'.format(status))
+        if status == 200 and isinstance(body, dict) and 'statuses' in body:
+            self.server.count('tweets', len(body['statuses']))
+        self.send_response(status)
+        if resource is not None:
+            self.send_header('x-rate-limit-limit', str(limit))
+            self.send_header('x-rate-limit-remaining', str(remaining))
+            self.send_header('x-rate-limit-reset', str(reset))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject(self, path):
+        """リクエストを数えて latency 秒待ち、注入するエラーがあれば返す (返した場合は True)"""
+        self.server.count(path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status = self.server.inject_error()
+        if status is None:
+            return False
+        headers = {}
+        if self.server.retry_after is not None:
+            headers['Retry-After'] = str(self.server.retry_after)
+        self._send_json(status, {'errors': [{'code': ERROR_CODES.get(status, 0),
+                                             'message': 'injected error'}]}, headers=headers)
+        return True
+
+    def _drain_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+
+    def do_POST(self):     # pylint: disable=invalid-name
+        """POST: oauth2/token"""
+        self._drain_body()
+        path = urlparse(self.path).path
+        self.server.count(path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if path == '/oauth2/token':
+            self._send_json(200, {'token_type': 'bearer', 'access_token': STUB_TOKEN})
+        else:
+            self._send_json(404, {'errors': [{'code': 34, 'message': 'not found'}]})
+
+    def do_GET(self):      # pylint: disable=invalid-name
+        """GET: search/tweets, statuses/show, statuses/lookup, rate_limit_status"""
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if path == '/1.1/application/rate_limit_status.json':
+            self.server.count(path)
+            families = query['resources'].split(',') if query.get('resources') else None
+            self._send_json(200, {'resources': self.server.limit_status(families)})
+            return
+        if self._inject(path):
+            return
+        if path == '/1.1/search/tweets.json':
+            self._send_json(200, search_page(query.get('q', ''), self.server.total_tweets,
+                                             int(query.get('count', 15)), query.get('max_id'),
+                                             query.get('since_id'), self.server.id_step),
+                            resource='/search/tweets')
+        elif path == '/1.1/statuses/show.json':
+            self._send_json(200, make_tweet(int(query.get('id', BASE_ID))),
+                            resource='/statuses/show/:id')
+        elif path == '/1.1/statuses/lookup.json':
+            # 検索結果の範囲にある ID のみ存在するものとし、それ以外は null (map=true)
+            bottom = BASE_ID - self.server.total_tweets
+            found = {}
+            for tweet_id in query.get('id', '').split(','):
+                exists = tweet_id.isdigit() and bottom < int(tweet_id) <= BASE_ID
+                found[tweet_id] = make_tweet(int(tweet_id)) if exists else None
+            self._send_json(200, {'id': found}, resource='/statuses/lookup')
+        else:
+            self._send_json(404, {'errors': [{'code': 34, 'message': 'not found'}]})
+
+
+class StubServer:
+    """ バックグラウンドスレッドで動くスタブサーバ (with 文で使用)
+
+    latency: 各リクエストの応答までの遅延 (秒)
+    error_rate: API (search, show, lookup) のリクエストが error_status を返す確率
+    error_every: API の N 回目毎のリクエストが error_status を返す (0 なら無し)
+    retry_after: エラー応答に付ける Retry-After (秒, None なら付けない)
+    rate_limit, window: resource 毎の window 秒あたりの上限 (超えると 429 を返す)
+    """
+    def __init__(self, host='127.0.0.1', port=0, handler=StubHandler, total_tweets=1,
+                 rate_limit=100000, window=900, id_step=1, latency=0.0,
+                 error_rate=0.0, error_every=0, error_status=503, retry_after=None, seed=None):
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.total_tweets = total_tweets     # 検索結果の総件数
+        self.httpd.id_step = id_step               # 検索結果の ID の間隔
+        self.httpd.rate_limit = rate_limit         # resource 毎の 15 分あたりの上限
+        self.httpd.window = window
+        self.httpd.limits = {}
+        self.httpd.limits_lock = threading.Lock()
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.error_every = error_every
+        self.httpd.error_status = error_status
+        self.httpd.retry_after = retry_after
+        self.httpd.counters = Counter()
+        self.httpd.consume = self.consume
+        self.httpd.count = self.count
+        self.httpd.inject_error = self.inject_error
+        self.httpd.limit_status = self.limit_status
+        self.__random = random.Random(seed)
+        self.__api_requests = 0
+        self.thread = None
+
+    def consume(self, resource):
+        """resource の残り回数を 1 減らし (limit, remaining, reset, 超過したか) を返す"""
+        with self.httpd.limits_lock:
+            now = int(time.time())
+            remaining, reset = self.httpd.limits.get(resource, (self.httpd.rate_limit, 0))
+            if now >= reset:
+                remaining, reset = self.httpd.rate_limit, now + self.httpd.window
+            exceeded = remaining <= 0
+            remaining = max(remaining - 1, 0)
+            self.httpd.limits[resource] = (remaining, reset)
+            return self.httpd.rate_limit, remaining, reset, exceeded
+
+    def inject_error(self):
+        """注入するエラーのステータス (エラーにしない場合は None)"""
+        with self.httpd.limits_lock:
+            self.__api_requests += 1
+            if self.httpd.error_every and self.__api_requests % self.httpd.error_every == 0:
+                return self.httpd.error_status
+            if self.httpd.error_rate and self.__random.random() < self.httpd.error_rate:
+                return self.httpd.error_status
+            return None
+
+    def limit_status(self, families=None):
+        """rate_limit_status の resources (families: 対象の family のリスト, None なら全て)"""
+        with self.httpd.limits_lock:
+            now = int(time.time())
+            resources = {}
+            for family, resource in RESOURCES:
+                if families is not None and family not in families:
+                    continue
+                remaining, reset = self.httpd.limits.get(resource, (self.httpd.rate_limit, 0))
+                if now >= reset:
+                    remaining, reset = self.httpd.rate_limit, now + self.httpd.window
+                resources.setdefault(family, {})[resource] = {
+                    'limit': self.httpd.rate_limit, 'remaining': remaining, 'reset': reset}
+            return resources
+
+    def count(self, key, value=1):
+        """カウンタの加算 (パス毎のリクエスト数, status:コード, tweets)"""
+        with self.httpd.limits_lock:
+            self.httpd.counters[key] += value
+
+    def counters(self):
+        """カウンタのスナップショット"""
+        with self.httpd.limits_lock:
+            return dict(self.httpd.counters)
+
+    @property
+    def url(self):
+        """ベース URL (http://host:port)"""
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        """サーバ起動"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """サーバ停止"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--port', type=int, default=8000,
+                        help=u'待ち受けポート (デフォルト 8000)')
+    parser.add_argument('-n', '--total_tweets', type=int, default=1000,
+                        help=u'検索結果の総件数 (デフォルト 1000)')
+    parser.add_argument('--id_step', type=int, default=1,
+                        help=u'検索結果の ID の間隔 (デフォルト 1)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help=u'応答までの遅延 (秒, デフォルト 0)')
+    parser.add_argument('--rate_limit', type=int, default=100000,
+                        help=u'resource 毎の window 秒あたりの上限 (デフォルト 100000)')
+    parser.add_argument('--window', type=int, default=900,
+                        help=u'rate limit の window (秒, デフォルト 900)')
+    parser.add_argument('--error_rate', type=float, default=0.0,
+                        help=u'エラーを返す確率 (0..1, デフォルト 0)')
+    parser.add_argument('--error_every', type=int, default=0,
+                        help=u'N 回目毎のリクエストでエラーを返す (デフォルト 0 = 無し)')
+    parser.add_argument('--error_status', type=int, default=503,
+                        help=u'エラーのステータスコード (デフォルト 503)')
+    parser.add_argument('--retry_after', type=int, default=None,
+                        help=u'エラー応答に付ける Retry-After (秒)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help=u'--error_rate の乱数の種')
+    args = parser.parse_args()
+    server = StubServer(port=args.port, total_tweets=args.total_tweets, id_step=args.id_step,
+                        latency=args.latency, rate_limit=args.rate_limit, window=args.window,
+                        error_rate=args.error_rate, error_every=args.error_every,
+                        error_status=args.error_status, retry_after=args.retry_after,
+                        seed=args.seed)
+    print('Listening on', server.url, file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
@@ -1,8 +1,22 @@
 # -*- coding: utf-8 -*-
 """Twitter のツイートを取得するためのユーティリティ"""
 
-from .ts_config import TwsConfig
-from .ts_base import Tweets
+from .ts_config import TwsConfig, TwsConfigOverlay
+from .ts_ratelimit import RequestBudget, RateLimitTracker, \
+    Pacer, TokenBucketPacer, LeakyBucketPacer, make_pacer, \
+    AdaptiveInterval, make_adaptive_interval, \
+    PRIORITY_BULK, PRIORITY_INTERACTIVE
+from .ts_retry import RetryPolicy, make_retry_policy
+from .ts_base import Tweets, RetryOverError, FatalResponseError, \
+    make_session, make_session_from_config
+from .ts_async import AsyncTweets, make_async_session_from_config
+from .ts_json import json_loads, json_dumps, set_json_backend, get_json_backend
+from .ts_tweetstore import TweetStore, make_tweet_store
+from .ts_seenids import SeenIds, make_seen_ids
+from .ts_csvrow import CsvRowWriter, make_csv_row_writer
+from .ts_output import BufferedOutput, make_buffered_output
+from .ts_parquet import ParquetSink, make_parquet_sink
+from .ts_sqlite import SqliteSink, make_sqlite_sink
 from .ts_dateutils import \
     epoch2datetime, \
     str2datetime, \
@@ -10,16 +24,65 @@ from .ts_dateutils import \
     datetime2datevalue, \
     datevalue2datetime, \
     datetime2epoch, \
-    str_to_datetime_jp
+    str_to_datetime_jp, \
+    datetime2snowflake, \
+    snowflake2datetime, \
+    TweetTime, \
+    convert_dates, \
+    DisplayZone, \
+    get_display_zone, \
+    make_display_zone
 
 __all__ = [
     'TwsConfig',
+    'TwsConfigOverlay',
+    'RequestBudget',
+    'RateLimitTracker',
+    'Pacer',
+    'TokenBucketPacer',
+    'LeakyBucketPacer',
+    'make_pacer',
+    'AdaptiveInterval',
+    'make_adaptive_interval',
+    'PRIORITY_BULK',
+    'PRIORITY_INTERACTIVE',
+    'RetryPolicy',
+    'make_retry_policy',
     'Tweets',
+    'RetryOverError',
+    'FatalResponseError',
+    'make_session',
+    'make_session_from_config',
+    'AsyncTweets',
+    'make_async_session_from_config',
+    'json_loads',
+    'json_dumps',
+    'set_json_backend',
+    'get_json_backend',
+    'TweetStore',
+    'make_tweet_store',
+    'SeenIds',
+    'make_seen_ids',
+    'CsvRowWriter',
+    'make_csv_row_writer',
+    'BufferedOutput',
+    'make_buffered_output',
+    'ParquetSink',
+    'make_parquet_sink',
+    'SqliteSink',
+    'make_sqlite_sink',
     'epoch2datetime',
     'str2datetime',
     'str2epoch',
     'datevalue2datetime',
     'datetime2datevalue',
     'datetime2epoch',
-    'str_to_datetime_jp'
+    'str_to_datetime_jp',
+    'datetime2snowflake',
+    'snowflake2datetime',
+    'TweetTime',
+    'convert_dates',
+    'DisplayZone',
+    'get_display_zone',
+    'make_display_zone'
 ]
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""Tweets を asyncio で取得するためのクラスモジュール"""
+
+from base64 import b64encode
+import logging
+import json
+import asyncio
+import time
+import re
+from collections import Counter
+
+import aiohttp
+
+from .ts_base import STAT_BREAK, STAT_RETRY, STAT_WAIT, STAT_ERR_EXIT, \
+    TOKEN_ENDPOINT, STATUS_ENDPOINT, MAX_COUNT, FatalResponseError, \
+    check_status_code, dump_response, calc_counts, rebase_url
+from .ts_retry import RETRY_NETWORK, RETRY_RATE_LIMIT, RETRY_INVALID, RETRY_END, \
+    RETRY_SERVER, RETRY_CLIENT, status_class, parse_retry_after, make_retry_policy
+from .ts_token import BEARER_CACHE
+from .ts_json import json_loads
+from .ts_ratelimit import RATE_LIMITS, PRIORITY_BULK
+from .ts_dateutils import epoch2datetime
+
+
+def make_async_session_from_config(config):
+    """TwsConfig の Pool* / KeepAlive 設定から aiohttp.ClientSession を生成 (要イベントループ)"""
+    pool_maxsize = config.getint('PoolMaxSize', 10)
+    connector = aiohttp.TCPConnector(
+        limit=config.getint('PoolConnections', 10) * pool_maxsize,
+        limit_per_host=pool_maxsize,
+        force_close=not config.getboolean('KeepAlive', True))
+    return aiohttp.ClientSession(connector=connector)
+
+
+class _Request:
+    """check_status_code() が参照する request.headers の入れ物"""
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class _Response:
+    """aiohttp のレスポンスを読み切って requests.Response と同じ形で参照できるようにしたもの"""
+    def __init__(self, status_code, headers, content, request_headers):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.request = _Request(request_headers)
+
+    @property
+    def text(self):
+        """レスポンスボディ (文字列)"""
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        """レスポンスボディ (JSON)"""
+        return json_loads(self.content)
+
+
+class AsyncTweets:
+    """ Tweets を asyncio で取得するクラス (Tweets と同じリトライ・Rate Limit の扱い)
+
+    async with AsyncTweets(config, endpoint, default_params) as atw:
+        async for tweet, metadata in atw.generator(params):
+            ...
+    """
+
+    def __init__(self, config, endpoint, default_params,
+                 resource_family='search', resource='/search/tweets', session=None,
+                 tracker=None, pacer=None, priority=PRIORITY_BULK, retry_policy=None):
+        self.config = config
+        self.logger = config.logger
+        self.logger.debug("Called AsyncTweets")
+        self.__UserAgent = config['AppName'] + " " + config['AppVersion']
+        self.__session = session
+        self.__own_session = session is None
+        self.__Bearer = None
+        self.__Endpoint = rebase_url(endpoint, config['APIBaseURL'])
+        self.__Token_Endpoint = rebase_url(TOKEN_ENDPOINT, config['APIBaseURL'])
+        self.__Status_Endpoint = rebase_url(STATUS_ENDPOINT, config['APIBaseURL'])
+        self.__Resource_Family = resource_family
+        self.__Resource = resource
+        self.__tracker = tracker if tracker is not None else RATE_LIMITS
+        self.__reserve = config.getint('RateLimitReserve', 0)
+        self.__pacer = pacer
+        self.__priority = priority
+        self.__retry = retry_policy if retry_policy is not None else make_retry_policy(config)
+        self.__params = default_params.copy()
+        self.MAX_COUNT = MAX_COUNT
+        self.__count_pattern = re.compile(r'&count=\d+')
+
+        self.__params['count'] = config['count']
+
+    async def open(self):
+        """セッションの生成と Bearer Token の取得"""
+        if self.__session is None:
+            self.__session = make_async_session_from_config(self.config)
+        if self.__Bearer is None:
+            self.__Bearer = await self.__get_cached_bearer()
+        return self
+
+    async def close(self):
+        """(自身で生成した) セッションのクローズ"""
+        if self.__own_session and self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def get_session(self):
+        """aiohttp.ClientSession の取得 (他の AsyncTweets と共有する場合に使用)"""
+        return self.__session
+
+    async def __get_cached_bearer(self):
+        apikey = self.config['ConsumerAPIKey']
+        cachefile = self.config['BearerCacheFile'] or None
+        bearer = BEARER_CACHE.get(apikey, cachefile)
+        if bearer is None:
+            bearer = await self.__get_bearer(apikey, self.config['ConsumerAPISecret'])
+            BEARER_CACHE.put(apikey, bearer, cachefile)
+        return bearer
+
+    async def refresh_bearer(self):
+        """Bearer Token をキャッシュから破棄して取得し直す"""
+        BEARER_CACHE.discard_token(self.__Bearer)
+        self.__Bearer = await self.__get_cached_bearer()
+        return self.__Bearer
+
+    async def __get_bearer(self, apikey, apisec):
+        cred = b64encode((apikey + ':' + apisec).encode('utf-8')).decode()
+        headers = {
+            'Authorization': 'Basic ' + cred,
+            'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8',
+            'User-Agent': self.__UserAgent
+            }
+        data = {
+            'grant_type': 'client_credentials',
+            }
+        try:
+            res = await self.__fetch('POST', self.__Token_Endpoint, headers, data=data)
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            self.logger.exception("Timeout: %s", e)
+            raise Exception("Cannot get Bearer")
+        if res.status_code >= 400:
+            dump_response(self.logger, logging.ERROR, "Cannot get Bearer", res)
+            if check_status_code(self.logger, res) == STAT_ERR_EXIT:
+                raise FatalResponseError("Cannot get Bearer")
+            raise Exception("Cannot get Bearer")
+        return res.json()['access_token']
+
+    def __headers(self):
+        return {
+            'Authorization':'Bearer {}'.format(self.__Bearer),
+            'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8',
+            'User-Agent':   self.__UserAgent,
+        }
+
+    async def __fetch(self, method, url, headers, params=None, data=None):
+        """1 回のリクエスト (ボディまで読み切った _Response を返す)"""
+        if params is not None:
+            params = {k: str(v) for k, v in params.items() if v is not None}
+        async with self.__session.request(method, url, headers=headers, params=params,
+                                          data=data,
+                                          timeout=aiohttp.ClientTimeout(total=10.0)) as res:
+            content = await res.read()
+            return _Response(res.status, res.headers, content, headers)
+
+    async def __request(self, url, headers, params, attempts, retry_max, interval_time):
+        """Tweets と同じ RetryPolicy の判定でリトライしながら GET する
+
+        attempts は分類毎のリトライ回数 (Counter)。リトライ回数を超えた場合は None を返す。
+        """
+        refreshed = False
+        while True:
+            self.logger.debug("dryrun: %s", self.config['dryrun'])
+            if self.config['dryrun']:
+                self.logger.info("dryrun")
+                return None
+
+            wait = self.__retry.admit()
+            while wait > 0:
+                self.logger.info("circuit breaker is open, waiting %.1f seconds", wait)
+                await asyncio.sleep(wait)
+                wait = self.__retry.admit()
+            if self.__pacer is not None:
+                wait = self.__pacer.delay(self.__Resource_Family, self.__priority)
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = self.__pacer.delay(self.__Resource_Family, self.__priority)
+            # 残り回数が尽きる前に reset 時刻まで (イベントループを止めずに) 待つ
+            wait = self.__tracker.delay(self.__Resource, self.__reserve)
+            while wait > 0:
+                self.logger.info("rate limit of %s is exhausted, waiting %.1f seconds",
+                                 self.__Resource, wait)
+                await asyncio.sleep(wait)
+                wait = self.__tracker.delay(self.__Resource, self.__reserve)
+            res = None
+            try:
+                res = await self.__fetch('GET', url, headers, params)
+                self.__tracker.update(self.__Resource_Family, self.__Resource, res.headers)
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                self.logger.exception("Timeout: %s", e)
+                klass = RETRY_NETWORK
+            except BaseException:
+                # サーキットブレーカの試行を終わらせる (他のリクエストが待ち続けないように)
+                self.__retry.release_probe()
+                raise
+            else:
+                if res.status_code < 500:
+                    # 応答があれば API は動いている (429, 4xx でも half open の試行を終わらせる)
+                    self.__retry.record_success()
+                if res.status_code < 400:
+                    for key in (RETRY_NETWORK, RETRY_SERVER, RETRY_CLIENT):
+                        attempts.pop(key, None)
+                    return res
+
+                status = check_status_code(self.logger, res)
+                if status == STAT_WAIT:
+                    retry_after = parse_retry_after(res.headers)
+                    if retry_after is not None:
+                        await asyncio.sleep(retry_after)
+                        slept = retry_after
+                    else:
+                        slept = await self.wait_reset()
+                    self.__retry.count('retry:' + RETRY_RATE_LIMIT)
+                    self.__retry.count('sleep:' + RETRY_RATE_LIMIT, slept)
+                    attempts.clear()
+                    continue
+
+                if status == STAT_ERR_EXIT and res.status_code == 401 and not refreshed:
+                    self.logger.info("Auth Error, refreshing Bearer Token")
+                    headers['Authorization'] = 'Bearer {}'.format(await self.refresh_bearer())
+                    refreshed = True
+                    continue
+
+                if status == STAT_ERR_EXIT:
+                    raise FatalResponseError("status_code: {}".format(res.status_code))
+
+                if status == STAT_BREAK:
+                    return None
+
+                if status != STAT_RETRY:
+                    dump_response(self.logger, logging.ERROR, "HTTPError", res)
+                    self.__retry.release_probe()
+                    raise aiohttp.ClientError("HTTPError")
+                klass = status_class(res.status_code)
+
+            self.__retry.record_failure(klass)
+            attempts[klass] += 1
+            delay = self.__retry.next_delay(klass, attempts[klass], retry_max, interval_time,
+                                            parse_retry_after(res.headers if res is not None
+                                                              else None))
+            if delay is None:
+                return None
+            await asyncio.sleep(delay)
+
+    async def get_limit_status(self):
+        """Rate Limit 情報の取得"""
+        params = {
+            'resources': self.__Resource_Family  # help, users, search, statuses etc.
+        }
+        headers = {
+            'Authorization':'Bearer {}'.format(self.__Bearer),
+            'User-Agent': self.__UserAgent
+        }
+        try:
+            res = await self.__fetch('GET', self.__Status_Endpoint, headers, params)
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            self.logger.exception("Timeout: %s", e)
+            raise aiohttp.ClientConnectionError("Cannot get Limit Status")
+        if res.status_code >= 400:
+            dump_response(self.logger, logging.ERROR, "Cannot get Limit Status", res)
+            if check_status_code(self.logger, res) == STAT_ERR_EXIT:
+                raise FatalResponseError("Cannot get Limit Status")
+            raise Exception("Cannot get Limit Status")
+        dump_response(self.logger, logging.INFO, "Limit Status", res)
+        status = res.json()
+        self.__tracker.update_from_status(status)
+        return status
+
+    async def wait_reset(self):
+        """reset 時刻まで (イベントループを止めずに) sleep する (sleep した秒数を返す)"""
+        limit = self.__tracker.get(self.__Resource)
+        if limit is None:
+            status = await self.get_limit_status()
+            limit = status['resources'][self.__Resource_Family][self.__Resource]
+        if limit['remaining'] == 0:
+            target_time = limit['reset']
+            sleep_time = target_time - int(round(time.time(), 0)) + 10 # 念のため、10 秒加算
+            self.logger.debug("target_time: %s, sleep_time: %d",
+                              epoch2datetime(target_time), sleep_time)
+            await asyncio.sleep(max(sleep_time, 0))
+            return max(sleep_time, 0)
+        return 0
+
+    def get_params(self):
+        """__params[] の一括取得"""
+        return self.__params
+
+    async def get_one_tweet(self, search_id, retry_max=5, interval_time=10):
+        """ID を指定して Tweet を 1 件取得"""
+        self.logger.debug("called AsyncTweets.get_one_tweet(%s, %d, %d)",
+                          search_id, retry_max, interval_time)
+        params = {
+            'id': str(search_id),
+            'tweet_mode': 'extended'
+        }
+        res = await self.__request(self.__Endpoint, self.__headers(), params,
+                                   Counter(), retry_max, interval_time)
+        if res is None:
+            return None
+        dump_response(self.logger, logging.DEBUG, "get_one_tweet()", res)
+        return res.json()
+
+    async def generator(self, given_params, retry_max=5, interval_time=5, dispcount=-1):
+        """Tweet を取得して一つずつに分離し、それぞれを metadata と対にして返す (async generator)
+
+        同じインスタンスで複数の検索を同時に実行できるように、パラメータはローカルに保持する。
+        """
+        self.logger.debug("called AsyncTweets.generator(%s, %d, %d)",
+                          given_params, retry_max, interval_time)
+
+        params = self.__params.copy()
+        params.update(given_params)
+        count, dispcount = calc_counts(self.logger, params.get('count'), dispcount,
+                                       self.MAX_COUNT)
+        params['count'] = count
+        headers = self.__headers()
+
+        attempts = Counter()    # 分類毎のリトライ回数
+        url = self.__Endpoint
+        while True:
+            res = await self.__request(url, headers, params,
+                                       attempts, retry_max, interval_time)
+            if res is None:
+                break  # StopAsyncIteration
+
+            entry = res.json()
+            self.logger.debug("status_code: %d", res.status_code)
+            if 'search_metadata' not in entry:
+                self.logger.info("'search_metadata' is not in res: res.json() = %s",
+                                 json.dumps(entry, ensure_ascii=False, indent=2))
+                attempts[RETRY_INVALID] += 1
+                delay = self.__retry.next_delay(RETRY_INVALID, attempts[RETRY_INVALID],
+                                                retry_max, interval_time)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                continue
+
+            metadata = entry['search_metadata']
+            for tweet in entry['statuses']:
+                yield tweet, metadata
+
+            if 'next_results' not in metadata:
+                attempts[RETRY_END] += 1
+                delay = self.__retry.next_delay(RETRY_END, attempts[RETRY_END],
+                                                retry_max, interval_time)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+            else:
+                self.logger.debug("next_results exists: %s", metadata['next_results'])
+                if dispcount == 0:
+                    self.logger.debug("Returnning with dispcount == 0")
+                    break
+                count, dispcount = calc_counts(self.logger, count, dispcount, self.MAX_COUNT)
+                params = None
+                next_results = self.__count_pattern.sub('&count={}'.format(count),
+                                                        metadata['next_results'])
+                url = self.__Endpoint + next_results
+                attempts.clear()
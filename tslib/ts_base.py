@@ -7,10 +7,21 @@ import logging
 import json
 import time
 import re
+import queue
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from .ts_dateutils import epoch2datetime
+from .ts_token import BEARER_CACHE
+from .ts_ratelimit import RATE_LIMITS, PRIORITY_BULK
+from .ts_jsonstream import iter_search_page, STREAM_CHUNK_SIZE
+from .ts_json import json_loads
+from .ts_retry import RETRY_NETWORK, RETRY_RATE_LIMIT, RETRY_INVALID, RETRY_END, \
+    RETRY_SERVER, RETRY_CLIENT, status_class, parse_retry_after, make_retry_policy
 
 ERR_NO_SPECIFIED_ID     =   8
 ERR_INVALID_COUNT_ERROR =  44
@@ -25,6 +36,93 @@ STAT_RETRY      =  4
 STAT_WAIT       =  8
 STAT_ERR_EXIT   = 16
 
+TOKEN_ENDPOINT = 'https://api.twitter.com/oauth2/token'
+STATUS_ENDPOINT = 'https://api.twitter.com/1.1/application/rate_limit_status.json'
+
+MAX_COUNT = 100
+LOOKUP_MAX_IDS = 100    # statuses/lookup で一度に指定できる ID 数
+
+class RetryOverError(Exception):
+    """リトライ回数を超えて取得をあきらめた (検索は raise_on_giveup=True の場合のみ, lookup は常に)"""
+
+
+class FatalResponseError(Exception):
+    """リトライしても回復しないエラー (認証エラー・パラメータ不正・存在しない ID 等)
+
+    exit_code はコマンドの終了コード (API のエラーコード、それ以外は 255)。
+    """
+    def __init__(self, message, exit_code=255):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def rebase_url(url, api_base_url):
+    """url のスキーム・ホスト部分を api_base_url に置き換える (スタブサーバ等への接続用)"""
+    if not api_base_url:
+        return url
+    base = urlsplit(api_base_url)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+def calc_counts(logger, count, dispcount, max_count=MAX_COUNT):
+    """1 回の取得数 count と残りの表示数 dispcount を計算"""
+    if count is None or count > max_count:
+        count = max_count
+
+    if dispcount is None or dispcount < 0:
+        dispcount = -1
+    elif dispcount == 0:
+        logger.error("invalid dispcount: %d", dispcount)
+        count = 0
+    elif count > dispcount:
+        count = dispcount
+        dispcount = 0
+    elif count <= dispcount:
+        dispcount -= count
+#    else:
+#        dispcount = -1
+    logger.debug("returning calc_counts(): count:%d, dispcount:%d", count, dispcount)
+    return count, dispcount
+
+
+def make_session(pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True):
+    """接続プール (keep-alive) 付きの requests.Session を生成
+
+    pool_connections: プールするホスト数, pool_maxsize: ホスト毎の最大接続数,
+    pool_block: 接続数が上限に達した時に空きを待つか, keep_alive: 接続を再利用するか
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize,
+                          pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def make_session_from_config(config):
+    """TwsConfig の Pool* / KeepAlive 設定から requests.Session を生成"""
+    return make_session(pool_connections=config.getint('PoolConnections', 10),
+                        pool_maxsize=config.getint('PoolMaxSize', 10),
+                        pool_block=config.getboolean('PoolBlock', False),
+                        keep_alive=config.getboolean('KeepAlive', True))
+
+
+def skip_yielded(statuses, yielded):
+    """statuses のうち ID が yielded に無いものを返し、返した ID を yielded に加える
+
+    stream でページを取得し直す場合に、前回返した Tweet を再び返さないために使う。
+    """
+    for status in statuses:
+        if status['id'] in yielded:
+            continue
+        yielded.add(status['id'])
+        yield status
+
+
 def dump_response(logger, level, message, res):
     """requests のエラーを level でダンプ出力"""
     if res is not None:
@@ -73,6 +171,10 @@ def check_status_code(logger, res):
 
     if res.status_code in [401]:
         dump_response(logger, logging.ERROR, "Auth Error", res)
+        # キャッシュ済みの Bearer Token が無効になっている場合は破棄する
+        authorization = res.request.headers.get('Authorization', '') if res.request else ''
+        if authorization.startswith('Bearer '):
+            BEARER_CACHE.discard_token(authorization[len('Bearer '):])
         return STAT_ERR_EXIT
 
     if res.status_code in [403, 404]:
@@ -82,7 +184,7 @@ def check_status_code(logger, res):
             code = err['code']
             if code in [ERR_AUTH_ERROR, ERR_INVALID_PARAM_ERROR, ERR_NO_SPECIFIED_ID, ERR_NO_STATUS_ID]:
                 dump_response(logger, logging.ERROR, err['message'], res)
-                sys.exit(code)
+                raise FatalResponseError(err['message'], code)
 
         return STAT_RETRY
 
@@ -93,46 +195,58 @@ class Tweets:
     """ Tweets を取得する基底クラス """
 
     def __init__(self, config, endpoint, default_params,
-                 resource_family='search', resource='/search/tweets'):
+                 resource_family='search', resource='/search/tweets', session=None,
+                 budget=None, tracker=None, pacer=None, priority=PRIORITY_BULK,
+                 retry_policy=None, store=None):
         self.config = config
         self.logger = config.logger
         self.logger.debug("Called base Tweets")
         self.__UserAgent = config['AppName'] + " " + config['AppVersion']
-        self.__Bearer = self.__get_bearer(config['ConsumerAPIKey'], config['ConsumerAPISecret'])
-        self.__Endpoint = endpoint
+        self.__session = session if session is not None else make_session_from_config(config)
+        self.__budget = budget      # 複数スレッドで共有するリクエスト予算 (RequestBudget)
+        self.__tracker = tracker if tracker is not None else RATE_LIMITS
+        self.__reserve = config.getint('RateLimitReserve', 0)
+        self.__pacer = pacer        # リクエスト間隔の調整 (Pacer, None なら調整しない)
+        self.__priority = priority
+        # バックオフ・サーキットブレーカ (複数の Tweets で共有すると障害時に揃って止まる)
+        self.__retry = retry_policy if retry_policy is not None else make_retry_policy(config)
+        self.__store = store        # 取得済み Tweet のストア (TweetStore, None なら使わない)
+        self.__Endpoint = rebase_url(endpoint, config['APIBaseURL'])
+        self.__Token_Endpoint = rebase_url(TOKEN_ENDPOINT, config['APIBaseURL'])
+        self.__Status_Endpoint = rebase_url(STATUS_ENDPOINT, config['APIBaseURL'])
+        self.__Bearer = self.__get_cached_bearer()
         self.__Default_Params = default_params.copy()
         self.__Resource_Family = resource_family
         self.__Resource = resource
         self.__params = default_params.copy()
-        self.MAX_COUNT = 100
+        self.MAX_COUNT = MAX_COUNT
         self.__count_pattern = re.compile(r'&count=\d+')
 
         self.set_param('count', config['count'], force=True)
 
 
     def __get_counts(self, count, dispcount):
-        if count is None or count > self.MAX_COUNT:
-            count = self.MAX_COUNT
-
-        if dispcount is None or dispcount < 0:
-            dispcount = -1
-        elif dispcount == 0:
-            self.logger.error("invalid dispcount: %d", dispcount)
-            count = 0
-        elif count > dispcount:
-            count = dispcount
-            dispcount = 0
-        elif count <= dispcount:
-            dispcount -= count
-#        else:
-#            dispcount = -1
-        self.logger.debug("returning __get_counts(): count:%d, dispcount:%d", count, dispcount)
-        return count, dispcount
+        return calc_counts(self.logger, count, dispcount, self.MAX_COUNT)
+
 
+    def __get_cached_bearer(self):
+        """キャッシュ (プロセス内 / BearerCacheFile) から Bearer Token を取得、無ければ取得して登録"""
+        apikey = self.config['ConsumerAPIKey']
+        cachefile = self.config['BearerCacheFile'] or None
+        bearer = BEARER_CACHE.get(apikey, cachefile)
+        if bearer is None:
+            bearer = self.__get_bearer(apikey, self.config['ConsumerAPISecret'])
+            BEARER_CACHE.put(apikey, bearer, cachefile)
+        return bearer
+
+    def refresh_bearer(self):
+        """Bearer Token をキャッシュから破棄して取得し直す"""
+        BEARER_CACHE.discard_token(self.__Bearer)
+        self.__Bearer = self.__get_cached_bearer()
+        return self.__Bearer
 
     def __get_bearer(self, apikey, apisec):
         cred = self.__get_credential(apikey, apisec)
-        TOKEN_ENDPOINT = 'https://api.twitter.com/oauth2/token'
         headers = {
             'Authorization': 'Basic ' + cred,
             'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8',
@@ -143,7 +257,7 @@ class Tweets:
             }
 
         try:
-            res = requests.post(TOKEN_ENDPOINT, data=data, headers=headers, timeout=10.0)
+            res = self.__session.post(self.__Token_Endpoint, data=data, headers=headers, timeout=10.0)
             res.raise_for_status()
         except (TimeoutError, requests.ConnectionError) as e:
             self.logger.exception("Timeout: %s", e)
@@ -153,7 +267,7 @@ class Tweets:
             dump_response(self.logger, logging.ERROR, "Cannot get Bearer", res)
             status = check_status_code(self.logger, res)
             if status == STAT_ERR_EXIT:
-                sys.exit(255)
+                raise FatalResponseError("Cannot get Bearer")
         except Exception as e:
             self.logger.exception("Exception Type: %s", type(e))
             dump_response(self.logger, logging.ERROR, "Cannot get Bearer", res)
@@ -161,6 +275,14 @@ class Tweets:
         rjson = res.json()
         return rjson['access_token']
 
+    def get_session(self):
+        """接続プールを持つ requests.Session の取得 (他の Tweets と共有する場合に使用)"""
+        return self.__session
+
+    def close(self):
+        """接続プールのクローズ"""
+        self.__session.close()
+
     @staticmethod
     def __get_credential(apikey, apisec):
         pair = apikey + ':' + apisec
@@ -168,12 +290,26 @@ class Tweets:
         return bcred.decode()
 
 
-    def get_limit_status(self):
+    def get_limit_status(self, use_tracker=False):
+        """Rate Limit 情報の取得
+
+        use_tracker が True で、この resource の残り回数をレスポンスヘッダから把握済みなら
+        ネットワークアクセスせずにそれを返す。
+        """
+        if use_tracker and self.__tracker.get(self.__Resource) is not None:
+            return self.__tracker.to_status(self.__Resource_Family)
         return self.__get_limit_status()
 
+    def get_tracker(self):
+        """resource 毎の残り回数を保持する RateLimitTracker の取得"""
+        return self.__tracker
+
+    def get_retry_policy(self):
+        """リトライ方針 (RetryPolicy) の取得 (カウンタの参照・他の Tweets との共有用)"""
+        return self.__retry
+
 
     def __get_limit_status(self):
-        STATUS_ENDPOINT = 'https://api.twitter.com/1.1/application/rate_limit_status.json'
         params = {
             'resources': self.__Resource_Family  # help, users, search, statuses etc.
         }
@@ -182,7 +318,7 @@ class Tweets:
             'User-Agent': self.__UserAgent
         }
         try:
-            res = requests.get(STATUS_ENDPOINT, headers=headers, params=params, timeout=10.0)
+            res = self.__session.get(self.__Status_Endpoint, headers=headers, params=params, timeout=10.0)
             res.raise_for_status()
         except (TimeoutError, requests.ConnectionError) as e:
             self.logger.exception("Timeout: %s", e)
@@ -192,13 +328,15 @@ class Tweets:
             dump_response(self.logger, logging.ERROR, "Cannot get Limit Status", res)
             status = check_status_code(self.logger, res)
             if status == STAT_ERR_EXIT:
-                sys.exit(255)
+                raise FatalResponseError("Cannot get Limit Status")
         except Exception as e:
             self.logger.exception("Exception Type: %s", type(e))
             dump_response(self.logger, logging.ERROR, "Cannot get Limit Status", res)
             raise Exception("Cannot get Limit Status")
         dump_response(self.logger, logging.INFO, "Limit Status", res)
-        return res.json()
+        status = res.json()
+        self.__tracker.update_from_status(status)
+        return status
 
     def __calc_sleeptime(self, target_epoch_time):
         """target_epoch_time (UNIX タイム) までの Sleep 秒を返す"""
@@ -207,18 +345,25 @@ class Tweets:
         return sleep_time
 
     def wait_reset(self):
-        """reset 時刻まで sleep する"""
-        status = self.__get_limit_status()
-        self.logger.debug("status: %s", json.dumps(status, ensure_ascii=False, indent=2))
-        remaining = status['resources'][self.__Resource_Family][self.__Resource]['remaining']
-        if remaining == 0:
-            target_time = status['resources'][self.__Resource_Family][self.__Resource]['reset']
+        """reset 時刻まで sleep する (sleep した秒数を返す)
+
+        レスポンスヘッダから残り回数を把握済みなら rate_limit_status は問い合わせない。
+        """
+        limit = self.__tracker.get(self.__Resource)
+        if limit is None:
+            status = self.__get_limit_status()
+            self.logger.debug("status: %s", json.dumps(status, ensure_ascii=False, indent=2))
+            limit = status['resources'][self.__Resource_Family][self.__Resource]
+        if limit['remaining'] == 0:
+            target_time = limit['reset']
             sleep_time = self.__calc_sleeptime(target_time) + 10 # 念のため、10 秒加算
-            self.logger.debug("target_time: %d, sleep_time: %d",
+            self.logger.debug("target_time: %s, sleep_time: %d",
                               epoch2datetime(target_time), sleep_time)
             sys.stderr.flush()
             sys.stdout.flush()
             time.sleep(sleep_time)
+            return sleep_time
+        return 0
 
     def set_param(self, key, value, force=False):
         """__params[] への登録"""
@@ -248,190 +393,335 @@ class Tweets:
             return self.__params[key]
         return None
 
-    def get_one_tweet(self, search_id, retry_max=5, interval_time=10):
-        self.logger.debug("called Tweets.get_one_tweet(%s, %d, %d)",
-                          search_id, retry_max, interval_time)
-        params = {
-            'id': str(search_id),
-            'tweet_mode': 'extended'
-        }
-        headers = {
+    def __headers(self):
+        return {
             'Authorization':'Bearer {}'.format(self.__Bearer),
             'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8',
             'User-Agent':   self.__UserAgent,
         }
 
-        retry = 0
-        url = self.__Endpoint
-#        while retry <= retry_max:
+    def __request(self, url, headers, params, attempts, retry_max, interval_time, stream=False):
+        """RetryPolicy に従ってリトライ・Rate Limit 待ちをしながら GET する
+
+        attempts は分類毎のリトライ回数 (Counter, 呼び出し側で保持)。
+        リトライ回数を超えた場合は None を返す。回復しないエラーは FatalResponseError を送出する。
+        stream が True ならボディを読まずに返す (呼び出し側で読み切るか close() すること)。
+        """
+        refreshed = False
         while True:
             self.logger.debug("dryrun: %s", self.config['dryrun'])
             if self.config['dryrun']:
-                retry += 1
-                if retry > retry_max:
-                    break  # StopIteration
-                self.logger.info("dryrun, retry %d", retry)
-                continue
-
+                self.logger.info("dryrun")
+                return None
+
+            wait = self.__retry.admit()
+            while wait > 0:
+                self.logger.info("circuit breaker is open, waiting %.1f seconds", wait)
+                time.sleep(wait)
+                wait = self.__retry.admit()
+            if self.__budget is not None:
+                self.__budget.acquire()
+            if self.__pacer is not None:
+                self.__pacer.acquire(self.__Resource_Family, self.__priority)
+            # 残り回数が尽きる前に reset 時刻まで待つ
+            self.__tracker.acquire(self.__Resource, self.__reserve)
+            res = None
             try:
-                res = requests.get(url, headers=headers, params=params, timeout=10.0)
-                res.raise_for_status()
-            except (TimeoutError, requests.ConnectionError) as e:
+                res = self.__session.get(url, headers=headers, params=params, timeout=10.0,
+                                         stream=stream)
+                self.__tracker.update(self.__Resource_Family, self.__Resource, res.headers)
+            except (TimeoutError, requests.ConnectionError, requests.Timeout) as e:
                 self.logger.exception("Timeout: %s", e)
-                retry += 1
-                if retry > retry_max:
-                    break  # StopIteration
-                self.logger.info("retrying: %d sleep well...", retry)
-                time.sleep(interval_time)
-                continue
-            except requests.HTTPError as e:
+                klass = RETRY_NETWORK
+            except BaseException as e:
+                # サーキットブレーカの試行を終わらせる (他のリクエストが待ち続けないように)
+                self.__retry.release_probe()
+                if not isinstance(e, Exception):
+                    raise
+                self.logger.exception("Exception: %s", e)
+                dump_response(self.logger, logging.ERROR, "Unexpected Exception", res)
+                raise Exception("Unexpected Exception")
+            else:
+                if res.status_code < 500:
+                    # 応答があれば API は動いている (429, 4xx でも half open の試行を終わらせる)
+                    self.__retry.record_success()
+                if res.status_code < 400:
+                    self.logger.debug("status_code: %d", res.status_code)
+                    for key in (RETRY_NETWORK, RETRY_SERVER, RETRY_CLIENT):
+                        attempts.pop(key, None)
+                    return res
+
                 status = check_status_code(self.logger, res)
                 if status == STAT_WAIT:
-                    self.wait_reset()
-                    retry = 0
+                    retry_after = parse_retry_after(res.headers)
+                    if retry_after is not None:
+                        time.sleep(retry_after)
+                        slept = retry_after
+                    else:
+                        slept = self.wait_reset()
+                    self.__retry.count('retry:' + RETRY_RATE_LIMIT)
+                    self.__retry.count('sleep:' + RETRY_RATE_LIMIT, slept)
+                    attempts.clear()
                     continue
 
-                if status == STAT_RETRY:
-                    retry += 1
-                    if retry > retry_max:
-                        break  # StopIteration
-                    self.logger.info("retrying: %d sleep well...", retry)
-                    time.sleep(interval_time)
+                if status == STAT_ERR_EXIT and res.status_code == 401 and not refreshed:
+                    self.logger.info("Auth Error, refreshing Bearer Token")
+                    headers['Authorization'] = 'Bearer {}'.format(self.refresh_bearer())
+                    refreshed = True
                     continue
 
                 if status == STAT_ERR_EXIT:
-                    sys.exit(255)
-
-                self.logger.exception("Exception: %s", e)
-                dump_response(self.logger, logging.ERROR, "HTTPError", res)
-                raise requests.HTTPError("HTTPError")
+                    raise FatalResponseError("status_code: {}".format(res.status_code))
+
+                if status != STAT_RETRY:
+                    dump_response(self.logger, logging.ERROR, "HTTPError", res)
+                    self.__retry.release_probe()
+                    raise requests.HTTPError("HTTPError")
+                klass = status_class(res.status_code)
+
+            self.__retry.record_failure(klass)
+            attempts[klass] += 1
+            delay = self.__retry.next_delay(klass, attempts[klass], retry_max, interval_time,
+                                            parse_retry_after(res.headers if res is not None
+                                                              else None))
+            if delay is None:
+                return None
+            time.sleep(delay)
 
-            except Exception as e:
-                self.logger.exception("Exception: %s", e)
-                dump_response(self.logger, logging.ERROR, "Unexpected Exception", res)
-                raise Exception("Unexpected Exception")
-
-            self.logger.debug("status_code: %d", res.status_code)
-            dump_response(self.logger, logging.DEBUG, "get_one_tweet()", res)
-            return res.json()
-
-
-    def generator(self, given_params, retry_max=5, interval_time=5, dispcount=-1):
-        """Tweet を取得して一つずつに分離し、それぞれを metadata と対にして返す"""
-        self.logger.debug("called Tweets.generator(%s, %d, %d)",
-                          given_params, retry_max, interval_time)
+    def get_one_tweet(self, search_id, retry_max=5, interval_time=10):
+        self.logger.debug("called Tweets.get_one_tweet(%s, %d, %d)",
+                          search_id, retry_max, interval_time)
+        if self.__store is not None:
+            tweet = self.__store.get(search_id)
+            if tweet is not None:
+                return tweet
+        params = {
+            'id': str(search_id),
+            'tweet_mode': 'extended'
+        }
+        res = self.__request(self.__Endpoint, self.__headers(), params,
+                             Counter(), retry_max, interval_time)
+        if res is None:
+            return None  # リトライ回数超過
+        dump_response(self.logger, logging.DEBUG, "get_one_tweet()", res)
+        tweet = json_loads(res.content)
+        if self.__store is not None:
+            self.__store.put(tweet)
+            self.__store.flush()
+        return tweet
+
+    def lookup_tweets(self, search_ids, retry_max=5, interval_time=10):
+        """ID を LOOKUP_MAX_IDS 件ずつまとめて statuses/lookup で取得する
+
+        search_ids は ID のイテラブル (ファイル等からのストリームでも可)。
+        入力順に (ID 文字列, Tweet) を返し、削除済み・非公開等で取得できない ID は Tweet が None。
+        """
+        self.logger.debug("called Tweets.lookup_tweets(%d, %d)", retry_max, interval_time)
+        batch = []
+        for search_id in search_ids:
+            batch.append(str(search_id))
+            if len(batch) >= LOOKUP_MAX_IDS:
+                yield from self.__lookup_batch(batch, retry_max, interval_time)
+                batch = []
+        if batch:
+            yield from self.__lookup_batch(batch, retry_max, interval_time)
+
+    def __lookup_batch(self, batch, retry_max, interval_time):
+        found = {}
+        if self.__store is not None:
+            for search_id in batch:
+                tweet = self.__store.get(search_id)
+                if tweet is not None:
+                    found[search_id] = tweet
+        misses = [search_id for search_id in batch if search_id not in found]
+        if misses:
+            if self.__store is not None:
+                # 呼び出し側で保存したもの (前のバッチ) を API の呼び出し前に commit する
+                self.__store.flush()
+            found.update(self.__lookup_request(misses, retry_max, interval_time))
+        for search_id in batch:
+            yield search_id, found.get(search_id)
+
+    def __lookup_request(self, batch, retry_max, interval_time):
+        """statuses/lookup を 1 回呼び出し {ID 文字列: Tweet または None} を返す
+
+        リトライ回数を超えた場合は RetryOverError (取得できない ID の None と区別する)。
+        """
+        params = {
+            'id': ','.join(batch),
+            'map': 'true',          # 取得できない ID も null で返させる
+            'include_entities': 'true',
+            'tweet_mode': 'extended'
+        }
+        res = self.__request(self.__Endpoint, self.__headers(), params,
+                             Counter(), retry_max, interval_time)
+        if res is None:
+            self.logger.error("lookup failed: %d ids (%s ...)", len(batch), batch[0])
+            raise RetryOverError(self.__Endpoint)
+        found = json_loads(res.content)['id']
+        if self.__store is not None:
+            for tweet in found.values():
+                if tweet is not None:
+                    self.__store.put(tweet)
+            self.__store.flush()
+        return found
+
+
+    def generator(self, given_params, retry_max=5, interval_time=5, dispcount=-1, prefetch=0,
+                  retry_at_end=True, raise_on_giveup=False, stream=False):
+        """Tweet を取得して一つずつに分離し、それぞれを metadata と対にして返す
+
+        パラメータはローカルに保持するので、同じインスタンスで複数スレッドから同時に検索できる。
+        prefetch > 0 の場合は、バックグラウンドのスレッドで最大 prefetch ページ先まで取得しておく
+        (返す順序は prefetch しない場合と同じ)。
+        retry_at_end, raise_on_giveup, stream は pages() を参照。stream の場合 prefetch は無視する。
+        """
+        self.logger.debug("called Tweets.generator(%s, %d, %d, prefetch=%d, stream=%s)",
+                          given_params, retry_max, interval_time, prefetch, stream)
+
+        pages = self.pages(given_params, retry_max, interval_time, dispcount,
+                           retry_at_end=retry_at_end, raise_on_giveup=raise_on_giveup,
+                           stream=stream)
+        if prefetch > 0 and not stream:
+            pages = self.__prefetch(pages, prefetch)
+        for statuses, metadata in pages:
+            for tweet in statuses:
+                self.logger.info("saved_max_id: %d", tweet['id'])
+                yield tweet, metadata
+        return  # StopIteration
 
-        self.set_params(given_params)
+    def __prefetch(self, pages, depth):
+        """pages をバックグラウンドのスレッドで取得し、最大 depth ページをキューに溜めて返す"""
+        pageq = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pageq.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False    # 呼び出し側が途中で止めた
 
-        count, dispcount = self.__get_counts(self.get_param('count'), dispcount)
-        self.set_param('count', count, force=True)
-        # saved_params = self.__params.copy()
-        params = self.get_params()
+        def worker():
+            try:
+                for page in pages:
+                    if not put((STAT_CONTINUE, page)):
+                        return
+                put((STAT_BREAK, None))
+            except BaseException as e:  # pylint: disable=broad-except  sys.exit() も呼び出し側へ渡す
+                put((STAT_ERR_EXIT, e))
+
+        thread = threading.Thread(target=worker, name='twsearch-prefetch', daemon=True)
+        thread.start()
+        try:
+            while True:
+                status, value = pageq.get()
+                if status == STAT_BREAK:
+                    return
+                if status == STAT_ERR_EXIT:
+                    raise value
+                yield value
+        finally:
+            stop.set()
+
+    def pages(self, given_params, retry_max=5, interval_time=5, dispcount=-1,
+              retry_at_end=True, raise_on_giveup=False, stream=False):
+        """検索結果を 1 ページずつ (statuses, search_metadata) で返す
+
+        retry_at_end が False なら next_results が無くなった時点で (取得し直さずに) 終了する。
+        raise_on_giveup が True ならリトライ回数を超えた時に RetryOverError を送出する
+        (正常終了と区別したい場合用)。
+        stream が True なら statuses は受信しながらデコードするイテレータで、ページ全体を保持しない。
+        API のレスポンスでは search_metadata が statuses の後にあるため、search_metadata の dict は
+        statuses を最後まで読んだ時点で揃う (次のページに進む前に statuses を読み切ること)。
+        search_metadata の無いページを取得し直す場合、そのページで既に返した Tweet は返さない。
+        """
+        params = self.__params.copy()
+        params.update(given_params)
+
+        count, dispcount = self.__get_counts(params.get('count'), dispcount)
+        params['count'] = count
 
         self.logger.debug("count: %d", params['count'])
 
-        headers = {
-            'Authorization':'Bearer {}'.format(self.__Bearer),
-            'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8',
-            'User-Agent':   self.__UserAgent,
-        }
+        headers = self.__headers()
 
-        saved_max_id = None
         next_results = None
-        retry = 0
-        self.logger.debug("retry: %d, retry_max: %d", retry, retry_max)
+        attempts = Counter()    # 分類毎のリトライ回数
+        yielded = set()         # stream: 取得し直しているページで既に返した Tweet の ID
+        self.logger.debug("retry_max: %d", retry_max)
         url = self.__Endpoint
-#        while retry <= retry_max:
         while True:
-            self.logger.debug("dryrun: %s", self.config['dryrun'])
-            if self.config['dryrun']:
-                retry += 1
-                if retry > retry_max:
-                    break  # StopIteration
-                self.logger.info("dryrun, retry %d", retry)
-                continue
-
-            try:
-                res = requests.get(url, headers=headers, params=params, timeout=10.0)
-                res.raise_for_status()
-            except (TimeoutError, requests.ConnectionError) as e:
-                self.logger.exception("Timeout: %s", e)
-                retry += 1
-                if retry > retry_max:
-                    break  # StopIteration
-                self.logger.info("retrying: %d sleep well...", retry)
-                time.sleep(interval_time)
-                continue
-            except requests.HTTPError as e:
-                status = check_status_code(self.logger, res)
-                if status == STAT_WAIT:
-                    self.wait_reset()
-                    retry = 0
-                    continue
-
-                if status == STAT_RETRY:
-                    retry += 1
-                    if retry > retry_max:
-                        break  # StopIteration
-                    self.logger.info("retrying: %d sleep well...", retry)
-                    time.sleep(interval_time)
-                    continue
-
-                if status == STAT_ERR_EXIT:
-                    sys.exit(255)
-
-                self.logger.exception("Exception: %s", e)
-                dump_response(self.logger, logging.ERROR, "HTTPError", res)
-                raise requests.HTTPError("HTTPError")
-
-            except Exception as e:
-                self.logger.exception("Exception: %s", e)
-                dump_response(self.logger, logging.ERROR, "Unexpected Exception", res)
-                raise Exception("Unexpected Exception")
-
-            entry = res.json()
+            res = self.__request(url, headers, params, attempts, retry_max, interval_time,
+                                 stream=stream)
+            if res is None:
+                if raise_on_giveup:
+                    raise RetryOverError(url)
+                break  # StopIteration
+
+            if stream:
+                entry = {}
+                metadata = {}   # statuses を読み切った時点で search_metadata の内容を入れる
+                received = iter_search_page(res.iter_content(STREAM_CHUNK_SIZE), entry)
+                try:
+                    yield skip_yielded(received, yielded), metadata
+                    for _ in received:  # 読み残しがあれば読み切る
+                        pass
+                finally:
+                    res.close()
+                if 'search_metadata' in entry:
+                    metadata.update(entry['search_metadata'])
+                    entry['search_metadata'] = metadata
+            else:
+                entry = json_loads(res.content)
             self.logger.debug("status_code: %d", res.status_code)
 #           self.logger.debug("entry: %s", entry)
             if 'search_metadata' not in entry:
                 self.logger.info("status_code: %d", res.status_code)
                 self.logger.info("'search_metadata' is not in res: res.json() = %s",
                                  json.dumps(entry, ensure_ascii=False, indent=2))
-                retry += 1
-                if retry > retry_max:
+                attempts[RETRY_INVALID] += 1
+                delay = self.__retry.next_delay(RETRY_INVALID, attempts[RETRY_INVALID],
+                                                retry_max, interval_time)
+                if delay is None:
+                    if raise_on_giveup:
+                        raise RetryOverError(url)
                     break  # StopIteration
-                self.logger.info("retrying: %d sleep well...", retry)
-                time.sleep(interval_time * retry)
+                time.sleep(delay)
                 continue
 
             metadata = entry['search_metadata']
-            for tweet in entry['statuses']:
-                saved_max_id = tweet['id']
-                self.logger.info("saved_max_id: %d", saved_max_id)
-                yield tweet, metadata
+            yielded = set()
+            if not stream:
+                yield entry['statuses'], metadata
 
-            if metadata is not None:
+            if metadata is not None and self.logger.isEnabledFor(logging.DEBUG):
                 self.logger.debug("metadata: %s",
                                   json.dumps(metadata, ensure_ascii=False, indent=2))
 
             if 'next_results' not in metadata:
-                retry += 1
-                if retry > retry_max:
+                if not retry_at_end:
+                    break  # StopIteration
+                attempts[RETRY_END] += 1
+                delay = self.__retry.next_delay(RETRY_END, attempts[RETRY_END],
+                                                retry_max, interval_time)
+                if delay is None:
                     break  # StopIteration
-                self.logger.info("retrying: %s sleep well...", retry)
-                time.sleep(interval_time * retry)
+                time.sleep(delay)
             else:
                 self.logger.debug("next_results exists: %s", metadata['next_results'])
                 if dispcount == 0:
                     self.logger.debug("Returnning with dispcount == 0")
                     break  # StopIteration
                 count, dispcount = self.__get_counts(count, dispcount)
-                self.set_param('max_id', saved_max_id - 1, force=True)
                 params = None
                 next_results = self.__count_pattern.sub('&count={}'.format(count),
                                                         metadata['next_results'])
                 self.logger.debug("next_results: %s", next_results)
                 url = self.__Endpoint + next_results
-                retry = 0
+                attempts.clear()
         return  # StopIteration
 
     @staticmethod
@@ -18,10 +18,54 @@ class TwsConfig(Config):
         'ShelveFile': 'twsearch.shelve',
         'OutputFile': 'twsearch.csv',
         'OutputFilePrefix': 'twsearch',
-        'OutputFileExtention': 'csv',
+        'OutputFileExtention': None,
+        'OutputTimezone': 'Asia/Tokyo',
+        'CsvColumns': None,
+        'FlushPolicy': 'page',
+        'FlushRows': 1000,
+        'FlushInterval': 5,
+        'FlushFsync': False,
+        'ParquetRowGroupRows': 0,
+        'ParquetPartRows': 0,
+        'ParquetSchemaPolicy': 'merge',
         'Interval_Time': 5,
         'Count': 100,
         'DispCount': -1,
+        'PoolConnections': 10,
+        'PoolMaxSize': 10,
+        'PoolBlock': False,
+        'KeepAlive': True,
+        'BearerCacheFile': None,
+        'APIBaseURL': None,
+        'Queries': None,
+        'QueriesFile': None,
+        'Workers': 4,
+        'SearchRateLimit': 450,
+        'RateLimitReserve': 0,
+        'StatusesRateLimit': 900,
+        'Pacing': 'none',
+        'PacingUtilisation': 90,
+        'PacingReserve': 10,
+        'PacingBurst': 5,
+        'Prefetch': 0,
+        'Stream': False,
+        'JsonBackend': 'auto',
+        'TweetCacheFile': None,
+        'TweetCacheTTL': 7 * 24 * 3600,
+        'TweetCacheMaxEntries': 100000,
+        'FollowMinInterval': 15,
+        'FollowMaxInterval': 300,
+        'FollowTarget': 50,
+        'SeenIdFile': None,
+        'SeenIdCapacity': 10000000,
+        'SeenIdErrorRate': 0.01,
+        'RetryMaxDelay': 300,
+        'RetryJitter': True,
+        'RetryBudgetNetwork': None,
+        'RetryBudgetServer': None,
+        'RetryBudgetClient': None,
+        'BreakerThreshold': 5,
+        'BreakerCooldown': 60,
     }
 
     def __init__(self, argparams):
@@ -43,6 +87,15 @@ class TwsConfig(Config):
             key = key.lower()
             super().__setitem__(key, value)
 
+        # -o 不指定の JSON・NDJSON 出力は OutputFilePrefix.OutputFileExtention (未指定なら json, ndjson)
+        # Parquet, SQLite 出力は OutputFilePrefix.parquet (ディレクトリ), OutputFilePrefix.sqlite
+        output_format = self.__argparams.get('output_format', 'csv')
+        if output_format != 'csv' and 'outputfile' not in self.__argparams:
+            extension = output_format if output_format in ('parquet', 'sqlite') else \
+                self.__getitem__('OutputFileExtention') or output_format
+            super().__setitem__('outputfile', '{}.{}'.format(
+                self.__getitem__('OutputFilePrefix'), extension.lstrip('.')))
+
         for key in self.__iter__():
             if key in ("consumerapikey", "consumerapisecret"):
                 self.logger.debug("__params['%s'] = %s",
@@ -51,6 +104,33 @@ class TwsConfig(Config):
                 self.logger.debug("__params['%s'] = %s",
                                   key, self.__getitem__(key))
 
+    def overlay(self, overrides=None):
+        """この設定を元に一部の値だけ差し替えた設定 (TwsConfigOverlay) を作る"""
+        return TwsConfigOverlay(self, overrides)
+
+    def getint(self, key, default=None):
+        """設定値を int で取得 (ini ファイルの値は文字列のため)"""
+        value = self.__getitem__(key)
+        if value is None or value == '':
+            return default
+        return int(value)
+
+    def getfloat(self, key, default=None):
+        """設定値を float で取得"""
+        value = self.__getitem__(key)
+        if value is None or value == '':
+            return default
+        return float(value)
+
+    def getboolean(self, key, default=None):
+        """設定値を bool で取得 (yes/no, true/false, on/off, 1/0)"""
+        value = self.__getitem__(key)
+        if value is None or value == '':
+            return default
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in ('1', 'yes', 'true', 'on')
+
 
 #    def argparams(self, key):
 #        if key.lower() in self.__argparams:
@@ -72,3 +152,34 @@ class TwsConfig(Config):
 #
 #    def __contains__(self, key):
 #        return key.lower() in self.__mydict
+
+
+class TwsConfigOverlay:
+    """ TwsConfig の一部の値だけを差し替えた設定 (複数検索の検索毎の設定に使用)
+
+    差し替えた値・書き込んだ値は overlay 側だけに保持し、元の TwsConfig は変更しない。
+    """
+
+    def __init__(self, base, overrides=None):
+        self.logger = base.logger
+        self.__base = base
+        self.__overrides = {}
+        for key, value in (overrides or {}).items():
+            self.__setitem__(key, value)
+
+    def __getitem__(self, key):
+        key = key.lower()
+        if key in self.__overrides:
+            return self.__overrides[key]
+        return self.__base[key]
+
+    def __setitem__(self, key, value):
+        self.__overrides[key.lower()] = value
+
+    def overlay(self, overrides=None):
+        """この設定を元に更に値を差し替えた設定を作る"""
+        return TwsConfigOverlay(self, overrides)
+
+    getint = TwsConfig.getint
+    getfloat = TwsConfig.getfloat
+    getboolean = TwsConfig.getboolean
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""CSV 出力 (列の一覧から 1 回だけ組み立てた行の取り出し関数と、出力ファイル毎に 1 つの csv.writer)"""
+
+import csv
+
+DEFAULT_COLUMNS = (
+    'created_at_exceltime', 'created_at_epoch', 'created_at', 'created_at_jst',
+    'text', 'extended_text', 'hashtags', 'id', 'userId', 'name', 'screen_name', 'fixlink',
+    'wakati_text', 'wakati_extended_text',
+)
+
+
+# 列名 -> 値の式 (tweet: Tweet, user: tweet['user'], base: tweet_dict['base'],
+# wakati: tweet_dict['wakati'] (無ければ {}))
+COLUMNS = {
+    'created_at_exceltime': "base.get('created_at_exceltime', '')",
+    'created_at_epoch': "base.get('created_at_epoch', '')",
+    'created_at': "base.get('created_at', '')",
+    'created_at_jst': "base.get('created_at_jst', '')",
+    'text': "str(tweet['full_text'] if 'full_text' in tweet else tweet['text'])",
+    'extended_text': "str(tweet['extended_tweet']['full_text']) if 'extended_tweet' in tweet else ''",
+    'hashtags': "','.join([hashtag['text'] for hashtag in tweet['entities'].get('hashtags', ())])"
+                " if 'entities' in tweet else ''",
+    'id': "tweet.get('id', '')",
+    'userId': "user['id']",
+    'name': "user['name']",
+    'screen_name': "user['screen_name']",
+    'fixlink': "'https://twitter.com/' + user['screen_name'] + '/status/' + tweet['id_str']",
+    'wakati_text': "wakati.get('text', '')",
+    'wakati_extended_text': "wakati.get('extended_text', '')",
+    'lang': "tweet.get('lang', '')",
+    'retweet_count': "tweet.get('retweet_count', '')",
+    'favorite_count': "tweet.get('favorite_count', '')",
+    'in_reply_to_status_id': "tweet.get('in_reply_to_status_id', '')",
+    'gettime': "base.get('gettime', '')",
+    'localno': "base.get('localno', '')",
+}
+
+# 文字列以外の列の値の型 (Parquet, SQLite の列の型, 値が無い場合 (空文字列) は null)
+# hashtags はカンマ区切りの文字列 (Parquet では文字列のリスト)
+COLUMN_TYPES = {
+    'created_at_exceltime': 'float',
+    'created_at_epoch': 'int',
+    'id': 'int',
+    'userId': 'int',
+    'retweet_count': 'int',
+    'favorite_count': 'int',
+    'in_reply_to_status_id': 'int',
+    'gettime': 'float',
+    'localno': 'int',
+    'hashtags': 'list',
+}
+
+_ROW_TEMPLATE = """def row(tweet_dict):
+    tweet = tweet_dict['tweet']
+    user = tweet['user']
+    base = tweet_dict['base']
+    wakati = tweet_dict.get('wakati') or {{}}
+    return [{}]
+"""
+
+
+def parse_columns(value):
+    """カンマ区切り・空白区切りの列名 (空なら DEFAULT_COLUMNS), 不明な列名は ValueError"""
+    if not value:
+        return DEFAULT_COLUMNS
+    columns = tuple(value.replace(',', ' ').split())
+    unknown = [column for column in columns if column not in COLUMNS]
+    if unknown:
+        raise ValueError("Unknown CsvColumns: {} (available: {})".format(
+            ', '.join(unknown), ', '.join(COLUMNS)))
+    return columns
+
+
+def compile_row(columns):
+    """columns の行を返す関数 row(tweet_dict) を組み立てる
+
+    列毎の関数を呼ぶのではなく、全列の式を並べた 1 つの関数にコンパイルする (列名は COLUMNS のものだけ)。
+    """
+    namespace = {'str': str}
+    exec(_ROW_TEMPLATE.format(',\n            '.join(COLUMNS[column] for column in columns)),
+         namespace)     # pylint: disable=exec-used
+    return namespace['row']
+
+
+class CsvRowWriter:
+    """ SplunkWriter の tweet_dict を CSV の 1 行として書き込む (出力ファイル毎に 1 つ)
+
+    ヘッダは write_header が True なら最初の行の前に 1 回だけ書く。
+    """
+
+    def __init__(self, fp, columns=DEFAULT_COLUMNS, write_header=True):
+        self.fp = fp
+        self.columns = tuple(columns)
+        self.__row = compile_row(self.columns)
+        self.__writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
+        self.__header_yet = write_header
+
+    def writerow(self, tweet_dict):
+        """tweet_dict ({'tweet': ..., 'base': ..., 'wakati': ...}) を 1 行書き込む"""
+        if self.__header_yet:
+            self.__writer.writerow(self.columns)
+            self.fp.flush()
+            self.__header_yet = False
+        self.__writer.writerow(self.__row(tweet_dict))
+
+
+def make_csv_row_writer(config, fp):
+    """TwsConfig の CsvColumns, write_header から CsvRowWriter を生成"""
+    return CsvRowWriter(fp, columns=parse_columns(config['CsvColumns']),
+                        write_header=config['write_header'])
@@ -3,10 +3,17 @@
 """時刻変換のユーティリティ"""
 
 import datetime
+import calendar
+import functools
 import time
 
 from dateutil import tz
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 def datevalue2datetime(datevalue):
     """Excel の DateValue 形式を datetime へ変換"""
     days = int(round(datevalue, 0))
@@ -30,10 +37,8 @@ def datetime2datevalue(datetime_obj):
 
 
 def datetime2epoch(d_utc):
-    """datetime (UTC) をエポックタイム (UNIX タイム)へ変換"""
-    #UTC を localtime へ変換
-    date_localtime = d_utc.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
-    return int(time.mktime(date_localtime.timetuple()))
+    """datetime (UTC) をエポックタイム (UNIX タイム)へ変換 (ホストのタイムゾーンに依らない)"""
+    return calendar.timegm(d_utc.timetuple())
 
 
 def epoch2datetime(epoch):
@@ -55,3 +60,261 @@ def str_to_datetime_jp(datestr):
     """ツイートのdatetimeを日本標準時間に変換"""
     dts = str2datetime(datestr)
     return (dts + datetime.timedelta(hours=9)).strftime("%Y-%m-%d %H:%M:%S JST")
+
+
+_MONTHS = {name: i + 1 for i, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'))}
+_WEEKDAYS = frozenset(('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'))
+_EXCEL_EPOCH_DAYS = 25569       # 1899-12-30 から 1970-01-01 までの日数
+_JST_OFFSET = 9 * 3600
+
+
+def days_from_civil(year, month, day):
+    """グレゴリオ暦の年月日から 1970-01-01 からの日数"""
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days):
+    """1970-01-01 からの日数からグレゴリオ暦の (年, 月, 日)"""
+    days += 719468
+    era = (days if days >= 0 else days - 146096) // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + (3 if mp < 10 else -9)
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+DEFAULT_TIMEZONE = 'Asia/Tokyo'
+
+
+class DisplayZone:
+    """ 出力用のタイムゾーン (UTC オフセットと略称を日毎にキャッシュ)
+
+    name は dateutil.tz.gettz() の名前 ('Asia/Tokyo', 'UTC', 'America/New_York', 'JST-9' 等)。
+    オフセットが 1 日の中で変わらない日はその日の (オフセット, 略称) を 1 回だけ求め、
+    夏時間の切り替わる日だけ時刻毎に求める。
+    """
+
+    def __init__(self, name=DEFAULT_TIMEZONE):
+        self.name = name
+        self.tzinfo = tz.gettz(name)
+        if self.tzinfo is None:
+            raise ValueError('unknown timezone: {}'.format(name))
+        self.__days = {}
+
+    def __lookup(self, epoch):
+        local = datetime.datetime.fromtimestamp(epoch, self.tzinfo)
+        return int(local.utcoffset().total_seconds()), local.tzname()
+
+    def offset(self, epoch):
+        """epoch (UNIX タイム) の時刻の (UTC オフセット (秒), 略称)"""
+        day = epoch // 86400
+        cached = self.__days.get(day)
+        if cached is None:
+            start = self.__lookup(day * 86400)
+            cached = start if start == self.__lookup(day * 86400 + 86399) else False
+            self.__days[day] = cached
+        return cached or self.__lookup(epoch)
+
+    def format(self, epoch):
+        """epoch を 'YYYY-MM-DD HH:MM:SS 略称' にする (str_to_datetime_jp() と同じ書式)"""
+        offset, abbr = self.offset(epoch)
+        local = epoch + offset
+        year, month, day = civil_from_days(local // 86400)
+        if year > 9999:
+            # str_to_datetime_jp() と同じく datetime の範囲外
+            raise OverflowError('date value out of range')
+        local %= 86400
+        return '{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d} {}'.format(
+            year, month, day, local // 3600, local // 60 % 60, local % 60, abbr)
+
+
+@functools.lru_cache(maxsize=None)
+def get_display_zone(name=DEFAULT_TIMEZONE):
+    """name の DisplayZone (オフセットのキャッシュはプロセス内で共有)"""
+    return DisplayZone(name)
+
+
+def make_display_zone(config):
+    """TwsConfig の OutputTimezone から DisplayZone を取得 (デフォルト Asia/Tokyo)"""
+    return get_display_zone(config['OutputTimezone'] or DEFAULT_TIMEZONE)
+
+
+class TweetTime:
+    """ ツイートの日付 (UTC) 文字列を 1 回だけ解析し、派生する時刻をまとめて持つ
+
+    created_at の固定の書式 ('Thu Jun 04 01:00:01 +0000 2020') は strptime を使わずに解析する
+    (書式が違う場合は str2datetime() と同じく strptime で解析し、解析できなければ ValueError)。
+    datetime (UTC), epoch, datevalue (Excel), jst は str2datetime(), str2epoch(),
+    datetime2datevalue(), str_to_datetime_jp() と同じ値。
+    zone (DisplayZone) を指定すると jst はそのタイムゾーンの日時 (略称は JST ではなく zone のもの)。
+    """
+    __slots__ = ('created_at', 'datetime', 'epoch', 'datevalue', 'jst')
+
+    def __init__(self, datestr, zone=None):
+        self.created_at = datestr
+        try:
+            if len(datestr) != 30 or datestr[19:26] != ' +0000 ' or datestr[:3] not in _WEEKDAYS:
+                raise ValueError(datestr)
+            # datetime() で日付・時刻の範囲も確認する
+            dt = datetime.datetime(int(datestr[26:30]), _MONTHS[datestr[4:7]], int(datestr[8:10]),
+                                   int(datestr[11:13]), int(datestr[14:16]), int(datestr[17:19]))
+        except (KeyError, ValueError):
+            dt = str2datetime(datestr)
+        self.datetime = dt
+        days = days_from_civil(dt.year, dt.month, dt.day)
+        secs = dt.hour * 3600 + dt.minute * 60 + dt.second
+        self.epoch = days * 86400 + secs
+        # datetime2datevalue() と同じ計算順 (浮動小数点の結果を一致させる)
+        self.datevalue = days + _EXCEL_EPOCH_DAYS + secs / 3600 / 24
+        if zone is not None:
+            self.jst = zone.format(self.epoch)
+            return
+        jst = self.epoch + _JST_OFFSET
+        year, month, day = civil_from_days(jst // 86400)
+        if year > 9999:
+            # str_to_datetime_jp() と同じく datetime の範囲外
+            raise OverflowError('date value out of range')
+        jst %= 86400
+        self.jst = '{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d} JST'.format(
+            year, month, day, jst // 3600, jst // 60 % 60, jst % 60)
+
+
+def convert_dates(datestrs, use_numpy=None, zone=None):
+    """ツイートの日付(UTC)文字列のリスト (1 ページ分・アーカイブ) をまとめて変換
+
+    (epoch, datevalue, jst) を返す。NumPy があればベクトル演算で変換して配列 (int64, float64, str)、
+    無い場合 (use_numpy=False の場合) は TweetTime で 1 件ずつ変換してリストで返す。
+    値は str2epoch(), datetime2datevalue(), str_to_datetime_jp() と同じ
+    (zone (DisplayZone) を指定すると jst は TweetTime と同じくそのタイムゾーンの日時)。
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if not use_numpy:
+        times = [TweetTime(datestr, zone) for datestr in datestrs]
+        return ([created.epoch for created in times], [created.datevalue for created in times],
+                [created.jst for created in times])
+    epochs, datevalues, jsts = _convert_dates_numpy(datestrs)
+    if zone is not None:
+        # 略称の長さが一定でないため文字列は 1 件ずつ (オフセットは日毎のキャッシュ)
+        jsts = numpy.array([zone.format(epoch) for epoch in epochs.tolist()], dtype=str)
+    return epochs, datevalues, jsts
+
+
+def _name_keys(names):
+    """3 文字の名前 -> 文字コードから作るキー (ソート済みの配列, 値の配列)"""
+    keys = sorted((ord(name[0]) << 16 | ord(name[1]) << 8 | ord(name[2]), value)
+                  for name, value in names)
+    return numpy.array([k for k, _ in keys], dtype=numpy.int64), \
+        numpy.array([v for _, v in keys], dtype=numpy.int64)
+
+
+def _lookup(keys, values, codes):
+    """codes (int64 の配列) を keys で引く (無ければ 0)"""
+    pos = numpy.minimum(numpy.searchsorted(keys, codes), len(keys) - 1)
+    return numpy.where(keys[pos] == codes, values[pos], 0)
+
+
+if numpy is not None:
+    _DIGIT_COLUMNS = [8, 9, 11, 12, 14, 15, 17, 18, 26, 27, 28, 29]
+    _MONTH_KEYS = _name_keys(_MONTHS.items())
+    _WEEKDAY_KEYS = _name_keys((name, 1) for name in _WEEKDAYS)
+
+
+def _days_from_civil_np(year, month, day):
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * numpy.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _civil_from_days_np(days):
+    days = days + 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = numpy.where(mp < 10, mp + 3, mp - 9)
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+def _convert_dates_numpy(datestrs):
+    """convert_dates() の NumPy 版 (固定の書式でない・範囲外の行は TweetTime で変換)"""
+    arr = numpy.asarray(datestrs, dtype=str).ravel()
+    count = len(arr)
+    width = max(arr.dtype.itemsize // 4, 30)
+    # 1 文字 1 列の文字コードの配列
+    codes = numpy.zeros((count, width), dtype=numpy.int64)
+    if count:
+        codes[:, :arr.dtype.itemsize // 4] = \
+            arr.view(numpy.uint32).reshape(count, arr.dtype.itemsize // 4)
+    codes = codes[:, :30]
+    valid = numpy.char.str_len(arr) == 30
+    valid &= (codes[:, 19:26] == [ord(c) for c in ' +0000 ']).all(axis=1)
+    valid &= (codes[:, [3, 7, 10, 13, 16]] == [ord(c) for c in '   ::']).all(axis=1)
+    digits = codes - ord('0')
+    valid &= ((digits[:, _DIGIT_COLUMNS] >= 0) & (digits[:, _DIGIT_COLUMNS] <= 9)).all(axis=1)
+    name_codes = codes[:, 0] << 16 | codes[:, 1] << 8 | codes[:, 2]
+    valid &= _lookup(*_WEEKDAY_KEYS, name_codes) > 0
+    month = _lookup(*_MONTH_KEYS, codes[:, 4] << 16 | codes[:, 5] << 8 | codes[:, 6])
+
+    year = digits[:, 26] * 1000 + digits[:, 27] * 100 + digits[:, 28] * 10 + digits[:, 29]
+    day = digits[:, 8] * 10 + digits[:, 9]
+    hour = digits[:, 11] * 10 + digits[:, 12]
+    minute = digits[:, 14] * 10 + digits[:, 15]
+    second = digits[:, 17] * 10 + digits[:, 18]
+    month = numpy.where(month > 0, month, 1)
+    days = _days_from_civil_np(year, month, day)
+    # 存在しない日付 (2/30 等) は往復で変わる
+    year2, month2, day2 = _civil_from_days_np(days)
+    valid &= (month > 0) & (year >= 1) & (year2 == year) & (month2 == month) & (day2 == day) \
+        & (hour < 24) & (minute < 60) & (second < 60)
+
+    secs = hour * 3600 + minute * 60 + second
+    epoch = days * 86400 + secs
+    # datetime2datevalue() と同じ計算順 (浮動小数点の結果を一致させる)
+    datevalue = (days + _EXCEL_EPOCH_DAYS) + secs / 3600 / 24
+    jst = epoch + _JST_OFFSET
+    jyear, jmonth, jday = _civil_from_days_np(jst // 86400)
+    valid &= jyear <= 9999
+    jst %= 86400
+    chars = numpy.empty((count, 23), dtype=numpy.uint8)
+    chars[:] = numpy.frombuffer(b'0000-00-00 00:00:00 JST', dtype=numpy.uint8)
+    for col, values, length in ((0, jyear, 4), (5, jmonth, 2), (8, jday, 2),
+                                (11, jst // 3600, 2), (14, jst // 60 % 60, 2), (17, jst % 60, 2)):
+        for i in range(length):
+            chars[:, col + length - 1 - i] = ord('0') + values // 10 ** i % 10
+    jsts = chars.view('S23').ravel().astype(str)
+
+    # 固定の書式でない行は 1 件ずつ (不正な日付なら ValueError)
+    for i in numpy.flatnonzero(~valid):
+        created = TweetTime(str(arr[i]))
+        epoch[i], datevalue[i], jsts[i] = created.epoch, created.datevalue, created.jst
+    return epoch, datevalue, jsts
+
+
+TWITTER_EPOCH_MS = 1288834974657    # Snowflake (Tweet ID) の基準時刻 (ミリ秒)
+
+
+def datetime2snowflake(d_utc):
+    """datetime (UTC) をその時刻以降で最小の Tweet ID (Snowflake) へ変換"""
+    millisec = calendar.timegm(d_utc.timetuple()) * 1000 + d_utc.microsecond // 1000
+    return max(millisec - TWITTER_EPOCH_MS, 0) << 22
+
+
+def snowflake2datetime(tweet_id):
+    """Tweet ID (Snowflake) から投稿時刻 datetime (UTC) を取り出す"""
+    millisec = (int(tweet_id) >> 22) + TWITTER_EPOCH_MS
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=millisec)
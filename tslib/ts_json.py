@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""JSON のデコード・エンコード (orjson があれば使い、無ければ標準の json)
+
+orjson と標準の json の出力の違い (orjson の仕様):
+- 整数は 64 bit まで (範囲外・dict のキーが文字列以外の場合は標準の json で出力する)
+- NaN, Infinity は null になる
+- 浮動小数点数の表記が異なる場合がある (どちらも読み直すと同じ値)
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibCodec:
+    """標準の json モジュール"""
+    name = 'json'
+
+    @staticmethod
+    def loads(data):
+        """str / bytes をデコード"""
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj, indent=None):
+        """str にエンコード (ensure_ascii=False, indent 無しの場合は空白無し)"""
+        if indent is None:
+            return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+        return json.dumps(obj, ensure_ascii=False, indent=indent)
+
+
+class OrjsonCodec:
+    """orjson (indent は 2 のみ、それ以外は標準の json で出力)"""
+    name = 'orjson'
+
+    @staticmethod
+    def loads(data):
+        """str / bytes をデコード"""
+        return orjson.loads(data)
+
+    @staticmethod
+    def dumps(obj, indent=None):
+        """str にエンコード (標準の json の ensure_ascii=False と同じ出力)"""
+        if indent not in (None, 2):
+            return StdlibCodec.dumps(obj, indent)
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode('utf-8')
+        except TypeError:   # orjson.JSONEncodeError: 64 bit を超える整数など
+            return StdlibCodec.dumps(obj, indent)
+
+
+CODECS = {
+    'json': StdlibCodec,
+    'orjson': OrjsonCodec,
+}
+
+
+def available_codecs():
+    """使用できるバックエンド名のリスト"""
+    return [name for name in CODECS if name != 'orjson' or orjson is not None]
+
+
+def get_codec(name='auto'):
+    """バックエンド名 (auto | json | orjson) からコーデックを返す (auto は orjson を優先)"""
+    name = (name or 'auto').lower()
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in CODECS:
+        raise ValueError("Unknown JsonBackend: {}".format(name))
+    if name not in available_codecs():
+        raise ValueError("JsonBackend {} is not installed".format(name))
+    return CODECS[name]
+
+
+_CODEC = get_codec()
+
+
+def set_json_backend(name):
+    """json_loads() / json_dumps() で使うバックエンドの切り替え (TwsConfig の JsonBackend)"""
+    global _CODEC   # pylint: disable=global-statement
+    _CODEC = get_codec(name)
+    return _CODEC
+
+
+def get_json_backend():
+    """使用中のバックエンド名"""
+    return _CODEC.name
+
+
+def json_loads(data):
+    """str / bytes をデコード"""
+    return _CODEC.loads(data)
+
+
+def json_dumps(obj, indent=None):
+    """str にエンコード (ensure_ascii=False)"""
+    return _CODEC.dumps(obj, indent)
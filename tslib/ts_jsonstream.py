@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""検索結果の JSON を受信しながら statuses を 1 件ずつデコードするモジュール"""
+
+import re
+import codecs
+
+from .ts_json import json_loads
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_WHITESPACE = ' \t\n\r'
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+
+# トップレベルの解析状態
+_ST_START = 0       # '{' 待ち
+_ST_KEY = 1         # キー または '}' 待ち
+_ST_COLON = 2       # ':' 待ち
+_ST_VALUE = 3       # 値
+_ST_ARRAY = 4       # statuses の要素 または ']' 待ち
+_ST_ITEM = 5        # statuses の要素
+_ST_ITEM_END = 6    # ',' または ']' 待ち
+_ST_VALUE_END = 7   # ',' または '}' 待ち
+_ST_DONE = 8
+
+
+class _ValueScanner:
+    """JSON の値 1 つの終わりの位置を、データを追加しながら (読み直さずに) 探す"""
+
+    def __init__(self):
+        self.reset(0)
+
+    def reset(self, pos):
+        """pos から始まる値の走査を始める"""
+        self.start = pos
+        self.pos = pos
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.kind = None
+
+    def scan(self, buf, final=False):
+        """値の終わり (の次の位置) を返す。まだ値が完結していなければ None"""
+        pos = self.pos
+        end = len(buf)
+        if self.kind is None:
+            if pos >= end:
+                return None
+            char = buf[pos]
+            self.kind = 'container' if char in '{[' else ('string' if char == '"' else 'scalar')
+            if self.kind == 'string':
+                self.in_string = True
+                pos += 1
+        if self.escape:     # 前回のデータがエスケープ文字で終わっていた
+            if pos >= end:
+                return None
+            self.escape = False
+            pos += 1
+        if self.kind == 'scalar':
+            while pos < end and buf[pos] not in ',}]' and buf[pos] not in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            return pos if pos < end or final else None
+        while True:
+            if self.in_string:
+                # 文字列の中は '"' と '\\' だけを探す
+                match = _STRING_SPECIAL.search(buf, pos)
+                if match is None:
+                    pos = end
+                    break
+                pos = match.end()
+                if match.group() == '\\':
+                    if pos >= end:      # エスケープの途中でデータが途切れた
+                        self.escape = True
+                        break
+                    pos += 1
+                    continue
+                self.in_string = False
+                if self.depth == 0:     # トップレベルの文字列の終わり
+                    self.pos = pos
+                    return pos
+                continue
+            match = _STRUCTURAL.search(buf, pos)
+            if match is None:
+                pos = end
+                break
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.pos = pos
+                    return pos
+        self.pos = pos
+        return None
+
+
+class SearchPageDecoder:
+    """検索結果 {"statuses": [...], "search_metadata": {...}} のインクリメンタル デコーダ
+
+    feed() で受信したテキストを渡すと、完結した statuses の要素を返す。
+    statuses 以外のキー (search_metadata 等) は metadata (dict) に格納する。
+    受信済みで未処理のテキストだけを保持するので、ページ全体を保持しない。
+    """
+
+    def __init__(self, metadata=None, array_key='statuses'):
+        self.metadata = metadata if metadata is not None else {}
+        self.array_key = array_key
+        self.__buf = ''
+        self.__pos = 0
+        self.__state = _ST_START
+        self.__key = None
+        self.__scanner = _ValueScanner()
+
+    @property
+    def done(self):
+        """トップレベルのオブジェクトを最後まで読んだか"""
+        return self.__state == _ST_DONE
+
+    def feed(self, text, final=False):
+        """text を追加し、完結した statuses の要素のリストを返す"""
+        self.__buf = self.__buf[self.__pos:] + text
+        self.__scanner.start -= self.__pos
+        self.__scanner.pos -= self.__pos
+        self.__pos = 0
+        items = []
+        while self.__step(items, final):
+            pass
+        return items
+
+    def __skip_ws(self):
+        """空白を読み飛ばす。データが残っていなければ False"""
+        buf = self.__buf
+        pos = self.__pos
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        self.__pos = pos
+        return pos < len(buf)
+
+    def __expect(self, chars):
+        char = self.__buf[self.__pos]
+        if char not in chars:
+            raise ValueError("Unexpected {!r} (expected {!r})".format(char, chars))
+        self.__pos += 1
+        return char
+
+    def __scan_value(self, final):
+        """走査中の値が完結していればデコードして (True, 値) を返す"""
+        end = self.__scanner.scan(self.__buf, final)
+        if end is None:
+            return False, None
+        value = json_loads(self.__buf[self.__scanner.start:end])
+        self.__pos = end
+        return True, value
+
+    def __step(self, items, final):
+        """1 トークン分進める。データが足りなければ False"""
+        state = self.__state
+        if state == _ST_DONE:
+            return False
+        scanning = state in (_ST_KEY, _ST_VALUE, _ST_ITEM) and self.__scanner.kind is not None
+        if not scanning and not self.__skip_ws():
+            return False
+        if not scanning and state in (_ST_KEY, _ST_VALUE, _ST_ITEM):
+            self.__scanner.reset(self.__pos)
+
+        if state == _ST_START:
+            self.__expect('{')
+            self.__state = _ST_KEY
+        elif state == _ST_KEY:
+            if not scanning and self.__buf[self.__pos] == '}':
+                self.__pos += 1
+                self.__state = _ST_DONE
+                return True
+            complete, key = self.__scan_value(final)
+            if not complete:
+                return False
+            self.__key = key
+            self.__state = _ST_COLON
+        elif state == _ST_COLON:
+            self.__expect(':')
+            self.__state = _ST_VALUE
+            self.__scanner.reset(self.__pos)
+        elif state == _ST_VALUE:
+            if not scanning and self.__key == self.array_key and self.__buf[self.__pos] == '[':
+                self.__pos += 1
+                self.__state = _ST_ARRAY
+                return True
+            complete, value = self.__scan_value(final)
+            if not complete:
+                return False
+            self.metadata[self.__key] = value
+            self.__state = _ST_VALUE_END
+            self.__scanner.reset(self.__pos)
+        elif state == _ST_ARRAY:
+            if self.__buf[self.__pos] == ']':
+                self.__pos += 1
+                self.__state = _ST_VALUE_END
+            else:
+                self.__state = _ST_ITEM
+                self.__scanner.reset(self.__pos)
+        elif state == _ST_ITEM:
+            complete, item = self.__scan_value(final)
+            if not complete:
+                return False
+            items.append(item)
+            self.__state = _ST_ITEM_END
+            self.__scanner.reset(self.__pos)
+        elif state == _ST_ITEM_END:
+            self.__state = _ST_ARRAY if self.__expect(',]') == ',' else _ST_VALUE_END
+        elif state == _ST_VALUE_END:
+            self.__state = _ST_KEY if self.__expect(',}') == ',' else _ST_DONE
+            self.__scanner.reset(self.__pos)
+        return True
+
+
+def iter_search_page(chunks, metadata, array_key='statuses', encoding='utf-8'):
+    """受信中のボディ (chunks: bytes のイテラブル) から statuses の要素を完結した順に返す
+
+    search_metadata 等は metadata (dict) に格納される (最後まで読んだ時点で揃う)。
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    page = SearchPageDecoder(metadata, array_key)
+    for chunk in chunks:
+        if chunk:
+            yield from page.feed(decoder.decode(chunk))
+    yield from page.feed(decoder.decode(b'', final=True), final=True)
+    if not page.done:
+        raise ValueError("Truncated JSON: the response ended before the closing brace")
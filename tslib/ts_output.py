@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""出力ファイルの書き込みのバッファと flush のタイミング (FlushPolicy)"""
+
+import io
+import os
+import time
+
+FLUSH_POLICIES = ('page', 'rows', 'seconds', 'checkpoint')
+MAX_BUFFER = 4 * 1024 * 1024    # flush のタイミングに関わらず、これを超えたらファイルに書く (文字数)
+
+
+class BufferedOutput:
+    """ 出力ファイルへの書き込みをバッファし、FlushPolicy に従って flush するファイル風オブジェクト
+
+    page: ページ毎 (end_page()), rows: rows 行毎, seconds: 前回から seconds 秒経った行の後,
+    checkpoint: flush() (SplunkWriter が since_id を保存する前に呼ぶ) の時だけ。
+    どのポリシーでも since_id の保存の前には flush() されるため、Shelve が出力より先に進むことはない
+    (出力が Shelve より先に進むことはある)。fsync が True なら flush() で os.fsync() まで行う。
+    """
+
+    def __init__(self, fp, policy='page', rows=1000, seconds=5.0, fsync=False,
+                 max_buffer=MAX_BUFFER):
+        if policy not in FLUSH_POLICIES:
+            raise ValueError("Unknown FlushPolicy: {}".format(policy))
+        self.fp = fp
+        self.policy = policy
+        self.rows = rows
+        self.seconds = seconds
+        self.fsync = fsync
+        self.max_buffer = max_buffer
+        self.flushes = 0
+        self.__buf = []
+        self.__size = 0
+        self.__rows = 0
+        self.__last_flush = time.monotonic()
+
+    @property
+    def closed(self):
+        """元のファイルがクローズされているか"""
+        return self.fp.closed
+
+    @property
+    def durable(self):
+        """write() したものが全て元のファイルに書かれているか (flush() の後は常に True)"""
+        return not self.__buf
+
+    def write(self, text):
+        """text をバッファする (max_buffer を超えたらファイルに書く)"""
+        self.__buf.append(text)
+        self.__size += len(text)
+        if self.__size >= self.max_buffer:
+            self.__write_buffer()
+        return len(text)
+
+    def __write_buffer(self):
+        if self.__buf:
+            self.fp.write(''.join(self.__buf))
+            self.__buf = []
+            self.__size = 0
+
+    def end_row(self):
+        """1 行 (1 Tweet) の書き込みの終わり (rows, seconds)"""
+        self.__rows += 1
+        if self.policy == 'rows':
+            if self.__rows >= self.rows:
+                self.flush()
+        elif self.policy == 'seconds':
+            if time.monotonic() - self.__last_flush >= self.seconds:
+                self.flush()
+
+    def end_page(self):
+        """1 ページの書き込みの終わり (page)"""
+        if self.policy == 'page' and self.__rows:
+            self.flush()
+
+    def flush(self):
+        """バッファをファイルに書いて flush する (fsync が True なら os.fsync() も)"""
+        self.__write_buffer()
+        self.fp.flush()
+        if self.fsync:
+            try:
+                os.fsync(self.fp.fileno())
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                # 標準出力・ソケット等
+                pass
+        self.__rows = 0
+        self.__last_flush = time.monotonic()
+        self.flushes += 1
+
+    def close(self):
+        """flush して元のファイルをクローズ"""
+        if not self.fp.closed:
+            self.flush()
+            self.fp.close()
+
+
+def make_buffered_output(config, fp):
+    """TwsConfig の Flush* 設定から fp の BufferedOutput を生成"""
+    return BufferedOutput(fp, policy=config['FlushPolicy'] or 'page',
+                          rows=config.getint('FlushRows', 1000),
+                          seconds=config.getfloat('FlushInterval', 5.0),
+                          fsync=config.getboolean('FlushFsync', False))
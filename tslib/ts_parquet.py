@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Parquet 出力 (ディレクトリに part ファイルを追加していくデータセット)"""
+
+import os
+import glob
+import itertools
+import time
+import logging
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .ts_csvrow import DEFAULT_COLUMNS, COLUMN_TYPES, compile_row, parse_columns
+
+SCHEMA_POLICIES = ('merge', 'strict')
+
+# part ファイル名の通し番号 (同じプロセスの同じ秒の part ファイルを区別する)
+_PART_SEQUENCE = itertools.count()
+
+
+def parquet_schema(columns):
+    """columns の pyarrow.Schema (COLUMN_TYPES の float, int は float64, int64, list は文字列のリスト)"""
+    arrow_types = {
+        'float': pyarrow.float64(),
+        'int': pyarrow.int64(),
+        'list': pyarrow.list_(pyarrow.string()),
+    }
+    return pyarrow.schema([pyarrow.field(column, arrow_types.get(COLUMN_TYPES.get(column),
+                                                                 pyarrow.string()))
+                           for column in columns])
+
+
+def part_files(path):
+    """path (データセットのディレクトリ) の part ファイル (名前順 = 書いた順)"""
+    return sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+
+
+def check_schema(schema, existing, policy):
+    """既存の part ファイルのスキーマ existing に schema を追加できるか (できなければ ValueError)
+
+    merge: 列の追加・削除はできるが、同じ名前の列の型は変えられない。strict: 列と型が同じこと。
+    """
+    if policy not in SCHEMA_POLICIES:
+        raise ValueError("Unknown ParquetSchemaPolicy: {}".format(policy))
+    old = {field.name: field.type for field in existing}
+    new = {field.name: field.type for field in schema}
+    if policy == 'strict' and old != new:
+        raise ValueError("Parquet schema differs from the existing parts: {} -> {}".format(
+            sorted(old), sorted(new)))
+    conflicts = [name for name in new if name in old and new[name] != old[name]]
+    if conflicts:
+        raise ValueError("Parquet column types conflict with the existing parts: {}".format(
+            ', '.join('{} ({} -> {})'.format(name, old[name], new[name]) for name in conflicts)))
+
+
+class ParquetSink:
+    """ SplunkWriter の tweet_dict を CSV と同じ列の行にして Parquet に書く出力 (BufferedOutput と同じ呼び出し)
+
+    path はディレクトリで、既存の part ファイルは書き換えずに新しい part ファイルを追加する。
+    行は row_group_rows 行毎 (0 ならページ毎, end_page()) に 1 つの row group にする。
+    part ファイルは flush() (SplunkWriter が since_id を保存する前に呼ぶ) と close() で確定し、
+    書き込み中は .part-*.tmp (読み込み側からは見えない) に書く。
+    part_rows が 0 でなければ、part ファイルが part_rows 行になるまでは flush() で確定せず
+    (durable が False の間は SplunkWriter は since_id を保存しない)、小さな part ファイルを減らす。
+    reset が True なら既存の part ファイルを消す (-O)。
+    """
+
+    def __init__(self, path, columns=DEFAULT_COLUMNS, row_group_rows=0, part_rows=0,
+                 schema_policy='merge', reset=False):
+        if pyarrow is None:
+            raise ValueError("pyarrow is not installed (required for Parquet output)")
+        self.logger = logging.getLogger('twsearch')
+        self.path = path
+        self.columns = tuple(columns)
+        self.row_group_rows = row_group_rows
+        self.part_rows = part_rows
+        self.schema = parquet_schema(self.columns)
+        os.makedirs(path, exist_ok=True)
+        if reset:
+            for filename in part_files(path):
+                os.remove(filename)
+        existing = part_files(path)
+        if existing:
+            check_schema(self.schema, pyarrow.parquet.read_schema(existing[-1]), schema_policy)
+        self.parts = []
+        self.row_groups = 0
+        self.__row = compile_row(self.columns)
+        self.__rows = []
+        self.__writer = None
+        self.__tmpname = None
+        self.__part_rows = 0
+        self.__closed = False
+
+    @property
+    def closed(self):
+        """close() 済みか"""
+        return self.__closed
+
+    @property
+    def durable(self):
+        """write_row() した行が全て確定した part ファイルにあるか"""
+        return self.__writer is None and not self.__rows
+
+    def write_row(self, tweet_dict):
+        """tweet_dict を 1 行バッファする"""
+        self.__rows.append(self.__row(tweet_dict))
+
+    def end_row(self):
+        """1 行の書き込みの終わり (row_group_rows 行毎に row group を書く)"""
+        if self.row_group_rows and len(self.__rows) >= self.row_group_rows:
+            self.__write_row_group()
+
+    def end_page(self):
+        """1 ページの書き込みの終わり (row_group_rows が 0 なら row group を書く)"""
+        if not self.row_group_rows:
+            self.__write_row_group()
+
+    def __table(self, rows):
+        arrays = []
+        for field, values in zip(self.schema, zip(*rows)):
+            if pyarrow.types.is_list(field.type):
+                values = [value.split(',') if value else [] for value in values]
+            elif not pyarrow.types.is_string(field.type):
+                # CSV では空文字列の値 (無い場合) は null
+                values = [None if value == '' else value for value in values]
+            arrays.append(pyarrow.array(values, type=field.type))
+        return pyarrow.Table.from_arrays(arrays, schema=self.schema)
+
+    def __write_row_group(self):
+        if not self.__rows:
+            return
+        if self.__writer is None:
+            name = 'part-{}-{}-{:06d}.parquet'.format(time.strftime('%Y%m%d%H%M%S'), os.getpid(),
+                                                     next(_PART_SEQUENCE))
+            self.__tmpname = os.path.join(self.path, '.{}.tmp'.format(name))
+            self.parts.append(os.path.join(self.path, name))
+            self.__writer = pyarrow.parquet.ParquetWriter(self.__tmpname, self.schema)
+        self.__writer.write_table(self.__table(self.__rows), row_group_size=len(self.__rows))
+        self.row_groups += 1
+        self.__part_rows += len(self.__rows)
+        self.__rows = []
+
+    def flush(self):
+        """バッファした行を書いて part ファイルを確定する (次の行からは新しい part ファイル)
+
+        part_rows に満たない場合は row group を書くだけで確定しない。
+        """
+        self.__write_row_group()
+        if self.__part_rows < self.part_rows:
+            return
+        self.__finish_part()
+
+    def __finish_part(self):
+        if self.__writer is not None:
+            self.__writer.close()
+            os.replace(self.__tmpname, self.parts[-1])
+            self.logger.debug("parquet: wrote %s", self.parts[-1])
+            self.__writer = None
+            self.__tmpname = None
+            self.__part_rows = 0
+
+    def close(self):
+        """flush してクローズ"""
+        if not self.__closed:
+            self.__write_row_group()
+            self.__finish_part()
+            self.__closed = True
+
+
+def make_parquet_sink(config, path):
+    """TwsConfig の CsvColumns, ParquetRowGroupRows, ParquetPartRows, ParquetSchemaPolicy から
+    ParquetSink を生成"""
+    if path == '-':
+        raise ValueError("Parquet output requires an output directory (-o)")
+    return ParquetSink(path, columns=parse_columns(config['CsvColumns']),
+                       row_group_rows=config.getint('ParquetRowGroupRows', 0),
+                       part_rows=config.getint('ParquetPartRows', 0),
+                       schema_policy=config['ParquetSchemaPolicy'] or 'merge',
+                       reset=config['output_mode'] == 'w')
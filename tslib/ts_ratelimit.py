@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""Rate Limit を守るためのクラスモジュール"""
+
+import math
+import time
+import logging
+import threading
+from collections import deque
+
+RATE_LIMIT_WINDOW = 15 * 60     # Twitter API の Rate Limit のウィンドウ (秒)
+
+PRIORITY_BULK = 'bulk'
+PRIORITY_INTERACTIVE = 'interactive'    # -i の ID 指定取得など、待たせたくないリクエスト
+
+
+class RequestBudget:
+    """ 複数スレッドで共有する「window 秒あたり limit 回まで」のリクエスト予算
+
+    直近 window 秒に発行したリクエストの時刻を保持し、limit 回に達していれば空くまで待つ。
+    """
+
+    def __init__(self, limit, window=RATE_LIMIT_WINDOW):
+        self.logger = logging.getLogger('twsearch')
+        self.limit = limit
+        self.window = window
+        self.__issued = deque()
+        self.__cond = threading.Condition()
+
+    def acquire(self):
+        """リクエスト 1 回分の予算を確保する (無ければ空くまでブロック)"""
+        with self.__cond:
+            while True:
+                now = time.monotonic()
+                while self.__issued and self.__issued[0] <= now - self.window:
+                    self.__issued.popleft()
+                if len(self.__issued) < self.limit:
+                    self.__issued.append(now)
+                    return
+                wait = self.__issued[0] + self.window - now
+                self.logger.info("request budget exhausted, waiting %.1f seconds", wait)
+                self.__cond.wait(wait)
+
+    def remaining(self):
+        """現在のウィンドウで残っているリクエスト数"""
+        with self.__cond:
+            now = time.monotonic()
+            return self.limit - sum(1 for t in self.__issued if t > now - self.window)
+
+
+class RateLimitTracker:
+    """ レスポンスヘッダ (x-rate-limit-limit/remaining/reset) から resource 毎の残り回数を保持するクラス
+
+    リクエスト前に delay() / acquire() で残り回数を 1 つ予約し、残りが reserve 以下なら
+    reset 時刻まで待つ (429 を受ける前に止まる)。
+    レスポンスを受けたら update() でヘッダの値に合わせる。
+    """
+
+    def __init__(self, margin=1):
+        self.logger = logging.getLogger('twsearch')
+        self.margin = margin        # reset 時刻に加える余裕 (秒)
+        self.__limits = {}          # resource -> {'family', 'limit', 'remaining', 'reset'}
+        self.__lock = threading.Lock()
+
+    def update(self, family, resource, headers):
+        """レスポンスヘッダから残り回数を更新 (ヘッダが無ければ何もしない)"""
+        try:
+            limit = int(headers['x-rate-limit-limit'])
+            remaining = int(headers['x-rate-limit-remaining'])
+            reset = int(headers['x-rate-limit-reset'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        self.__set(family, resource, limit, remaining, reset)
+        return True
+
+    def update_from_status(self, status):
+        """application/rate_limit_status の結果から全 resource の残り回数を更新"""
+        for family, resources in status.get('resources', {}).items():
+            for resource, value in resources.items():
+                self.__set(family, resource, value['limit'], value['remaining'], value['reset'])
+
+    def __set(self, family, resource, limit, remaining, reset):
+        with self.__lock:
+            self.__limits[resource] = {
+                'family': family,
+                'limit': limit,
+                'remaining': remaining,
+                'reset': reset,
+            }
+
+    def get(self, resource):
+        """resource の {'limit', 'remaining', 'reset'} (不明または reset 済みなら None)"""
+        with self.__lock:
+            value = self.__current(resource)
+            if value is None:
+                return None
+            return {k: value[k] for k in ('limit', 'remaining', 'reset')}
+
+    def __current(self, resource):
+        value = self.__limits.get(resource)
+        if value is not None and time.time() >= value['reset']:
+            del self.__limits[resource]     # ウィンドウが切り替わったので不明に戻す
+            return None
+        return value
+
+    def to_status(self, family=None):
+        """application/rate_limit_status と同じ形式で返す (ネットワークアクセス無し)"""
+        resources = {}
+        with self.__lock:
+            for resource in list(self.__limits):
+                value = self.__current(resource)
+                if value is None or (family is not None and value['family'] != family):
+                    continue
+                resources.setdefault(value['family'], {})[resource] = \
+                    {k: value[k] for k in ('limit', 'remaining', 'reset')}
+        return {'resources': resources}
+
+    def delay(self, resource, reserve=0):
+        """リクエストできるまでの秒数を返す。0 の場合は残り回数を 1 つ予約済み"""
+        with self.__lock:
+            value = self.__current(resource)
+            if value is None:
+                return 0
+            if value['remaining'] > reserve:
+                value['remaining'] -= 1
+                return 0
+            return max(value['reset'] + self.margin - time.time(), 0.1)
+
+    def acquire(self, resource, reserve=0):
+        """残り回数が reserve より多くなるまで (reset 時刻まで) 待ってから 1 つ予約する"""
+        while True:
+            wait = self.delay(resource, reserve)
+            if wait <= 0:
+                return
+            self.logger.info("rate limit of %s is exhausted, waiting %.1f seconds", resource, wait)
+            time.sleep(wait)
+
+
+RATE_LIMITS = RateLimitTracker()
+
+
+class Pacer:
+    """ リクエストの発行間隔を調整する (pacing) スケジューラの基底クラス
+
+    resource family (search, statuses 等) 毎に limits[family] 回 / window 秒を上限として、
+    utilisation (0-1) を掛けた速さでウィンドウ全体に均等にリクエストを配る。
+    reserve (0-1) は PRIORITY_INTERACTIVE のリクエスト用に取っておく割合。
+    """
+
+    def __init__(self, limits, utilisation=0.9, reserve=0.1, window=RATE_LIMIT_WINDOW):
+        self.logger = logging.getLogger('twsearch')
+        self.limits = dict(limits)
+        self.utilisation = utilisation
+        self.reserve = reserve
+        self.window = window
+        self._lock = threading.Lock()
+
+    def rate(self, family):
+        """family の 1 秒あたりのリクエスト数 (上限が不明な family は None = 調整しない)"""
+        limit = self.limits.get(family)
+        if not limit:
+            return None
+        return limit * self.utilisation / self.window
+
+    # @abstractmethod
+    def delay(self, family, priority=PRIORITY_BULK):
+        """リクエストできるまでの秒数を返す。0 の場合は発行枠を確保済み (サブクラスで実装)"""
+        return 0    # 基底クラスでは調整しない
+
+    def acquire(self, family, priority=PRIORITY_BULK):
+        """発行枠を確保できるまで待つ"""
+        while True:
+            wait = self.delay(family, priority)
+            if wait <= 0:
+                return
+            self.logger.debug("pacing %s (%s): waiting %.2f seconds", family, priority, wait)
+            time.sleep(wait)
+
+
+class TokenBucketPacer(Pacer):
+    """ トークンバケット方式
+
+    トークンは rate で溜まり、容量は burst + 予約分 (ウィンドウの上限 x reserve)。
+    PRIORITY_BULK は予約分を残してしか使えず、PRIORITY_INTERACTIVE は予約分も使える。
+    """
+
+    def __init__(self, limits, utilisation=0.9, reserve=0.1, window=RATE_LIMIT_WINDOW, burst=5):
+        super().__init__(limits, utilisation, reserve, window)
+        self.burst = burst
+        self.__buckets = {}     # family -> [tokens, last_time]
+
+    def __reserved(self, family):
+        return math.ceil(self.limits[family] * self.utilisation * self.reserve)
+
+    def delay(self, family, priority=PRIORITY_BULK):
+        rate = self.rate(family)
+        if rate is None:
+            return 0
+        reserved = self.__reserved(family)
+        capacity = self.burst + reserved
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self.__buckets.get(family, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            need = 1 if priority == PRIORITY_INTERACTIVE else 1 + reserved
+            if tokens >= need:
+                self.__buckets[family] = (tokens - 1, now)
+                return 0
+            self.__buckets[family] = (tokens, now)
+            return (need - tokens) / rate
+
+
+class LeakyBucketPacer(Pacer):
+    """ リーキーバケット方式
+
+    リクエストを一定間隔で送り出す。PRIORITY_BULK は rate x (1 - reserve)、
+    PRIORITY_INTERACTIVE は rate x reserve の間隔で、それぞれ別の列で送り出す。
+    """
+
+    def __init__(self, limits, utilisation=0.9, reserve=0.1, window=RATE_LIMIT_WINDOW):
+        super().__init__(limits, utilisation, reserve, window)
+        self.__next = {}        # (family, priority) -> 次に送り出せる時刻
+
+    def delay(self, family, priority=PRIORITY_BULK):
+        rate = self.rate(family)
+        if rate is None:
+            return 0
+        share = self.reserve if priority == PRIORITY_INTERACTIVE else 1 - self.reserve
+        if share <= 0:
+            share = 1
+        interval = 1 / (rate * share)
+        with self._lock:
+            now = time.monotonic()
+            slot = self.__next.get((family, priority), now)
+            if slot > now:
+                return slot - now
+            self.__next[(family, priority)] = max(slot, now) + interval
+            return 0
+
+
+class AdaptiveInterval:
+    """ --follow のポーリング間隔 (新着の到着率に合わせて伸縮する)
+
+    到着率 (件/秒) の指数移動平均から 1 回のポーリングで target 件程度になる間隔を求め、
+    min_interval..max_interval に収める。新着が無ければ間隔を backoff 倍に伸ばす。
+    前回のリクエスト数を limit 回 / window 秒 x utilisation の予算で割った間隔を下限とする
+    (max_interval より優先)。
+    """
+
+    def __init__(self, min_interval=15.0, max_interval=300.0, target=50, limit=450,
+                 utilisation=0.9, window=RATE_LIMIT_WINDOW, alpha=0.3, backoff=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target = target
+        self.limit = limit
+        self.utilisation = utilisation
+        self.window = window
+        self.alpha = alpha
+        self.backoff = backoff
+        self.rate = None
+        self.interval = min_interval
+
+    def update(self, tweets, elapsed, requests=1):
+        """前回のポーリングから elapsed 秒の間に tweets 件の新着 (requests 回のリクエスト) が
+        あった場合の次の間隔 (秒) を返す (elapsed が 0 なら到着率は更新しない)"""
+        if elapsed > 0:
+            observed = tweets / elapsed
+            self.rate = observed if self.rate is None \
+                else self.alpha * observed + (1 - self.alpha) * self.rate
+        if tweets == 0:
+            interval = self.interval * self.backoff
+        elif self.rate:
+            interval = self.target / self.rate
+        else:
+            interval = self.min_interval
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        floor = requests * self.window / (self.limit * self.utilisation)
+        self.interval = max(interval, floor)
+        return self.interval
+
+
+def make_adaptive_interval(config):
+    """TwsConfig の Follow* 設定と SearchRateLimit, PacingUtilisation から AdaptiveInterval を生成"""
+    return AdaptiveInterval(min_interval=config.getfloat('FollowMinInterval', 15),
+                            max_interval=config.getfloat('FollowMaxInterval', 300),
+                            target=config.getint('FollowTarget', 50),
+                            limit=config.getint('SearchRateLimit', 450),
+                            utilisation=config.getfloat('PacingUtilisation', 90) / 100)
+
+
+PACERS = {
+    'token_bucket': TokenBucketPacer,
+    'leaky_bucket': LeakyBucketPacer,
+}
+
+
+def make_pacer(config):
+    """TwsConfig の Pacing* 設定から Pacer を生成 (Pacing = none の場合は None)"""
+    name = (config['Pacing'] or 'none').lower()
+    if name == 'none':
+        return None
+    if name not in PACERS:
+        raise ValueError("Unknown Pacing: {}".format(name))
+    kwargs = {
+        'limits': {
+            'search': config.getint('SearchRateLimit', 450),
+            'statuses': config.getint('StatusesRateLimit', 900),
+        },
+        'utilisation': config.getfloat('PacingUtilisation', 90) / 100,
+        'reserve': config.getfloat('PacingReserve', 10) / 100,
+    }
+    if name == 'token_bucket':
+        kwargs['burst'] = config.getint('PacingBurst', 5)
+    return PACERS[name](**kwargs)
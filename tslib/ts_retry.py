@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""リトライ (バックオフ・サーキットブレーカ) の方針を決めるクラスモジュール"""
+
+import time
+import random
+import logging
+import threading
+from collections import Counter
+
+# リトライの原因の分類
+RETRY_NETWORK = 'network'       # タイムアウト・接続エラー
+RETRY_SERVER = 'server'         # 5xx
+RETRY_CLIENT = 'client'         # リトライ可能な 4xx (403, 404 等)
+RETRY_RATE_LIMIT = 'rate_limit' # 420, 429 (回数制限はせず reset 時刻まで待つ)
+RETRY_INVALID = 'invalid'       # 200 だが search_metadata が無い
+RETRY_END = 'end'               # next_results が無い (retry_at_end=True の場合のみ)
+
+# サーキットブレーカの状態
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+# サーキットブレーカの失敗として数える分類 (API 全体の障害を示すもの)
+BREAKER_CLASSES = (RETRY_NETWORK, RETRY_SERVER)
+
+
+def status_class(status_code):
+    """HTTP ステータスコードからリトライの分類を返す (None はタイムアウト・接続エラー)"""
+    if status_code is None:
+        return RETRY_NETWORK
+    if status_code in (420, 429):
+        return RETRY_RATE_LIMIT
+    if status_code >= 500:
+        return RETRY_SERVER
+    return RETRY_CLIENT
+
+
+def parse_retry_after(headers):
+    """Retry-After ヘッダ (秒数) を float で返す (無い・日付形式の場合は None)"""
+    if headers is None:
+        return None
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+class RetryPolicy:
+    """ 複数スレッド・複数の Tweets で共有するリトライ方針
+
+    - 分類毎のリトライ回数の上限 (budgets, 指定の無い分類は呼び出し側の retry_max)
+    - 指数バックオフ (base * 2 ** (attempt - 1), 上限 cap) と full jitter
+    - Retry-After ヘッダがあればその秒数以上待つ
+    - network/server の失敗が threshold 回続いたら cooldown 秒間は全リクエストを止め、
+      その後 1 リクエストだけ試して (half open) 成功すれば再開する (サーキットブレーカ)。
+      試行は応答があれば成功 (record_success), network/server の失敗なら開き直し (record_failure),
+      例外で終わった場合は release_probe() で次の試行を通す
+    - 判断毎に counters() の retry:分類, sleep:分類 (秒), giveup:分類 等を加算
+    """
+
+    def __init__(self, base=5.0, cap=300.0, budgets=None, jitter=True,
+                 threshold=5, cooldown=60.0, clock=time.monotonic, rand=random.random):
+        self.logger = logging.getLogger('twsearch')
+        self.base = base
+        self.cap = cap
+        self.budgets = dict(budgets or {})
+        self.jitter = jitter
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.__clock = clock
+        self.__rand = rand
+        self.__counters = Counter()
+        self.__state = BREAKER_CLOSED
+        self.__failures = 0
+        self.__open_until = 0.0
+        self.__lock = threading.Lock()
+
+    def budget(self, klass, retry_max):
+        """klass のリトライ回数の上限"""
+        budget = self.budgets.get(klass)
+        return retry_max if budget is None else budget
+
+    def backoff(self, attempt, base=None, retry_after=None):
+        """attempt 回目のリトライまでの待ち時間 (秒)"""
+        base = self.base if base is None else base
+        delay = min(self.cap, base * 2 ** max(attempt - 1, 0))
+        if self.jitter:
+            delay *= self.__rand()
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def next_delay(self, klass, attempt, retry_max, base=None, retry_after=None):
+        """klass の attempt 回目のリトライの待ち時間を返す (上限を超えたら None = あきらめる)"""
+        if attempt > self.budget(klass, retry_max):
+            self.count('giveup:' + klass)
+            self.logger.info("giving up after %d %s retries", attempt - 1, klass)
+            return None
+        delay = self.backoff(attempt, base, retry_after)
+        self.count('retry:' + klass)
+        self.count('sleep:' + klass, delay)
+        self.logger.info("retrying %s: %d, sleep %.1f seconds", klass, attempt, delay)
+        return delay
+
+    def admit(self):
+        """サーキットブレーカの確認: リクエストしてよければ 0, 待つ必要があれば待ち秒数を返す"""
+        with self.__lock:
+            if self.__state == BREAKER_CLOSED:
+                return 0
+            now = self.__clock()
+            if self.__state == BREAKER_OPEN and now >= self.__open_until:
+                # 1 リクエストだけ通して様子を見る
+                self.__state = BREAKER_HALF_OPEN
+                self.__counters['breaker:half_open'] += 1
+                return 0
+            if self.__state == BREAKER_OPEN:
+                wait = self.__open_until - now
+            else:   # half open の試行中は結果が出るまで待たせる
+                wait = min(self.cooldown, 1.0)
+            self.__counters['sleep:breaker'] += wait
+            return wait
+
+    def record_success(self):
+        """リクエストの成功を記録 (サーキットブレーカを閉じる)"""
+        with self.__lock:
+            if self.__state != BREAKER_CLOSED:
+                self.logger.info("circuit breaker closed")
+            self.__state = BREAKER_CLOSED
+            self.__failures = 0
+
+    def release_probe(self):
+        """half open の試行が結果を記録せずに終わった (例外等) 場合に、次のリクエストを試行として通す"""
+        with self.__lock:
+            if self.__state == BREAKER_HALF_OPEN:
+                self.__state = BREAKER_OPEN
+                self.__open_until = self.__clock()
+
+    def record_failure(self, klass):
+        """リクエストの失敗を記録 (network/server の連続失敗でサーキットブレーカを開く)"""
+        if klass not in BREAKER_CLASSES:
+            return
+        with self.__lock:
+            self.__failures += 1
+            if self.__state == BREAKER_HALF_OPEN or \
+                    (self.__state == BREAKER_CLOSED and self.__failures >= self.threshold):
+                self.__state = BREAKER_OPEN
+                self.__open_until = self.__clock() + self.cooldown
+                self.__counters['breaker:open'] += 1
+                self.logger.warning("circuit breaker opened for %.1f seconds after %d failures",
+                                    self.cooldown, self.__failures)
+
+    def state(self):
+        """サーキットブレーカの状態 (closed, open, half_open)"""
+        with self.__lock:
+            return self.__state
+
+    def count(self, key, value=1):
+        """カウンタの加算"""
+        with self.__lock:
+            self.__counters[key] += value
+
+    def counters(self):
+        """カウンタのスナップショット"""
+        with self.__lock:
+            return dict(self.__counters)
+
+
+def make_retry_policy(config):
+    """TwsConfig の Retry* / Breaker* 設定から RetryPolicy を生成"""
+    budgets = {}
+    for klass, key in ((RETRY_NETWORK, 'RetryBudgetNetwork'),
+                       (RETRY_SERVER, 'RetryBudgetServer'),
+                       (RETRY_CLIENT, 'RetryBudgetClient')):
+        if config[key] not in (None, ''):
+            budgets[klass] = config.getint(key)
+    return RetryPolicy(base=config.getfloat('Interval_Time', 5),
+                       cap=config.getfloat('RetryMaxDelay', 300),
+                       budgets=budgets,
+                       jitter=config.getboolean('RetryJitter', True),
+                       threshold=config.getint('BreakerThreshold', 5),
+                       cooldown=config.getfloat('BreakerCooldown', 60))
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""出力済みの Tweet ID を実行をまたいで記録するインデックス (重複出力の抑止用)"""
+
+import os
+import math
+import mmap
+import logging
+import sqlite3
+import threading
+from collections import Counter
+
+COMMIT_EVERY = 1000     # この件数の add() 毎に呼び出し側で flush() する目安
+
+_MASK64 = (1 << 64) - 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def _mix64(value):
+    """splitmix64 の finalizer (Tweet ID の偏りを Bloom filter のビット位置に均す)"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def bloom_size(capacity, error_rate):
+    """capacity 件で偽陽性率 error_rate になる (ビット数, ハッシュ関数の数)"""
+    bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+    hashes = max(1, int(round(bits / capacity * math.log(2))))
+    return bits, hashes
+
+
+class SeenIds:
+    """ 出力済みの Tweet ID の集合 (Bloom filter + SQLite による厳密な確認)
+
+    Bloom filter (path + '.bloom' を mmap) に無ければ未出力、あれば SQLite (path) で確認する。
+    ページキャッシュ以外のメモリは使わず、件数が capacity を超えても判定は正確なまま
+    (偽陽性が増えて SQLite の確認が増えるだけ)。
+    add() したものは flush() で確定する (出力ファイルを flush した後に呼ぶこと)。
+    書き込みの前に check() で確認し、書き込んでから record() すれば、書き込めなかった ID は記録されない。
+    reset が True なら既存の記録を消す (出力ファイルを作り直す場合)。
+    """
+
+    def __init__(self, path, capacity=10000000, error_rate=0.01, reset=False):
+        self.logger = logging.getLogger('twsearch')
+        self.path = path
+        self.bloom_path = path + '.bloom'
+        if reset:
+            for filename in (self.path, self.bloom_path):
+                if os.path.exists(filename):
+                    os.remove(filename)
+        self.__lock = threading.Lock()
+        self.__counters = Counter()
+        self.__pending = 0
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        self.__conn.executescript(_SCHEMA)
+        meta = dict(self.__conn.execute('SELECT key, value FROM meta'))
+        if 'bits' not in meta:
+            # 既存のファイルでは作成時の大きさを使う
+            meta['bits'], meta['hashes'] = bloom_size(capacity, error_rate)
+            self.__conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)',
+                                    meta.items())
+        self.__conn.commit()
+        self.bits = meta['bits']
+        self.hashes = meta['hashes']
+        self.__fp, self.__bloom = self.__open_bloom()
+
+    def __open_bloom(self):
+        """Bloom filter のファイルを mmap する (無い・大きさが違う場合は SQLite から作り直す)"""
+        size = (self.bits + 7) // 8
+        rebuild = not os.path.exists(self.bloom_path) or \
+            os.path.getsize(self.bloom_path) != size
+        fp = open(self.bloom_path, mode='w+b' if rebuild else 'r+b')
+        if rebuild:
+            fp.truncate(size)
+        bloom = mmap.mmap(fp.fileno(), size)
+        if rebuild:
+            count = 0
+            for (tweet_id,) in self.__conn.execute('SELECT id FROM seen'):
+                self.__set(bloom, tweet_id)
+                count += 1
+            bloom.flush()
+            self.logger.info("seen ids: rebuilt %s from %d ids", self.bloom_path, count)
+        return fp, bloom
+
+    def __positions(self, tweet_id):
+        first = _mix64(tweet_id)
+        second = _mix64(first) | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.bits
+
+    def __set(self, bloom, tweet_id):
+        for pos in self.__positions(tweet_id):
+            bloom[pos >> 3] |= 1 << (pos & 7)
+
+    def __maybe(self, tweet_id):
+        bloom = self.__bloom
+        for pos in self.__positions(tweet_id):
+            if not bloom[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __exact(self, tweet_id):
+        return self.__conn.execute('SELECT 1 FROM seen WHERE id = ?',
+                                   (tweet_id,)).fetchone() is not None
+
+    def __contains__(self, tweet_id):
+        tweet_id = int(tweet_id)
+        with self.__lock:
+            return self.__maybe(tweet_id) and self.__exact(tweet_id)
+
+    def __check(self, tweet_id):
+        if self.__maybe(tweet_id):
+            self.__counters['bloom_hit'] += 1
+            if self.__exact(tweet_id):
+                self.__counters['duplicate'] += 1
+                return True
+            self.__counters['false_positive'] += 1
+        return False
+
+    def __record(self, tweet_id):
+        self.__conn.execute('INSERT OR IGNORE INTO seen (id) VALUES (?)', (tweet_id,))
+        self.__set(self.__bloom, tweet_id)
+        self.__counters['added'] += 1
+        self.__pending += 1
+
+    def check(self, tweet_id):
+        """出力済みなら True を返す (カウンタを加算し、記録はしない)"""
+        with self.__lock:
+            return self.__check(int(tweet_id))
+
+    def record(self, tweet_id):
+        """check() で未出力だった ID を記録する (出力ファイルに書き込んだ後に呼ぶ)"""
+        with self.__lock:
+            self.__record(int(tweet_id))
+
+    def add(self, tweet_id):
+        """未出力なら記録して True、出力済みなら False を返す"""
+        tweet_id = int(tweet_id)
+        with self.__lock:
+            if self.__check(tweet_id):
+                return False
+            self.__record(tweet_id)
+            return True
+
+    @property
+    def pending(self):
+        """flush() していない add() の件数"""
+        return self.__pending
+
+    def flush(self):
+        """add() したものを確定する (Bloom filter を書いてから commit)"""
+        with self.__lock:
+            if self.__conn is None:
+                return
+            self.__bloom.flush()
+            self.__conn.commit()
+            self.__pending = 0
+
+    def __len__(self):
+        with self.__lock:
+            return self.__conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def counters(self):
+        """カウンタのスナップショット (added, duplicate, bloom_hit, false_positive)"""
+        with self.__lock:
+            return dict(self.__counters)
+
+    def close(self):
+        """flush してクローズ"""
+        self.flush()
+        with self.__lock:
+            if self.__conn is None:
+                return
+            self.__bloom.close()
+            self.__fp.close()
+            self.__conn.close()
+            self.__conn = None
+
+
+def make_seen_ids(config):
+    """TwsConfig の SeenId* 設定から SeenIds を生成 (SeenIdFile が未指定なら None)
+
+    出力ファイルを作り直す場合 (-O) は記録も消す。
+    """
+    if not config['SeenIdFile']:
+        return None
+    return SeenIds(config['SeenIdFile'],
+                   capacity=config.getint('SeenIdCapacity', 10000000),
+                   error_rate=config.getfloat('SeenIdErrorRate', 0.01),
+                   reset=config['output_mode'] == 'w')
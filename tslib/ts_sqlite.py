@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""SQLite 出力 (Tweet ID で upsert するテーブルとハッシュタグの索引)"""
+
+import os
+import logging
+import sqlite3
+
+from .ts_csvrow import DEFAULT_COLUMNS, COLUMN_TYPES, compile_row, parse_columns
+
+# COLUMN_TYPES の型 -> SQLite の列の型 (それ以外は TEXT, hashtags はカンマ区切りのまま)
+SQL_TYPES = {
+    'float': 'REAL',
+    'int': 'INTEGER',
+    'list': 'TEXT',
+}
+
+# 索引を作る列 (列がある場合だけ)
+INDEXED_COLUMNS = ('created_at_epoch', 'userId')
+
+_HASHTAGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashtags (
+    hashtag TEXT NOT NULL COLLATE NOCASE,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (hashtag, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hashtags_id ON hashtags (id);
+"""
+
+
+def _quote(name):
+    return '"{}"'.format(name)
+
+
+class SqliteSink:
+    """ SplunkWriter の tweet_dict を CSV と同じ列の行にして SQLite に書く出力 (BufferedOutput と同じ呼び出し)
+
+    tweets テーブル (id が主キー) に INSERT ... ON CONFLICT(id) DO UPDATE で書くため、同じ Tweet は
+    1 行になる (後から取得した値で更新)。created_at_epoch, userId には索引を作り、hashtags 列がある場合は
+    hashtags テーブル (hashtag, id) にも書く (大文字・小文字を区別せずにハッシュタグで引ける)。
+    行はページ毎 (end_page(), flush()) に 1 つのトランザクションで書く。WAL モードで、
+    synchronous が FULL なら commit 毎に fsync する。
+    既存のテーブルに無い列は追加する。reset が True なら既存のファイルを消す (-O)。
+    """
+
+    def __init__(self, path, columns=DEFAULT_COLUMNS, synchronous='NORMAL', reset=False):
+        self.logger = logging.getLogger('twsearch')
+        self.path = path
+        self.columns = tuple(columns)
+        if 'id' not in self.columns:
+            raise ValueError("SQLite output requires the id column in CsvColumns")
+        if reset:
+            for filename in (path, path + '-wal', path + '-shm'):
+                if os.path.exists(filename):
+                    os.remove(filename)
+        self.transactions = 0
+        self.__row = compile_row(self.columns)
+        # 型のある列は空文字列 (値が無い) を NULL にする
+        self.__nullable = [i for i, column in enumerate(self.columns)
+                           if COLUMN_TYPES.get(column) in ('float', 'int')]
+        self.__id_index = self.columns.index('id')
+        self.__hashtags_index = self.columns.index('hashtags') if 'hashtags' in self.columns \
+            else None
+        self.__rows = []
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        self.__conn.execute('PRAGMA synchronous={}'.format(synchronous))
+        self.__create_tables()
+        updates = ', '.join('{0} = excluded.{0}'.format(_quote(column))
+                            for column in self.columns if column != 'id')
+        self.__upsert = 'INSERT INTO tweets ({}) VALUES ({}) ON CONFLICT(id) DO {}'.format(
+            ', '.join(_quote(column) for column in self.columns),
+            ', '.join('?' * len(self.columns)),
+            'UPDATE SET ' + updates if updates else 'NOTHING')
+
+    def __create_tables(self):
+        with self.__conn:
+            self.__conn.execute('CREATE TABLE IF NOT EXISTS tweets (id INTEGER PRIMARY KEY)')
+            existing = {row[1] for row in self.__conn.execute('PRAGMA table_info(tweets)')}
+            for column in self.columns:
+                if column not in existing:
+                    self.__conn.execute('ALTER TABLE tweets ADD COLUMN {} {}'.format(
+                        _quote(column), SQL_TYPES.get(COLUMN_TYPES.get(column), 'TEXT')))
+            for column in INDEXED_COLUMNS:
+                if column in self.columns:
+                    self.__conn.execute('CREATE INDEX IF NOT EXISTS {} ON tweets ({})'.format(
+                        _quote('tweets_' + column), _quote(column)))
+            if self.__hashtags_index is not None:
+                self.__conn.executescript(_HASHTAGS_SCHEMA)
+
+    @property
+    def closed(self):
+        """close() 済みか"""
+        return self.__conn is None
+
+    @property
+    def durable(self):
+        """write_row() した行が全て commit されているか"""
+        return not self.__rows
+
+    def write_row(self, tweet_dict):
+        """tweet_dict を 1 行バッファする"""
+        row = self.__row(tweet_dict)
+        for i in self.__nullable:
+            if row[i] == '':
+                row[i] = None
+        self.__rows.append(row)
+
+    def end_row(self):
+        """1 行の書き込みの終わり (ページ毎に書くため何もしない)"""
+
+    def end_page(self):
+        """1 ページの書き込みの終わり (1 つのトランザクションで書く)"""
+        self.flush()
+
+    def flush(self):
+        """バッファした行を 1 つのトランザクションで書く"""
+        if not self.__rows:
+            return
+        rows = self.__rows
+        with self.__conn:
+            self.__conn.executemany(self.__upsert, rows)
+            if self.__hashtags_index is not None:
+                ids = [(row[self.__id_index],) for row in rows]
+                self.__conn.executemany('DELETE FROM hashtags WHERE id = ?', ids)
+                self.__conn.executemany(
+                    'INSERT OR IGNORE INTO hashtags (hashtag, id) VALUES (?, ?)',
+                    [(hashtag, row[self.__id_index])
+                     for row in rows if row[self.__hashtags_index]
+                     for hashtag in row[self.__hashtags_index].split(',')])
+        self.transactions += 1
+        self.__rows = []
+
+    def close(self):
+        """flush してクローズ"""
+        if self.__conn is not None:
+            self.flush()
+            self.__conn.close()
+            self.__conn = None
+
+
+def make_sqlite_sink(config, path):
+    """TwsConfig の CsvColumns, FlushFsync から SqliteSink を生成"""
+    if path == '-':
+        raise ValueError("SQLite output requires an output file (-o)")
+    return SqliteSink(path, columns=parse_columns(config['CsvColumns']),
+                      synchronous='FULL' if config.getboolean('FlushFsync', False) else 'NORMAL',
+                      reset=config['output_mode'] == 'w')
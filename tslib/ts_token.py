@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Bearer Token のキャッシュ用クラスモジュール"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+
+
+def _cache_key(apikey):
+    """Consumer API Key をそのまま保存しないようにハッシュ化したキー"""
+    return hashlib.sha256(apikey.encode('utf-8')).hexdigest()
+
+
+class BearerCache:
+    """ Consumer API Key 毎に Bearer Token を保持するクラス
+
+    プロセス内のキャッシュに加え、cachefile を指定した場合はファイル (パーミッション 0600)
+    にも保存し、次回以降の起動で oauth2/token への問い合わせを省略する。
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger('twsearch')
+        self.__tokens = {}
+        self.__cachefiles = set()
+        self.__lock = threading.Lock()
+
+    def get(self, apikey, cachefile=None):
+        """キャッシュ済みの Bearer Token を返す (無ければ None)"""
+        key = _cache_key(apikey)
+        with self.__lock:
+            if key in self.__tokens:
+                return self.__tokens[key]
+            if cachefile is None:
+                return None
+            self.__cachefiles.add(cachefile)
+            token = self.__read_file(cachefile).get(key)
+            if token is not None:
+                self.logger.debug("Bearer Token is loaded from %s", cachefile)
+                self.__tokens[key] = token
+            return token
+
+    def put(self, apikey, token, cachefile=None):
+        """Bearer Token をキャッシュへ登録"""
+        key = _cache_key(apikey)
+        with self.__lock:
+            self.__tokens[key] = token
+            if cachefile is not None:
+                self.__cachefiles.add(cachefile)
+                entries = self.__read_file(cachefile)
+                entries[key] = token
+                self.__write_file(cachefile, entries)
+
+    def discard_token(self, token):
+        """無効になった Bearer Token をキャッシュ (ファイルを含む) から削除"""
+        with self.__lock:
+            for key in [k for k, v in self.__tokens.items() if v == token]:
+                del self.__tokens[key]
+            for cachefile in self.__cachefiles:
+                entries = self.__read_file(cachefile)
+                remains = {k: v for k, v in entries.items() if v != token}
+                if len(remains) != len(entries):
+                    self.logger.info("Discarding Bearer Token in %s", cachefile)
+                    self.__write_file(cachefile, remains)
+
+    def clear(self):
+        """プロセス内のキャッシュをクリア"""
+        with self.__lock:
+            self.__tokens.clear()
+
+    def __read_file(self, cachefile):
+        try:
+            with open(cachefile, mode='r', encoding='utf_8') as fp:
+                entries = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning("Cannot read Bearer cache %s: %s", cachefile, e)
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def __write_file(self, cachefile, entries):
+        tmpfile = cachefile + '.tmp'
+        try:
+            fd = os.open(tmpfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.fchmod(fd, 0o600)    # 既存ファイルでもパーミッションを絞る
+            with os.fdopen(fd, mode='w', encoding='utf_8') as fp:
+                json.dump(entries, fp)
+            os.replace(tmpfile, cachefile)
+        except OSError as e:
+            self.logger.warning("Cannot write Bearer cache %s: %s", cachefile, e)
+
+
+BEARER_CACHE = BearerCache()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""取得済みの Tweet を ID で引けるように保存するローカルストア"""
+
+import time
+import logging
+import sqlite3
+import threading
+from collections import Counter
+
+from .ts_json import json_loads, json_dumps
+
+COMMIT_EVERY = 100      # flush() を待たずに、この件数の put() 毎に commit (と容量の確認) をする
+EVICT_RATIO = 0.9       # 上限を超えたら、この割合まで古いものから削除する
+BUSY_TIMEOUT = 5.0      # 他のプロセスが書き込み中の場合に待つ秒数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    id INTEGER PRIMARY KEY,
+    body TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tweets_accessed_at ON tweets (accessed_at);
+"""
+
+
+class TweetStore:
+    """ Tweet ID をキーにした SQLite のストア (複数スレッドで共有可)
+
+    ttl 秒より前に保存したものは取得しない (0 なら期限なし)。
+    max_entries 件を超えたら、最後に参照・保存した時刻の古いものから削除する。
+    hit / miss / expired / put / evicted / error の回数を counters() で返す。
+
+    複数のプロセス (cron の同時実行など) で同じファイルを使えるように、WAL で開き、
+    書き込みのトランザクションは put() から flush() (ページ毎) までに限る。
+    get() で更新する参照時刻はメモリに溜めて commit 時に書き込む。
+    キャッシュなので、SQLite のエラー (database is locked 等) はログに出して無視する。
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=100000, clock=time.time):
+        self.logger = logging.getLogger('twsearch')
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__counters = Counter()
+        self.__pending = 0
+        self.__touched = {}     # 未書き込みの参照時刻 {ID: 時刻}
+        self.__conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        self.__conn.executescript(_SCHEMA)
+        self.__conn.commit()
+
+    def __error(self, operation, e):
+        """SQLite のエラーをログに出し、書き込み途中のものを捨てる (ロック取得済みで呼ぶ)"""
+        self.logger.warning("tweet store: %s failed: %s", operation, e)
+        self.__counters['error'] += 1
+        self.__pending = 0
+        self.__touched = {}
+        try:
+            self.__conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def __fresh(self, stored_at, now):
+        return not self.ttl or stored_at > now - self.ttl
+
+    def get(self, tweet_id):
+        """tweet_id の Tweet (無い・期限切れなら None)"""
+        try:
+            tweet_id = int(tweet_id)
+        except ValueError:
+            return None
+        with self.__lock:
+            now = self.__clock()
+            try:
+                row = self.__conn.execute('SELECT body, stored_at FROM tweets WHERE id = ?',
+                                          (tweet_id,)).fetchone()
+            except sqlite3.Error as e:
+                self.__error('get', e)
+                return None
+            if row is None:
+                self.__counters['miss'] += 1
+                return None
+            if not self.__fresh(row[1], now):
+                self.__counters['expired'] += 1
+                self.__counters['miss'] += 1
+                return None
+            # ここで UPDATE すると (commit するまで) 書き込みロックを持ち続けるので後で書く
+            self.__touched[tweet_id] = now
+            self.__counters['hit'] += 1
+        return json_loads(row[0])
+
+    def put(self, tweet):
+        """Tweet を保存 (内容が変わっていなければ保存時刻は更新しない)"""
+        body = json_dumps(tweet)
+        with self.__lock:
+            now = self.__clock()
+            try:
+                self.__conn.execute(
+                    'INSERT INTO tweets (id, body, stored_at, accessed_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (id) DO UPDATE SET '
+                    'body = excluded.body, stored_at = excluded.stored_at, '
+                    'accessed_at = excluded.accessed_at '
+                    'WHERE tweets.body <> excluded.body OR tweets.stored_at <= ?',
+                    (int(tweet['id']), body, now, now, now - self.ttl if self.ttl else -1))
+            except sqlite3.Error as e:
+                self.__error('put', e)
+                return
+            self.__counters['put'] += 1
+            self.__pending += 1
+            if self.__pending >= COMMIT_EVERY:
+                self.__commit()
+
+    def __commit(self):
+        """参照時刻の書き込み・容量の確認と commit (ロック取得済みで呼ぶ)"""
+        if not self.__pending and not self.__touched:
+            return
+        try:
+            self.__write()
+        except sqlite3.Error as e:
+            self.__error('commit', e)
+
+    def __write(self):
+        self.__pending = 0
+        if self.__touched:
+            self.__conn.executemany('UPDATE tweets SET accessed_at = ? WHERE id = ?',
+                                    [(now, tweet_id) for tweet_id, now
+                                     in self.__touched.items()])
+            self.__touched = {}
+        if self.ttl:
+            cur = self.__conn.execute('DELETE FROM tweets WHERE stored_at <= ?',
+                                      (self.__clock() - self.ttl,))
+            self.__counters['evicted'] += cur.rowcount
+        count = self.__conn.execute('SELECT COUNT(*) FROM tweets').fetchone()[0]
+        if self.max_entries and count > self.max_entries:
+            remove = count - int(self.max_entries * EVICT_RATIO)
+            cur = self.__conn.execute(
+                'DELETE FROM tweets WHERE id IN '
+                '(SELECT id FROM tweets ORDER BY accessed_at LIMIT ?)', (remove,))
+            self.__counters['evicted'] += cur.rowcount
+            self.logger.debug("tweet store: evicted %d of %d", cur.rowcount, count)
+        self.__conn.commit()
+
+    def flush(self):
+        """保存途中のものを commit する (ページ毎に呼んで書き込みロックを手放す)"""
+        with self.__lock:
+            self.__commit()
+
+    def __len__(self):
+        with self.__lock:
+            return self.__conn.execute('SELECT COUNT(*) FROM tweets').fetchone()[0]
+
+    def counters(self):
+        """カウンタのスナップショット"""
+        with self.__lock:
+            return dict(self.__counters)
+
+    def close(self):
+        """commit してクローズ"""
+        with self.__lock:
+            if self.__conn is None:
+                return
+            self.__commit()
+            self.__conn.close()
+            self.__conn = None
+
+
+def make_tweet_store(config):
+    """TwsConfig の TweetCache* 設定から TweetStore を生成 (未指定・--no-cache の場合は None)"""
+    if config['no_cache'] or not config['TweetCacheFile']:
+        return None
+    return TweetStore(config['TweetCacheFile'],
+                      ttl=config.getfloat('TweetCacheTTL', 7 * 24 * 3600),
+                      max_entries=config.getint('TweetCacheMaxEntries', 100000))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""twsclient.py
+
+twsearch.py --serve で起動した常駐サーバに検索・ID 取得のジョブを送り、結果を標準出力に書く。
+twsearch.py と同じ引数を使う (-o は無視され、結果は標準出力)。
+起動を速くするため標準ライブラリだけを使う。
+"""
+
+import os
+import sys
+import json
+import socket
+import struct
+import argparse
+import tempfile
+
+APP_NAME = "twsearch"
+
+# twsearch.py の DEFAULT_SOCKET, FRAME_* と同じ値
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), '{}-{}.sock'.format(APP_NAME, os.getuid()))
+FRAME_HEADER = struct.Struct('>cI')
+FRAME_OUT = b'o'
+FRAME_ERR = b'e'
+FRAME_EXIT = b'x'
+
+# 値をサーバ側で開くファイル名として使うオプション (絶対パスにして送る)
+PATH_OPTIONS = ('-b', '--shelvefile', '--missing_ids')
+ID_OPTIONS = ('-i', '--id')
+
+
+def read_ids(value):
+    """-i の値の - (標準入力) と @ファイル名 をカンマ区切りの ID にする (サーバからは読めないため)"""
+    if value == '-':
+        lines = sys.stdin.read().splitlines()
+    elif value.startswith('@'):
+        with open(value[1:], mode='r', encoding='utf_8') as fp:
+            lines = fp.read().splitlines()
+    else:
+        return value
+    ids = [line.split('#', 1)[0].strip() for line in lines]
+    return ','.join(tweet_id for tweet_id in ids if tweet_id)
+
+
+def prepare_argv(argv):
+    """サーバに送る引数 (ファイル名を絶対パスに, -i の - と @ファイル名を展開)"""
+    result = []
+    args = iter(argv)
+    for arg in args:
+        option, sep, value = arg.partition('=')
+        if option in PATH_OPTIONS + ID_OPTIONS:
+            if not sep:
+                value = next(args, None)
+                if value is None:
+                    result.append(arg)
+                    break
+            value = os.path.abspath(value) if option in PATH_OPTIONS else read_ids(value)
+            result.extend([option, value])
+        else:
+            result.append(arg)
+    return result
+
+
+def recv_exact(sock, size):
+    """size バイト受信する (途中で切断されたら None)"""
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def request(path, argv, out=None, err=None):
+    """ジョブを送り、出力を out, エラーを err (bytes) に書いて終了コードを返す"""
+    out = out if out is not None else sys.stdout.buffer
+    err = err if err is not None else sys.stderr.buffer
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps({'argv': argv}).encode('utf-8') + b'\n')
+        while True:
+            header = recv_exact(sock, FRAME_HEADER.size)
+            if header is None:
+                err.write(b'connection closed by the server\n')
+                return 1
+            kind, length = FRAME_HEADER.unpack(header)
+            payload = recv_exact(sock, length)
+            if payload is None:
+                err.write(b'connection closed by the server\n')
+                return 1
+            if kind == FRAME_OUT:
+                out.write(payload)
+            elif kind == FRAME_ERR:
+                err.write(payload)
+            elif kind == FRAME_EXIT:
+                out.flush()
+                err.flush()
+                return int(payload)
+
+
+def main():
+    """main()"""
+    parser = argparse.ArgumentParser(
+        usage='%(prog)s [--socket SOCKET] twsearch.py の引数 ...', add_help=False,
+        allow_abbrev=False)
+    parser.add_argument('--socket', type=str,
+                        default=os.environ.get('TWSEARCH_SOCKET', DEFAULT_SOCKET),
+                        help=u'サーバのソケット (デフォルト $TWSEARCH_SOCKET または {})'.format(
+                            DEFAULT_SOCKET))
+    args, argv = parser.parse_known_args()
+    try:
+        code = request(args.socket, prepare_argv(argv))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print("twsearch.py --serve is not running on {}".format(args.socket), file=sys.stderr)
+        code = 2
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
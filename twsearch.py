@@ -6,22 +6,52 @@ import sys
 import logging
 import shelve
 import json
-import csv
 import datetime
 import argparse
 import re
+import os
+import time
+import struct
+import signal
+import socket
+import tempfile
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from janome.tokenizer import Tokenizer
 
 from tslib import TwsConfig
-from tslib import Tweets
-from tslib import epoch2datetime, \
-            str2datetime, str2epoch, datetime2datevalue, str_to_datetime_jp
+from tslib import json_dumps, set_json_backend
+from tslib import Tweets, FatalResponseError, RetryOverError, make_session_from_config
+from tslib import RequestBudget, make_pacer, make_retry_policy, make_adaptive_interval, \
+    PRIORITY_INTERACTIVE
+from tslib import make_tweet_store, make_seen_ids, make_csv_row_writer, make_buffered_output, \
+    make_parquet_sink, make_sqlite_sink
+from tslib.ts_seenids import COMMIT_EVERY as SEEN_COMMIT_EVERY
+from tslib import epoch2datetime, datetime2datevalue, datetime2snowflake, TweetTime, \
+    make_display_zone
 
 APP_NAME = "twsearch"
 APP_VERSION = "v0.3.0"
 DEFAULT_CONFIG_FILE = APP_NAME + ".ini"
 
+# --serve のソケット (twsclient.py と同じ値)
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), '{}-{}.sock'.format(APP_NAME, os.getuid()))
+# --serve の応答のフレーム: 種類 1 バイト + 長さ 4 バイト + UTF-8
+FRAME_HEADER = struct.Struct('>cI')
+FRAME_OUT = b'o'        # 出力 (CSV/JSON)
+FRAME_ERR = b'e'        # エラー・取得できなかった ID
+FRAME_EXIT = b'x'       # 終了コード (最後のフレーム)
+FRAME_BUFSIZE = 64 * 1024
+
+# -o の拡張子から決まる出力形式 (--parquet 等を指定しなくてもよい)
+OUTPUT_FORMAT_EXTENSIONS = {
+    '.parquet': 'parquet',
+    '.sqlite': 'sqlite',
+    '.sqlite3': 'sqlite',
+}
+
 SEARCH_ENDPOINT = 'https://api.twitter.com/1.1/search/tweets.json'
 SEARCH_FAMILY = 'search'
 SEARCH_RESOURCE = '/search/tweets'
@@ -30,6 +60,41 @@ GETID_ENDPOINT = "https://api.twitter.com/1.1/statuses/show.json"
 GETID_FAMILY = "statuses"
 GETID_RESOURCE = "statuses/show"
 
+LOOKUP_ENDPOINT = "https://api.twitter.com/1.1/statuses/lookup.json"
+LOOKUP_FAMILY = "statuses"
+LOOKUP_RESOURCE = "/statuses/lookup"
+
+
+def make_tokenizer(config):
+    """janome の Tokenizer を生成 (user_simpledic 指定時はユーザー辞書付き)"""
+    if config['user_simpledic'] is None:
+        return Tokenizer()
+    return Tokenizer(config['user_simpledic'], udic_type='simpledic', udic_enc='utf8')
+
+
+def is_multi_id(search_id):
+    """-i の値が複数 ID ('-': 標準入力, '@file': ファイル, 'id1,id2': カンマ区切り) か"""
+    return search_id == '-' or search_id.startswith('@') or ',' in search_id
+
+
+def iter_search_ids(search_id):
+    """-i の値から ID を一つずつ返す (ファイル・標準入力は 1 行ずつ読み込む)"""
+    if search_id == '-':
+        lines = sys.stdin
+    elif search_id.startswith('@'):
+        lines = open(search_id[1:], mode='r', encoding='utf_8')
+    else:
+        lines = [search_id]
+    try:
+        for line in lines:
+            line = line.split('#', 1)[0]
+            for value in re.split(r'[\s,]+', line):
+                if value:
+                    yield value
+    finally:
+        if search_id.startswith('@'):
+            lines.close()
+
 class TweetsBySearch(Tweets):
     """ Twitter を検索するクラス """
     __Default_Params = {
@@ -49,19 +114,21 @@ class TweetsBySearch(Tweets):
                  endpoint=__Search_Endpoint,
                  default_params=__Default_Params,
                  resource_family=__Resource_Family,
-                 resource=__Resource):
+                 resource=__Resource,
+                 **kwargs):
         super().__init__(
             config=config,
             endpoint=endpoint,
             default_params=default_params,
             resource_family=resource_family,
-            resource=resource
+            resource=resource,
+            **kwargs    # session, budget, tracker, pacer, priority
         )
 
 
     def disp_limit_status(self):
-        """Rate Limit 情報の表示"""
-        gls_json = self.get_limit_status()
+        """Rate Limit 情報の表示 (レスポンスヘッダから把握済みならネットワークアクセス無し)"""
+        gls_json = self.get_limit_status(use_tracker=True)
         print(json.dumps(gls_json, indent=2, ensure_ascii=False))
 
 #{
@@ -108,31 +175,65 @@ class _CSVWriter:   # unused in current
                 self.csvfile = open(self.outputfile,
                                     mode=self.output_mode, newline='', encoding='utf_8_sig')
 
+
+# ファイルではなく行単位の出力先に書く出力形式 (CSV と同じ列, write_row() で書き込む)
+ROW_SINKS = {
+    'parquet': make_parquet_sink,
+    'sqlite': make_sqlite_sink,
+}
+
+
 class SplunkWriter:
     """ Splunk 読み込み用に Tweet 毎に metadata を付加して書き込むための基底クラス """
-    def __init__(self, config):
+    def __init__(self, config, session=None, tokenizer=None, client=None, pacer=None,
+                 retry_policy=None, store=None, outfp=None, errfp=None):
+        """session, tokenizer, client (TweetsBySearch), pacer, retry_policy, store (TweetStore) は
+        複数の SplunkWriter で共有する場合に指定
+        outfp (出力先, 指定時は OutputFile を開かない), errfp (取得できなかった ID の出力先,
+        デフォルト sys.stderr) は --serve のジョブで指定"""
         self.config = config
         self.logger = config.logger
+        # 最後まで取得した検索結果の最大の ID と日時 (Shelve に保存する since_id, since_date)
         self.__local_last_id = 0
         self.__local_last_date = epoch2datetime(0)
+        self.__since_date = None
+        # 取得中の検索結果の最大の ID と日時 (最後まで取得したら end_results() で反映する)
+        self.__results_last_id = 0
+        self.__results_last_date = epoch2datetime(0)
+        # Shelve に保存済みの since_id, since_date
+        self.__saved_id = 0
+        self.__saved_date = None
         self.__dbasename = config['ShelveFile'.lower()]
         self.__outfilename = config['OutputFile'.lower()]
         self.__outfile_open_mode = config['output_mode']
         self.__outfp = '-'
+        if outfp is not None:
+            self.__outfilename = '-'
+        self._errfp = errfp if errfp is not None else sys.stderr
         self.__is_localno = False
         self.__is_json = config['write_json']
-        self.__is_write_header = config['write_header']
-        self.__write_header_yet = True
+        self.__is_row_sink = config['output_format'] in ROW_SINKS
+        # JSON の indent (NDJSON は 1 行 1 JSON)
+        self.__json_indent = None if config['output_format'] == 'ndjson' else 2
         self.__is_wakati = config['wakati']
+        self.__zone = make_display_zone(config)
+        self.__dbase = None
+        self._seen = None
+        # 接続プールは全ての TweetsBySearch で共有
+        self._session = session if session is not None else make_session_from_config(config)
+        self._client = client
+        self._pacer = pacer if pacer is not None else make_pacer(config)
+        self._retry_policy = retry_policy if retry_policy is not None \
+            else make_retry_policy(config)
+        # 取得した Tweet を ID で引けるように保存する (共有されたものは close() しない)
+        self.__own_store = store is None
+        self._store = store if store is not None else make_tweet_store(config)
 
         if config['getstatus']:
             return
 
         if self.__is_wakati:
-            if config['user_simpledic'] is None:
-                self._tokenizer = Tokenizer()
-            else:
-                self._tokenizer = Tokenizer(config['user_simpledic'], udic_type='simpledic', udic_enc='utf8')
+            self._tokenizer = tokenizer if tokenizer is not None else make_tokenizer(config)
 
         if config['search_id'] is None:
             if self.__dbasename is None:
@@ -157,22 +258,85 @@ class SplunkWriter:
         else:
             outfile_encoding = 'utf_8_sig'
 
-        if self.__outfilename == '-':
-            self.__outfp = sys.stdout
+        self.__csv = None
+        if self.__is_row_sink:
+            # Parquet, SQLite: 出力先が flush (part ファイルの確定, commit) を行う
+            self.__outfp = ROW_SINKS[config['output_format']](config, self.__outfilename)
         else:
-            self.__outfp = open(self.__outfilename, mode=self.__outfile_open_mode,
-                                newline='', encoding=outfile_encoding)
+            if outfp is not None:
+                self.__outfp = outfp
+            elif self.__outfilename == '-':
+                self.__outfp = sys.stdout
+            else:
+                self.__outfp = open(self.__outfilename, mode=self.__outfile_open_mode,
+                                    newline='', encoding=outfile_encoding)
+            # 書き込みはバッファし、FlushPolicy と checkpoint() で flush する
+            self.__outfp = make_buffered_output(config, self.__outfp)
+            # CSV の列は出力ファイル毎に 1 回だけ組み立てる
+            if not self.__is_json:
+                self.__csv = make_csv_row_writer(config, self.__outfp)
+
+        # 出力済みの Tweet ID (検索のみ, 実行をまたいだ重複出力を抑止する)
+        if config['search_id'] is None:
+            self._seen = make_seen_ids(config)
 
     def __del__(self):
-        if self.__outfilename != '-' and self.__outfp != '-':
-            self.__outfp.close()
+        self.close()
+
+    def close(self):
+        """出力ファイルと Shelve ファイルのクローズ"""
+        if self.__outfp != '-' and not self.__outfp.closed:
+            durable = self.__outfp.durable
+            if self.__outfilename != '-':
+                self.__outfp.close()
+            else:
+                self.__outfp.flush()
+            if not durable:
+                # checkpoint() で保存できなかった (part ファイルが確定していなかった) 分
+                self.__save_state()
+        if self._seen is not None:
+            self._seen.close()
+            self._seen = None
+        if self.__dbase is not None:
+            self.__dbase.close()
+            self.__dbase = None
+        if self._store is not None and self.__own_store:
+            self._store.close()
+            self._store = None
 
         
+    def _tweets_by_search(self, config, **kwargs):
+        """共有の接続プール・Pacer・RetryPolicy を使う TweetsBySearch を生成"""
+        return TweetsBySearch(config, session=self._session, pacer=self._pacer,
+                              retry_policy=self._retry_policy, store=self._store, **kwargs)
+
+    def retry_counters(self):
+        """リトライ・サーキットブレーカのカウンタ"""
+        return self._retry_policy.counters()
+
+    def seen_counters(self):
+        """出力済み Tweet ID のカウンタ (未使用なら {})"""
+        return self._seen.counters() if self._seen is not None else {}
+
+    def store_counters(self):
+        """Tweet ストアのカウンタ (ストアを使わない場合は空)"""
+        return self._store.counters() if self._store is not None else {}
+
     def disp_limit_status(self):
         """Rate Limit 情報の表示"""
-        twbs = TweetsBySearch(self.config)
+        twbs = self._tweets_by_search(self.config)
         return twbs.disp_limit_status()
 
+    def get_state(self, key):
+        """Shelve ファイル (進捗) の値の取得"""
+        return self.__get_shelve_value(key)
+
+    def put_state(self, key, value):
+        """Shelve ファイル (進捗) への書き込み"""
+        if self.__dbase is not None:
+            self.__dbase[key] = value
+            self.__dbase.sync()
+
     # Shelve File key check
     def __get_shelve_value(self, key):
         if self.__dbase is not None:
@@ -181,12 +345,44 @@ class SplunkWriter:
         return None
 
     def get_one_tweet(self):
-        twbs = TweetsBySearch(self.config,
-                              endpoint=GETID_ENDPOINT,
-                              resource_family=GETID_FAMILY,
-                              resource=GETID_RESOURCE)
+        twbs = self._tweets_by_search(self.config,
+                                      endpoint=GETID_ENDPOINT,
+                                      resource_family=GETID_FAMILY,
+                                      resource=GETID_RESOURCE,
+                                      priority=PRIORITY_INTERACTIVE)
         return twbs.get_one_tweet(self.config['search_id'])
 
+    def lookup_tweets(self, config):
+        """複数の ID を statuses/lookup でまとめて取得して書き込む"""
+        twbs = self._tweets_by_search(config,
+                                      endpoint=LOOKUP_ENDPOINT,
+                                      resource_family=LOOKUP_FAMILY,
+                                      resource=LOOKUP_RESOURCE)
+        missing_fp = self._errfp
+        if config['missing_ids'] is not None:
+            missing_fp = open(config['missing_ids'], mode='a', encoding='utf_8')
+        counter = 0
+        missing = 0
+        try:
+            for tweet_id, tweet in twbs.lookup_tweets(iter_search_ids(config['search_id']),
+                                                      retry_max=config['retry_max'],
+                                                      interval_time=config['interval_time']):
+                if tweet is None:
+                    missing += 1
+                    print(tweet_id, file=missing_fp)
+                    continue
+                counter += 1
+                self.convert(tweet, metadata={}, counter=counter)
+        except RetryOverError as e:
+            # 取得できなかった ID は missing_ids (削除済み・非公開等) には書かない
+            raise FatalResponseError(
+                "lookup gave up after retries: {} tweets, {} missing written before {}".format(
+                    counter, missing, e), exit_code=1) from e
+        finally:
+            if missing_fp is not self._errfp:
+                missing_fp.close()
+        self.logger.info("lookup: %d tweets, %d missing", counter, missing)
+
     # @abstractmethod
     def generate(self, config):
         """レコード生成メソッド"""
@@ -202,43 +398,46 @@ class SplunkWriter:
 
     def convert(self, tweet, metadata, counter=-1):
         """時刻変換、追加、レコードの書き込み"""
-        if self.config['search_id'] is None:
-            self.logger.debug("local_last_id: %d, local_last_date: %s",
-                              self.__local_last_id, self.__local_last_date)
-            if self.__local_last_id < metadata['max_id']:
-                self.__local_last_id = metadata['max_id']
-                if self.__dbase is not None:
-                    self.logger.debug("dbase writing: %s", metadata['max_id'])
-                    self.__dbase['since_id'] = metadata['max_id']
-                    self.__dbase.sync()
+        # stream の場合、ページを読み切るまで metadata は空
+        if self.config['search_id'] is None and 'max_id' in metadata:
+            self.logger.debug("results_last_id: %d, results_last_date: %s",
+                              self.__results_last_id, self.__results_last_date)
+            if self.__results_last_id < metadata['max_id']:
+                # Shelve には検索結果を最後まで書き込んで flush してから保存する (end_results())
+                self.__results_last_id = metadata['max_id']
 
         if not tweet:
             return
 
+        if self._store is not None:
+            self._store.put(tweet)
+
         now = datetime.datetime.now()
 
         # tweet_id = tweet['id']
-        created_datetime = str2datetime(tweet['created_at'])
+        # created_at の解析は 1 回だけ (__write() も tweet_dict['base'] の値を使う)
+        created = TweetTime(tweet['created_at'], self.__zone)
+        created_datetime = created.datetime
         # workuser = tweet['user']
 
         if self.config['search_id'] is None:
-            if self.__local_last_date < created_datetime:
-                self.__local_last_date = created_datetime
-                if self.__dbase is not None:
-                    self.logger.debug("dbase writing: %s", created_datetime.strftime('%Y-%m-%d'))
-                    self.__dbase['since_date'] = created_datetime.strftime('%Y-%m-%d')
-                    self.__dbase.sync()
+            if self.__results_last_date < created_datetime:
+                self.__results_last_date = created_datetime
+
+        if self._seen is not None and self._seen.check(tweet['id']):
+            self.logger.debug("already written: %s", tweet['id'])
+            return
 
 #        if not SILENCE:
 #            print('get tweet: {}: {} - {}'.format(counter, tweet_id, created_datetime))
 
         tweet_dict = {
-            'created_time': str2epoch(tweet['created_at']),
+            'created_time': created.epoch,
             'base': {
                 'created_at': tweet['created_at'],
-                'created_at_exceltime': datetime2datevalue(str2datetime(tweet['created_at'])),
-                'created_at_epoch': str2epoch(tweet['created_at']),
-                'created_at_jst': str_to_datetime_jp(tweet['created_at']),
+                'created_at_exceltime': created.datevalue,
+                'created_at_epoch': created.epoch,
+                'created_at_jst': created.jst,
                 },
             'tweet': tweet,
             'search_metadata': metadata
@@ -265,86 +464,87 @@ class SplunkWriter:
             tweet_dict['base']['localno'] = counter
 
         self.__write(tweet_dict)
+        self.__outfp.end_row()
+        if self._seen is not None:
+            # 書き込んだ後に記録する (書き込み前に異常終了した Tweet は次回も出力する)
+            self._seen.record(tweet['id'])
+            if self._seen.pending >= SEEN_COMMIT_EVERY:
+                self.flush()
+
+    def end_page(self, metadata):
+        """検索結果の 1 ページの書き込みの終わり (FlushPolicy が page なら出力を flush)
+
+        since_id はまだ保存しない。ページは新しい順に next_results で古い方へ取得するため、
+        途中のページで保存すると、異常終了した場合に残りの (古い) ページを取得しなくなる。
+        """
+        if 'max_id' in metadata and self.__results_last_id < metadata['max_id']:
+            # stream の場合、metadata はページを読み切った時に入る
+            self.__results_last_id = metadata['max_id']
+        self.__outfp.end_page()
+        if self._store is not None:
+            # 次のページの取得 (Rate Limit の待ちを含む) の間、書き込みロックを持たない
+            self._store.flush()
+
+    def end_results(self):
+        """検索結果を最後まで書き込んだ: 出力を flush してから since_id, since_date を Shelve に保存"""
+        if self.__local_last_id < self.__results_last_id:
+            self.__local_last_id = self.__results_last_id
+        if self.__local_last_date < self.__results_last_date:
+            self.__local_last_date = self.__results_last_date
+            self.__since_date = self.__local_last_date.strftime('%Y-%m-%d')
+        self.checkpoint()
 
     def flush(self):
-        """出力ファイルの flush"""
+        """出力ファイルの flush (の後に出力済み Tweet ID を確定)
+
+        Parquet の part ファイルが確定していない (durable でない) 間は Tweet ID を確定しない。
+        """
         self.__outfp.flush()
+        if self._seen is not None and self.__outfp.durable:
+            self._seen.flush()
+
+    @property
+    def last_id(self):
+        """これまでに最後まで取得した検索結果の最大の ID (無ければ 0)"""
+        return self.__local_last_id
+
+    def __state_changed(self):
+        """Shelve に保存していない since_id, since_date があるか"""
+        return self.__local_last_id > self.__saved_id or self.__since_date != self.__saved_date
+
+    def checkpoint(self):
+        """出力を flush してから since_id, since_date を Shelve に保存 (Shelve が出力より先に進まない)"""
+        self.flush()
+        if self.__outfp.durable:
+            self.__save_state()
+
+    def __save_state(self):
+        """変更があれば since_id, since_date を Shelve に保存"""
+        if self.__dbase is None or not self.__state_changed():
+            return
+        if self.__local_last_id > self.__saved_id:
+            self.logger.debug("dbase writing: %s", self.__local_last_id)
+            self.__dbase['since_id'] = self.__local_last_id
+            self.__saved_id = self.__local_last_id
+        if self.__since_date != self.__saved_date:
+            self.logger.debug("dbase writing: %s", self.__since_date)
+            self.__dbase['since_date'] = self.__since_date
+            self.__saved_date = self.__since_date
+        self.__dbase.sync()
 
     def __write(self, tweet_json):
+        if self.__is_row_sink:
+            self.__outfp.write_row(tweet_json)
+            return
+
         if self.__is_json:
-            print(json.dumps(tweet_json, indent=2, ensure_ascii=False), file=self.__outfp)
+            print(json_dumps(tweet_json, indent=self.__json_indent), file=self.__outfp)
             return
 
         # Not JSON, but CSV file
-        self.logger.debug("Not JSON")
-        fieldnames = [
-            'created_at_exceltime', 'created_at_epoch', 'created_at', 'created_at_jst',
-            'text', 'extended_text', 'hashtags', 'id', 'userId', 'name', 'screen_name', 'fixlink',
-            'wakati_text', 'wakati_extended_text'
-            ]
-        writer = csv.DictWriter(self.__outfp, fieldnames=fieldnames,
-                                extrasaction='ignore', quoting=csv.QUOTE_ALL)
-        if self.__is_write_header and self.__write_header_yet:
-            writer.writeheader()
-            self.__outfp.flush()
-            self.__write_header_yet = False
-
-        tweet = tweet_json['tweet']
-
-        workuser = tweet['user']
-
-        if 'full_text' in tweet:
-            textkey = 'full_text'
-        else:
-            textkey = 'text'
-
-        if 'extended_tweet' in tweet:
-            extended_tweet = tweet['extended_tweet']
-            extended_full_text = extended_tweet['full_text']
-        else:
-            extended_tweet = {}
-            extended_full_text = ""
-
-        entities = {'hashtags': [{'text': ''}]}
-        if 'entities' in tweet:
-            entities = tweet['entities']
-        self.logger.debug("entities = %s", entities)
-
-        self.logger.debug("textkey = %s", textkey)
-
-        if self.__is_wakati:
-            wakati = tweet_json['wakati']
-            wakati_text = wakati['text']
-            wakati_extended_text = wakati['extended_text'] if 'extended_text' in wakati else ''
-        else:
-            wakati_text = ''
-            wakati_extended_text = ''
-            
-            
-
-        tweet_dict = {
-            'userId': workuser['id'],
-            'name': workuser['name'],
-            'screen_name': workuser['screen_name'],
-            'text': str(tweet[textkey]),
-            'extended_full_text': str(extended_full_text),
-            'hashtags': ','.join(Tweets.get_simple_hashtags(entities['hashtags'])),
-            'id': tweet['id'],
-            'created_at': tweet['created_at'],
-            'created_at_exceltime': datetime2datevalue(str2datetime(tweet['created_at'])),
-            'created_at_epoch': str2epoch(tweet['created_at']),
-            'created_at_jst': str_to_datetime_jp(tweet['created_at']),
-            'fixlink': 'https://twitter.com/' + workuser['screen_name'] + \
-                                                    '/status/' + tweet['id_str'],
-            'wakati_text': wakati_text,
-            'wakati_extended_text': wakati_extended_text
-            }
-        if self.__is_localno:
-            tweet_dict['gettime'] = tweet_json['base']['gettime']
-            tweet_dict['localno'] = tweet_json['base']['localno']
-
-        self.logger.debug("writing dict: %s", json.dumps(tweet_dict, ensure_ascii=False, indent=2))
-        writer.writerow(tweet_dict)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("writing dict: %s", json_dumps(tweet_json, indent=2))
+        self.__csv.writerow(tweet_json)
 
 
 class SplunkWriterBySearch(SplunkWriter):
@@ -363,25 +563,473 @@ class SplunkWriterBySearch(SplunkWriter):
                     params[key] = value
 
         if config['search_id'] is None:
-            twbs = TweetsBySearch(config)
+            stream = config.getboolean('Stream', False)
+            if stream and config['write_json']:
+                # JSON 出力は Tweet 毎に search_metadata を書くため、ページを読み切る必要がある
+                self.logger.info("Stream is ignored for JSON output")
+                stream = False
+            twbs = self._client
+            if twbs is None:
+                twbs = self._tweets_by_search(config)
             tweets_generator = twbs.generator(params, retry_max=config['retry_max'],
                                               interval_time=config['interval_time'],
-                                              dispcount=config['dispcount'])
+                                              dispcount=config['dispcount'],
+                                              prefetch=config.getint('Prefetch', 0),
+                                              retry_at_end=not config['follow'],
+                                              raise_on_giveup=True, stream=stream)
             counter = 0
-            for tweet, metadata in tweets_generator:
-                counter += 1
-                super().convert(tweet, metadata, counter)
+            page = None
+            try:
+                for tweet, metadata in tweets_generator:
+                    if page is not None and metadata is not page:
+                        self.end_page(page)
+                    page = metadata
+                    counter += 1
+                    super().convert(tweet, metadata, counter)
+            except RetryOverError as e:
+                # 残りのページを取得していないので since_id は進めない (次回は同じ範囲を取得し直す)
+                self.logger.error("search gave up after retries, since_id is not saved: %s", e)
+                if page is not None:
+                    self.end_page(page)
+                return counter
+            if page is not None:
+                self.end_page(page)
+            self.end_results()
+            return counter
+        elif is_multi_id(config['search_id']):
+            self.lookup_tweets(config)
         else:   # config['search_id' is not None
-            twbs = TweetsBySearch(self.config,
-                                  endpoint=GETID_ENDPOINT,
-                                  resource_family=GETID_FAMILY,
-                                  resource=GETID_RESOURCE)
+            twbs = self._tweets_by_search(self.config,
+                                          endpoint=GETID_ENDPOINT,
+                                          resource_family=GETID_FAMILY,
+                                          resource=GETID_RESOURCE,
+                                          priority=PRIORITY_INTERACTIVE)
             tweet = twbs.get_one_tweet(config['search_id'])
             self.convert(tweet, metadata={}, counter=1)
 
 
-def tw_argparse():
-    """コマンドライン引数の Parse"""
+class SplunkWriterByFollow(SplunkWriterBySearch):
+    """ --follow: 1 つのプロセスで since_id 以降の新着を繰り返し検索するクラス
+
+    since_id はメモリ上の値を使い、Shelve にはポーリング毎に出力を flush してから保存する
+    (途中で終了しても、再開時はそのポーリングの最初から取得し直す。リトライをあきらめたポーリングでは
+    since_id を進めず、次のポーリングで同じ範囲から取得し直す)。
+    ポーリング間隔は AdaptiveInterval で決め、stop() で現在のポーリングを終えてから終了する。
+    """
+
+    def __init__(self, config, **kwargs):
+        super().__init__(config, **kwargs)
+        self.__stop = threading.Event()
+
+    def stop(self):
+        """次のポーリングをせずに generate() を終える"""
+        self.__stop.set()
+
+    def generate(self, config):
+        interval = make_adaptive_interval(config)
+        if self._client is None:
+            # Bearer Token・Rate Limit の状態をポーリング間で引き継ぐ
+            self._client = self._tweets_by_search(config)
+        count = config.getint('count', 100)
+        last_start = None
+        while not self.__stop.is_set():
+            start = time.monotonic()
+            since_id = self.last_id or config['since_id']
+            tweets = super().generate(config.overlay({'since_id': since_id}))
+            self.checkpoint()
+            wait = interval.update(tweets, start - last_start if last_start else 0,
+                                   requests=max(1, -(-tweets // count)))
+            last_start = start
+            self.logger.info("follow: %d tweets since %s, rate %s/s, next poll in %.1f seconds",
+                             tweets, since_id, interval.rate, wait)
+            self.__stop.wait(max(wait - (time.monotonic() - start), 0))
+
+
+class SplunkWriterByWindow(SplunkWriterBySearch):
+    """ 期間 (since_id..max_id) を区切って検索し、ウィンドウ毎に進捗を保存するクラス
+
+    Shelve の window_max_id に書き込み済みの最も古い ID - 1 を、completed に完了を記録する。
+    """
+
+    def generate(self, config):
+        if self.get_state('completed'):
+            self.logger.info("window %s is already completed", config['OutputFile'])
+            return
+        max_id = self.get_state('window_max_id')
+        params = {
+            'q': config['search_string'],
+            'since_id': config['since_id'],
+            'max_id': max_id if max_id is not None else config['max_id'],
+            'count': config['count'],
+        }
+        twbs = self._client
+        if twbs is None:
+            twbs = self._tweets_by_search(config)
+        tweets_generator = twbs.generator(params, retry_max=config['retry_max'],
+                                          interval_time=config['interval_time'],
+                                          dispcount=config['dispcount'],
+                                          prefetch=config.getint('Prefetch', 0),
+                                          retry_at_end=False, raise_on_giveup=True)
+        counter = 0
+        page = None
+        last_id = None
+        for tweet, metadata in tweets_generator:
+            if tweet['id'] <= config['since_id']:
+                # next_results には since_id が含まれないので、ウィンドウの下端で止める
+                break
+            if page is not None and metadata is not page:
+                self.__checkpoint(last_id)
+            page = metadata
+            counter += 1
+            self.convert(tweet, metadata, counter)
+            last_id = tweet['id']
+        self.__checkpoint(last_id)
+        self.end_results()
+        self.put_state('completed', True)
+
+    def __checkpoint(self, last_id):
+        """ページ毎に、出力を flush してから再開位置を保存"""
+        if last_id is None:
+            return
+        self.checkpoint()
+        self.put_state('window_max_id', last_id - 1)
+
+
+def load_queries(config):
+    """複数検索の一覧 [(名前, 検索文字列), ...] を QueriesFile (--queries_file) か ini の Queries から作る
+
+    1 行 1 検索で、「名前<TAB>検索文字列」または「検索文字列」(名前は検索文字列から生成)。
+    空行と # で始まる行は無視する。
+    """
+    if config['QueriesFile'] is not None:
+        with open(config['QueriesFile'], mode='r', encoding='utf_8') as fp:
+            lines = fp.read().splitlines()
+    elif config['Queries'] is not None:
+        lines = str(config['Queries']).splitlines()
+    else:
+        return []
+
+    queries = []
+    names = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if '\t' in line:
+            name, query = [v.strip() for v in line.split('\t', 1)]
+        else:
+            name, query = re.sub(r'[^\w\-]+', '_', line).strip('_')[:64], line
+        if not name or name in names:
+            name = '{}_{}'.format(name or 'q', len(queries))
+        names.add(name)
+        queries.append((name, query))
+    return queries
+
+
+def query_filename(filename, name):
+    """ファイル名の拡張子の前に _名前 を付ける (twsearch.csv -> twsearch_名前.csv)"""
+    root, ext = os.path.splitext(filename)
+    return '{}_{}{}'.format(root, name, ext)
+
+
+class SharedClients:
+    """ 複数の SplunkWriter で共有する接続プール・リクエスト予算・Pacer・RetryPolicy・
+    TweetsBySearch・Tokenizer """
+    def __init__(self, config):
+        self.session = make_session_from_config(config)
+        self.budget = RequestBudget(config.getint('SearchRateLimit', 450))
+        self.pacer = make_pacer(config)
+        # API 障害時は全検索が同じサーキットブレーカで止まる
+        self.retry_policy = make_retry_policy(config)
+        self.store = make_tweet_store(config)
+        self.client = TweetsBySearch(config, session=self.session, budget=self.budget,
+                                     pacer=self.pacer, retry_policy=self.retry_policy,
+                                     store=self.store)
+        self.tokenizer = make_tokenizer(config) if config['wakati'] else None
+
+    def writer_kwargs(self):
+        """SplunkWriter に渡す共有オブジェクト"""
+        return {
+            'session': self.session,
+            'tokenizer': self.tokenizer,
+            'client': self.client,
+            'pacer': self.pacer,
+            'retry_policy': self.retry_policy,
+            'store': self.store,
+        }
+
+    def close(self):
+        """共有の Tweet ストアのクローズ"""
+        if self.store is not None:
+            self.store.close()
+
+
+def run_writers(config, writers):
+    """{名前: (config, SplunkWriter)} を Workers 並列で generate() し、失敗した名前のリストを返す"""
+    failed = []
+    workers = config.getint('Workers', 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(splunk_writer.generate, wconfig): name
+                   for name, (wconfig, splunk_writer) in writers.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                config.logger.info("'%s' done", name)
+            except Exception as e:   # 他の検索は続ける
+                config.logger.exception("'%s' failed: %s", name, e)
+                failed.append(name)
+    for name, (_, splunk_writer) in writers.items():
+        if splunk_writer.seen_counters():
+            config.logger.info("'%s' seen id counters: %s", name, splunk_writer.seen_counters())
+        splunk_writer.close()
+    if writers:
+        config.logger.info("retry counters: %s", splunk_writer.retry_counters())
+        config.logger.info("tweet store counters: %s", splunk_writer.store_counters())
+    return sorted(failed)
+
+
+def generate_queries(config, queries):
+    """複数の検索を、1 つの TweetsBySearch と共有のリクエスト予算で同時に実行する
+
+    検索毎に Shelve ファイル・出力ファイル・SeenIdFile を分ける。全体のリクエスト数は SearchRateLimit
+    (/search/tweets の 15 分あたりの上限) を超えないように調整される。
+    """
+    if config['OutputFile'] == '-':
+        print("Multiple queries require an output file (-o)", file=sys.stderr)
+        sys.exit(2)
+
+    shared = SharedClients(config)
+
+    # Shelve・出力ファイルのオープンはメインスレッドで順に行う
+    writers = {}
+    for name, query in queries:
+        qconfig = config.overlay({
+            'search_string': query,
+            'ShelveFile': query_filename(config['ShelveFile'], name),
+            'OutputFile': query_filename(config['OutputFile'], name),
+            'SeenIdFile': query_filename(config['SeenIdFile'], name)
+                          if config['SeenIdFile'] else None,
+            })
+        writers[name] = (qconfig, SplunkWriterBySearch(qconfig, **shared.writer_kwargs()))
+    try:
+        return run_writers(config, writers)
+    finally:
+        shared.close()
+
+
+def split_windows(since_date, max_date, hours=24):
+    """since_date (含む) から max_date (含まない) を hours 時間毎のウィンドウに分割 (UTC)
+
+    [(名前, 開始 datetime, 終了 datetime), ...] を新しい順に返す。
+    """
+    start = datetime.datetime.strptime(since_date, '%Y-%m-%d')
+    end = datetime.datetime.strptime(max_date, '%Y-%m-%d')
+    step = datetime.timedelta(hours=hours)
+    name_format = '%Y%m%d' if hours % 24 == 0 else '%Y%m%dT%H%M'
+    windows = []
+    while start < end:
+        window_end = min(start + step, end)
+        windows.append((start.strftime(name_format), start, window_end))
+        start = window_end
+    windows.reverse()
+    return windows
+
+
+def generate_backfill(config):
+    """since_date..max_date をウィンドウに分割して並列に取得する
+
+    ウィンドウ毎に出力ファイル (シャード) と Shelve ファイル (進捗) を分けるので、失敗した
+    ウィンドウだけを再実行できる (完了済みのウィンドウはスキップする)。
+    シャードは tools/mergeshards.py で 1 つのファイルにまとめられる。
+    """
+    if config['since_date'] is None or config['max_date'] is None:
+        print("--backfill requires --since_date and --max_date", file=sys.stderr)
+        sys.exit(2)
+    if config['OutputFile'] == '-':
+        print("--backfill requires an output file (-o)", file=sys.stderr)
+        sys.exit(2)
+
+    shared = SharedClients(config)
+    shelve_file = config['ShelveFile']
+    writers = {}
+    for name, start, end in split_windows(config['since_date'], config['max_date'],
+                                          config.getfloat('window_hours', 24)):
+        wconfig = config.overlay({
+            'since_id': datetime2snowflake(start) - 1,
+            'max_id': datetime2snowflake(end) - 1,
+            'ShelveFile': query_filename(shelve_file, name) if shelve_file else None,
+            'OutputFile': query_filename(config['OutputFile'], name),
+            'SeenIdFile': query_filename(config['SeenIdFile'], name)
+                          if config['SeenIdFile'] else None,
+            })
+        writers[name] = (wconfig, SplunkWriterByWindow(wconfig, **shared.writer_kwargs()))
+    try:
+        return run_writers(config, writers)
+    finally:
+        shared.close()
+
+
+def output_format_of(filename):
+    """出力ファイル名の拡張子から決まる出力形式 (Parquet, SQLite, それ以外は None)"""
+    if not filename:
+        return None
+    return OUTPUT_FORMAT_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def send_frame(sock, kind, payload):
+    """フレームを 1 つ送る"""
+    sock.sendall(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+class _FrameWriter:
+    """ 書き込まれたテキストをフレームにしてソケットに送るファイル風オブジェクト """
+    closed = False
+
+    def __init__(self, sock, kind, bufsize=FRAME_BUFSIZE):
+        self.__sock = sock
+        self.__kind = kind
+        self.__bufsize = bufsize
+        self.__buf = []
+        self.__size = 0
+
+    def write(self, text):
+        """text をバッファし、bufsize を超えたら送る"""
+        self.__buf.append(text)
+        self.__size += len(text)
+        if self.__size >= self.__bufsize:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        """バッファを送る"""
+        if self.__buf:
+            send_frame(self.__sock, self.__kind, ''.join(self.__buf).encode('utf-8'))
+            self.__buf = []
+            self.__size = 0
+
+
+class _QueryHandler(socketserver.BaseRequestHandler):
+    """QueryServer の 1 接続 (1 ジョブ)"""
+    def handle(self):
+        self.server.query_server.handle(self.request)
+
+
+class QueryServer:
+    """ --serve: Unix ドメインソケットで検索・ID 取得のジョブを受け付ける常駐サーバ
+
+    接続プール・Bearer Token・Tweet ストア・Tokenizer (--wakati で起動した場合, または最初の
+    --wakati のジョブ以降) を共有して、ジョブ毎の起動・認証のコストを無くす。
+    ジョブは 1 行の JSON {"argv": [twsearch.py の引数, ...]} で、結果は SplunkWriter と同じ
+    CSV/JSON をフレームに分けて返す。-o は無視し、Shelve は -b を指定したジョブだけが使う。
+    """
+
+    def __init__(self, config, path=DEFAULT_SOCKET):
+        self.config = config
+        self.logger = config.logger
+        self.path = path
+        self.shared = SharedClients(config)
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__thread = None
+
+    def handle(self, sock):
+        """1 ジョブの実行 (ジョブ毎のスレッドで呼ばれる)"""
+        out = _FrameWriter(sock, FRAME_OUT)
+        err = _FrameWriter(sock, FRAME_ERR)
+        try:
+            request = json.loads(sock.makefile('rb').readline())
+            code = self.run_job(request.get('argv', []), out, err)
+        except FatalResponseError as e:
+            err.write('{}\n'.format(e))
+            code = e.exit_code
+        except Exception as e:  # 他のジョブは続ける
+            self.logger.exception("job failed: %s", e)
+            err.write('{}\n'.format(e))
+            code = 1
+        try:
+            out.flush()
+            err.flush()
+            send_frame(sock, FRAME_EXIT, str(code).encode('utf-8'))
+        except OSError as e:    # クライアントが先に切断した
+            self.logger.info("client disconnected: %s", e)
+
+    def run_job(self, argv, out, err):
+        """argv のジョブを実行して終了コードを返す"""
+        try:
+            argparams = tw_argparse([str(arg) for arg in argv])
+        except SystemExit as e:
+            err.write('invalid arguments: {}\n'.format(' '.join(map(str, argv))))
+            return e.code if isinstance(e.code, int) else 2
+        if argparams['multi_query'] or argparams['backfill'] or argparams['follow'] \
+                or argparams['getstatus'] or argparams['serve']:
+            err.write('-q, --backfill, --follow, -g and --serve are not supported by --serve\n')
+            return 2
+        if argparams['output_format'] in ROW_SINKS:
+            err.write('{} output is not supported by --serve\n'.format(argparams['output_format']))
+            return 2
+        jconfig = self.config.overlay(argparams).overlay({
+            'ShelveFile': argparams.get('shelvefile'),
+            'SeenIdFile': None,
+            'OutputFile': '-',
+            })
+        if jconfig['wakati']:
+            with self.__lock:
+                if self.shared.tokenizer is None:
+                    self.shared.tokenizer = make_tokenizer(self.config)
+        splunk_writer = SplunkWriterBySearch(jconfig, outfp=out, errfp=err,
+                                             **self.shared.writer_kwargs())
+        try:
+            splunk_writer.generate(jconfig)
+        finally:
+            splunk_writer.close()
+        return 0
+
+    def start(self):
+        """ソケットを作ってバックグラウンドスレッドで受け付けを始める"""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise OSError("{} is already in use".format(self.path))
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(self.path)    # 前回の残り
+            finally:
+                probe.close()
+        self.__server = socketserver.ThreadingUnixStreamServer(self.path, _QueryHandler)
+        self.__server.daemon_threads = True
+        self.__server.query_server = self
+        os.chmod(self.path, 0o600)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        self.logger.info("serving on %s", self.path)
+        return self
+
+    def stop(self):
+        """受け付けを止めてソケットを削除"""
+        if self.__server is None:
+            return
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.shared.close()
+
+    def serve(self):
+        """SIGTERM・Ctrl-C を受けるまで受け付ける"""
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+        self.start()
+        try:
+            stop.wait()
+        finally:
+            self.stop()
+
+
+def tw_argparse(argv=None):
+    """コマンドライン引数の Parse (argv: 引数のリスト, None なら sys.argv[1:])"""
 
     parser = argparse.ArgumentParser()
 
@@ -416,8 +1064,19 @@ def tw_argparse():
                         help=u'出力 CSV ファイルへヘッダタイトルを記入')
     parser.add_argument('-j', '--write_json', action='store_true',
                         help=u'JSON 出力')
+    parser.add_argument('--parquet', action='store_true',
+                        help=u'Parquet 出力 (出力ファイル名はディレクトリ, 実行毎に part ファイルを追加, ' + \
+                        u'-o の拡張子が .parquet の場合も)')
+    parser.add_argument('--sqlite', action='store_true',
+                        help=u'SQLite 出力 (Tweet ID で upsert, -o の拡張子が .sqlite, .sqlite3 の場合も)')
+    parser.add_argument('--ndjson', action='store_true',
+                        help=u'1 行 1 JSON (NDJSON) の JSON 出力 (-j より優先, ' + \
+                        u'-o 不指定時は OutputFilePrefix.ndjson)')
     parser.add_argument('-i', '--id', type=str, default=None,
-                        help=u'get Tweet as ID')
+                        help=u'get Tweet as ID (\'-\': 標準入力, \'@file\': ファイル, ' + \
+                        u'\'id1,id2\': カンマ区切りで複数 ID を 100 件ずつ取得)')
+    parser.add_argument('--missing_ids', type=str, default=None,
+                        help=u'複数 ID 取得時に取得できなかった ID の出力先 (デフォルト 標準エラー)')
     parser.add_argument('-I', '--inifile', type=str, default=DEFAULT_CONFIG_FILE,
                         help=u'設定ファイルの指定 (デフォルトは {})'.format(DEFAULT_CONFIG_FILE) + \
                         u'ディレクトリの指定は環境変数CUSTOM_CONFIG_DIR')
@@ -429,6 +1088,26 @@ def tw_argparse():
                         help=u'limit status 情報を取得・表示して終了')
     parser.add_argument('--wakati', action='store_true',
                         help=u'Tweet 本文を分かち書きにする')
+    parser.add_argument('-q', '--queries_file', type=str, nargs='?', default=None, const='',
+                        help=u'複数検索の一覧ファイル (1 行 1 検索, "名前<TAB>検索文字列")' + \
+                        u'ファイル名を省略すると設定ファイルの Queries を使う')
+    parser.add_argument('--workers', type=int, default=None,
+                        help=u'複数検索の同時実行数 (デフォルト 4)')
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true',
+                        help=u'Tweet ストア (TweetCacheFile) を使わない')
+    parser.add_argument('--stream', action='store_true',
+                        help=u'検索結果を受信しながら 1 件ずつデコードして書き込む (CSV 出力のみ)')
+    parser.add_argument('--backfill', action='store_true',
+                        help=u'--since_date から --max_date までをウィンドウに分けて並列に取得')
+    parser.add_argument('--window_hours', type=float, default=24,
+                        help=u'--backfill のウィンドウの長さ (時間, デフォルト 24)')
+    parser.add_argument('--follow', action='store_true',
+                        help=u'終了せずに新着を繰り返し検索する (間隔は FollowMinInterval〜FollowMaxInterval)')
+    parser.add_argument('--serve', type=str, nargs='?', default=None, const=DEFAULT_SOCKET,
+                        help=u'Unix ドメインソケットで検索・ID 取得を受け付ける常駐サーバとして起動 '
+                        u'(デフォルト {}, クライアントは twsclient.py)'.format(DEFAULT_SOCKET))
+    parser.add_argument('--prefetch', type=int, default=None,
+                        help=u'書き込み中に先読みしておくページ数 (デフォルト 0: 先読みしない)')
 
     # 排他オプション
     optgroup1 = parser.add_mutually_exclusive_group()
@@ -439,7 +1118,7 @@ def tw_argparse():
     optgroup1.add_argument('-D', '--debug', action='store_true',
                            help=u'Debug モード')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     argparams = dict()
 
@@ -518,17 +1197,21 @@ def tw_argparse():
     argparams['localno'.lower()] = args.localno
     logging.debug('localno: %s', argparams['localno'.lower()])
 
-    argparams['write_json'.lower()] = args.write_json
+    # NDJSON も JSON 出力 (write_json) の 1 つ
+    argparams['write_json'.lower()] = args.write_json or args.ndjson
     logging.debug('write_json: %s', argparams['write_json'.lower()])
-    if args.write_json and (not args.outputfile):
-        argparams['OutputFile'.lower()] = APP_NAME + '.json'
-        logging.debug('outputfile: %s, mode: %s',
-                      argparams['OutputFile'.lower()],
-                      argparams['output_mode'.lower()])
+    argparams['output_format'] = 'ndjson' if args.ndjson else 'json' if args.write_json else 'csv'
+    if not argparams['write_json']:
+        argparams['output_format'] = 'parquet' if args.parquet else 'sqlite' if args.sqlite else \
+            output_format_of(args.outputfile) or 'csv'
+    logging.debug('output_format: %s', argparams['output_format'])
 
     argparams['search_id'.lower()] = args.id
     logging.debug('search_id: %s', argparams['search_id'.lower()])
 
+    argparams['missing_ids'.lower()] = args.missing_ids
+    logging.debug('missing_ids: %s', argparams['missing_ids'.lower()])
+
     argparams['configfile'.lower()] = args.inifile
     logging.debug('configfile: %s', argparams['configfile'.lower()])
 
@@ -541,7 +1224,39 @@ def tw_argparse():
     argparams['wakati'.lower()] = args.wakati
     logging.debug('wakati: %s', argparams['wakati'.lower()])
 
-    if argparams['search_id'] is None and argparams['search_string'] == "":
+    argparams['multi_query'.lower()] = args.queries_file is not None
+    if args.queries_file:
+        argparams['QueriesFile'.lower()] = args.queries_file
+    logging.debug('multi_query: %s, queries_file: %s',
+                  argparams['multi_query'.lower()], args.queries_file)
+
+    if args.workers is not None:
+        argparams['Workers'.lower()] = args.workers
+    logging.debug('workers: %s', args.workers)
+
+    if args.prefetch is not None:
+        argparams['Prefetch'.lower()] = args.prefetch
+    logging.debug('prefetch: %s', args.prefetch)
+
+    argparams['no_cache'] = args.no_cache
+    logging.debug('no_cache: %s', args.no_cache)
+
+    if args.stream:
+        argparams['Stream'.lower()] = True
+    logging.debug('stream: %s', args.stream)
+
+    argparams['follow'.lower()] = args.follow
+    logging.debug('follow: %s', args.follow)
+
+    argparams['backfill'.lower()] = args.backfill
+    argparams['window_hours'.lower()] = args.window_hours
+    logging.debug('backfill: %s, window_hours: %s', args.backfill, args.window_hours)
+
+    argparams['serve'.lower()] = args.serve
+    logging.debug('serve: %s', args.serve)
+
+    if argparams['search_id'] is None and argparams['search_string'] == "" \
+            and not argparams['multi_query'] and not argparams['serve']:
         print("Search String is required", file=sys.stderr)
         parser.print_usage()
         sys.exit(2)
@@ -553,12 +1268,47 @@ def main():
     logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                         level=logging.WARN)
     config = TwsConfig(tw_argparse())
+    try:
+        run(config)
+    except FatalResponseError as e:
+        print(e, file=sys.stderr)
+        sys.exit(e.exit_code)
+
+
+def run(config):
+    """検索・取得の実行"""
+    set_json_backend(config['JsonBackend'])
     config.logger.info("config['AppName']: %s", config['AppName'])
-    splunk_writer = SplunkWriterBySearch(config=config)
+    if config['serve']:
+        QueryServer(config, config['serve']).serve()
+        return
+    if config['multi_query'] and not config['getstatus']:
+        queries = load_queries(config)
+        if not queries:
+            print("No queries in QueriesFile or Queries", file=sys.stderr)
+            sys.exit(2)
+        failed = generate_queries(config, queries)
+        sys.exit(1 if failed else 0)
+    if config['backfill'] and config['search_id'] is None and not config['getstatus']:
+        failed = generate_backfill(config)
+        for name in failed:
+            print("failed window: {}".format(name), file=sys.stderr)
+        sys.exit(1 if failed else 0)
+    if config['follow'] and config['search_id'] is None and not config['getstatus']:
+        splunk_writer = SplunkWriterByFollow(config=config)
+        # SIGTERM・Ctrl-C では書き込み中のポーリングを終えてから終了する
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: splunk_writer.stop())
+    else:
+        splunk_writer = SplunkWriterBySearch(config=config)
     if config['getstatus']:
         splunk_writer.disp_limit_status()
         sys.exit(0)
     splunk_writer.generate(config)
+    config.logger.info("retry counters: %s", splunk_writer.retry_counters())
+    config.logger.info("tweet store counters: %s", splunk_writer.store_counters())
+    config.logger.info("seen id counters: %s", splunk_writer.seen_counters())
+    splunk_writer.close()
 
 
 if __name__ == '__main__':